@@ -5,31 +5,215 @@
 
 import re
 import base64
+import codecs
+import string
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import urllib.parse
 import html
-import json
 from typing import Dict, List, Tuple, Optional
+import text_stats
+from json_cache import load_json, save_json_atomic
+
+# 解碼器選擇用的特徵（只看文本開頭一段）
+SAMPLE_SIZE = 4096
+HTML_ENTITY_RE = re.compile(r'&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+);')
+PERCENT_RE = re.compile(r'%[0-9a-fA-F]{2}')
+UNICODE_ESCAPE_RE = re.compile(r'\\u[0-9a-fA-F]{4}|\\U[0-9a-fA-F]{8}')
+NUMERIC_RE = re.compile(r'\\x[0-9a-fA-F]{2}|\b0x[0-9a-fA-F]+\b|\b\d{4,5}\b')
+BASE64_RE = re.compile(r'[A-Za-z0-9+/_-]{16,}={0,2}')
+
+BASE64_VARIANTS = ('standard', 'url_safe', 'no_padding')
+
+# 解碼結果的中文字數與中文佔非空白字符比例都達到門檻即視為可讀，不再嘗試其他解碼器
+QUALITY_MIN_CJK = 10
+QUALITY_THRESHOLD = 0.3
+
+# 按域名記錄的解碼方法快取文件名（放在輸出目錄下）
+SITE_METHODS_FILENAME = 'decoder_methods.json'
+
+# 流式解碼：每塊讀取的字符數、找不到空白時向前找切分點的範圍
+STREAM_CHUNK_SIZE = 1 << 20
+SPLIT_LOOKBACK = 256
 
 class AdvancedDecoder:
-    def __init__(self):
+    def __init__(self, cache_file=None):
+        """
+        Args:
+            cache_file: 按域名記錄解碼方法的 JSON 文件，None 時只在內存中記錄
+        """
         # 常見的中文編碼
         self.chinese_encodings = [
             'utf-8', 'gbk', 'gb2312', 'big5', 'gb18030',
             'utf-16', 'utf-16-le', 'utf-16-be',
             'hz', 'iso-2022-cn', 'shift_jis', 'euc-cn'
         ]
-        
-        # Unicode 範圍
-        self.cjk_ranges = [
-            (0x4E00, 0x9FFF),   # CJK Unified Ideographs
-            (0x3400, 0x4DBF),   # CJK Extension A
-            (0x20000, 0x2A6DF), # CJK Extension B
-            (0x2A700, 0x2B73F), # CJK Extension C
-            (0x2B740, 0x2B81F), # CJK Extension D
-            (0x2B820, 0x2CEAF), # CJK Extension E
-            (0x2CEB0, 0x2EBEF), # CJK Extension F
-            (0x30000, 0x3134F), # CJK Extension G
+        # CJK Unicode 範圍見 text_stats 的區間表
+
+        # 可按名稱單獨執行的解碼器（名稱與 decode_all 的結果鍵一致）
+        self.decoders = {
+            'html_entities': self.decode_html_entities,
+            'url_encoded': self.decode_url,
+            'unicode_escape': self.decode_unicode_escape,
+            'numeric_entities': self.decode_numeric_entities,
+            'custom_obfuscation': self.decode_custom_obfuscation,
+            'multi_layer': self.decode_multi_layer,
+        }
+
+        # 同一網站的混淆方式對每一章都相同：記下各域名上次勝出的方法，之後的頁面先試它
+        self.site_methods = {}
+        self.cache_file = None
+        self._lock = threading.Lock()
+        if cache_file:
+            self.set_cache_file(cache_file)
+    
+    def set_cache_file(self, cache_file):
+        """指定（並載入）按域名記錄解碼方法的快取文件，內存中已有的記錄優先"""
+        self.cache_file = cache_file
+        self.site_methods = {**load_json(cache_file, {}), **self.site_methods}
+    
+    def _remember(self, domain, method):
+        with self._lock:
+            if method == 'identity':
+                changed = self.site_methods.pop(domain, None) is not None
+            else:
+                changed = self.site_methods.get(domain) != method
+                self.site_methods[domain] = method
+            if changed and self.cache_file:
+                save_json_atomic(self.cache_file, self.site_methods)
+    
+    def text_quality(self, text: str) -> Tuple[int, float]:
+        """返回 (中文字數, 中文佔非空白字符的比例)"""
+        stats = text_stats.text_stats(text)
+        return stats.cjk, (stats.cjk / stats.visible if stats.visible else 0.0)
+    
+    def is_readable(self, cjk_count: int, ratio: float) -> bool:
+        return cjk_count >= QUALITY_MIN_CJK and ratio >= QUALITY_THRESHOLD
+    
+    def plan(self, text: str) -> List[str]:
+        """
+        按文本開頭的字符特徵估計各解碼器的可能性，返回按可能性排序的方法名
+        沒有對應特徵的解碼器不會改變文本（或只會產生亂碼），不列入計劃
+        """
+        sample = text[:SAMPLE_SIZE]
+        evidence = [
+            ('html_entities', len(HTML_ENTITY_RE.findall(sample))),
+            ('url_encoded', len(PERCENT_RE.findall(sample))),
+            ('unicode_escape', len(UNICODE_ESCAPE_RE.findall(sample))),
+            ('numeric_entities', len(NUMERIC_RE.findall(sample))),
         ]
+        methods = [name for name, hits in sorted(evidence, key=lambda e: -e[1]) if hits]
+
+        # 整段是 Base64 字母表時，Base64 是最可能的方案
+        if self.looks_base64(sample):
+            methods = [f'base64_{variant}' for variant in BASE64_VARIANTS] + methods
+
+        if len(methods) >= 2:
+            methods.append('multi_layer')
+        # 字符替換與位移放在最後，只在其他方法都不可讀時才嘗試
+        methods.append('custom_obfuscation')
+        return methods
+    
+    def looks_base64(self, text: str) -> bool:
+        """文本開頭一段去掉空白後是否全部是 Base64 字母表字符"""
+        cleaned = re.sub(r'\s+', '', text[:SAMPLE_SIZE])
+        return bool(cleaned) and BASE64_RE.fullmatch(cleaned) is not None
+    
+    def decode_iter(self, text: str, first: Optional[str] = None):
+        """
+        按 plan() 的順序惰性地逐個產生 (方法名, 解碼結果)，跳過沒有改變文本的結果
+        first 為先試的方法名（例如該網站上次勝出的方法），以嚴格模式解碼，失敗時直接按 plan() 搜索
+        """
+        if first:
+            decoded = self.decode_method(first, text, strict=True)
+            if decoded is not None and decoded != text:
+                yield first, decoded
+
+        for method in self.plan(text):
+            if method.startswith('base64_'):
+                variant = method[len('base64_'):]
+                data = self._base64_bytes(text, variant)
+                if data is None:
+                    continue
+                for encoding in self._likely_encodings(data):
+                    try:
+                        decoded = data.decode(encoding, errors='ignore')
+                    except LookupError:
+                        continue
+                    if decoded and decoded != text and f'{method}_{encoding}' != first:
+                        yield f'{method}_{encoding}', decoded
+                continue
+
+            if method == first:
+                continue
+            decoded = self.decoders[method](text)
+            if decoded != text:
+                yield method, decoded
+    
+    def decode_method(self, method: str, text: str, strict: bool = False) -> Optional[str]:
+        """
+        按名稱執行一個解碼方法（名稱同 decode_best 的返回值），名稱無效或解碼失敗時返回 None
+        strict=True 時字節不符合編碼（結尾被截斷的多字節字符除外）、或結果中新出現替換字符 U+FFFD 也返回 None：
+        記住的方法套用到換了編碼的頁面上時，寬鬆解碼得到的亂碼可能恰好通過中文比例檢查
+        """
+        if method == 'identity':
+            return text
+        if method.startswith('base64_'):
+            for variant in BASE64_VARIANTS:
+                prefix = f'base64_{variant}_'
+                if method.startswith(prefix):
+                    data = self._base64_bytes(text, variant)
+                    if data is None:
+                        return None
+                    try:
+                        byte_decoder = codecs.getincrementaldecoder(method[len(prefix):])(
+                            errors='strict' if strict else 'ignore')
+                        decoded = byte_decoder.decode(data)
+                    except (LookupError, UnicodeDecodeError):
+                        return None
+                    break
+            else:
+                return None
+        else:
+            decoder = self.decoders.get(method)
+            if not decoder:
+                return None
+            decoded = decoder(text)
+        if strict and '\ufffd' in decoded and '\ufffd' not in text:
+            return None
+        return decoded
+    
+    def decode_best(self, text: str, url: Optional[str] = None) -> Tuple[str, str]:
+        """
+        返回 (方法名, 解碼結果)
+        原文已可讀時直接返回 ('identity', text)；提供 url 且該域名記錄過勝出的方法時先試它，
+        結果可讀即返回，質量下降時才按 plan() 順序繼續嘗試，第一個可讀且中文多於原文的結果即返回。
+        都不可讀時（如內容很短），返回中文比例達標的結果中中文最多的一個，
+        仍沒有則保留原文，避免把原文換成亂碼
+        """
+        best_method, best_text = 'identity', text
+        best_count, ratio = self.text_quality(text)
+        if self.is_readable(best_count, ratio):
+            return best_method, best_text
+
+        domain = urllib.parse.urlparse(url).netloc if url else None
+        known = self.site_methods.get(domain) if domain else None
+
+        for method, decoded in self.decode_iter(text, known):
+            count, ratio = self.text_quality(decoded)
+            if count > best_count and ratio >= QUALITY_THRESHOLD:
+                if self.is_readable(count, ratio):
+                    best_method, best_text = method, decoded
+                    break
+                # 字符替換只在結果可讀時採用：數字換成中文數字後，短文本的中文比例也可能達標
+                if method != 'custom_obfuscation':
+                    best_method, best_text, best_count = method, decoded, count
+
+        if domain and best_method != known and (known or best_method != 'identity'):
+            # 記錄新的勝出方法；網站不再混淆時清除記錄
+            self._remember(domain, best_method)
+        return best_method, best_text
     
     def decode_all(self, text: str) -> Dict[str, str]:
         """嘗試所有解碼方法"""
@@ -120,20 +304,13 @@ class AdvancedDecoder:
         """嘗試各種 Base64 變體"""
         results = {}
         
-        # 清理文本（移除空格、換行等）
-        cleaned = re.sub(r'\s+', '', text)
-        
-        # Base64 變體
-        variants = [
-            ('standard', cleaned),
-            ('url_safe', cleaned.replace('-', '+').replace('_', '/')),
-            ('no_padding', cleaned + '=' * (4 - len(cleaned) % 4)),
-        ]
-        
-        for name, variant in variants:
+        for name in BASE64_VARIANTS:
+            # 每個變體只解碼一次 Base64，再逐個編碼解讀字節
+            decoded_bytes = self._base64_bytes(text, name)
+            if decoded_bytes is None:
+                continue
             for encoding in self.chinese_encodings:
                 try:
-                    decoded_bytes = base64.b64decode(variant)
                     decoded_text = decoded_bytes.decode(encoding, errors='ignore')
                     
                     # 檢查是否包含中文
@@ -144,6 +321,36 @@ class AdvancedDecoder:
         
         return results
     
+    def _base64_bytes(self, text: str, variant: str) -> Optional[bytes]:
+        """按變體整理並解碼 Base64，失敗時返回 None"""
+        cleaned = re.sub(r'\s+', '', text)
+        if variant == 'url_safe':
+            cleaned = cleaned.replace('-', '+').replace('_', '/')
+        elif variant == 'no_padding':
+            cleaned = cleaned + '=' * (4 - len(cleaned) % 4)
+        try:
+            return base64.b64decode(cleaned)
+        except Exception:
+            return None
+    
+    def _likely_encodings(self, data: bytes) -> List[str]:
+        """按字節分佈排列候選編碼：合法 UTF-8 優先，大量 0 字節時 UTF-16 優先，其餘按 GB/Big5 系列"""
+        sample = data[:SAMPLE_SIZE]
+        first = []
+        try:
+            sample.decode('utf-8')
+            first.append('utf-8')
+        except UnicodeDecodeError as e:
+            # 只是截斷在多字節字符中間
+            if e.start >= len(sample) - 3:
+                first.append('utf-8')
+        if sample.count(0) * 5 >= len(sample):
+            odd_zeros = sample[1::2].count(0)
+            first.extend(['utf-16-le', 'utf-16-be'] if odd_zeros * 2 >= sample.count(0) else ['utf-16-be', 'utf-16-le'])
+        elif any(b >= 0x80 for b in sample):
+            first.extend(['gb18030', 'gbk', 'big5'])
+        return first + [e for e in self.chinese_encodings if e not in first]
+    
     def decode_numeric_entities(self, text: str) -> str:
         """解碼數字實體（如 Unicode 碼點）"""
         try:
@@ -245,24 +452,184 @@ class AdvancedDecoder:
     
     def is_cjk_codepoint(self, code: int) -> bool:
         """檢查是否為 CJK 字符碼點"""
-        for start, end in self.cjk_ranges:
-            if start <= code <= end:
-                return True
-        return False
+        return text_stats.is_cjk_codepoint(code)
     
     def contains_chinese(self, text: str) -> bool:
         """檢查文本是否包含中文"""
-        chinese_pattern = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf\u20000-\u2a6df\u2a700-\u2b73f\u2b740-\u2b81f\u2b820-\u2ceaf\u2ceb0-\u2ebef\u30000-\u3134f]+')
-        return bool(chinese_pattern.search(text))
+        return text_stats.contains_cjk(text)
     
     def extract_chinese(self, text: str) -> str:
         """提取所有中文字符"""
-        chinese_pattern = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf\u20000-\u2a6df\u2a700-\u2b73f\u2b740-\u2b81f\u2b820-\u2ceaf\u2ceb0-\u2ebef\u30000-\u3134f]+')
-        matches = chinese_pattern.findall(text)
-        return ''.join(matches)
+        return text_stats.extract_cjk(text)
+
+def _is_token_start(buffer: str, p: int) -> bool:
+    """buffer[p] 是否為一個完整轉義序列的開頭（在此切分不會拆開實體或多字節字符）"""
+    ch = buffer[p]
+    if ch == '&':
+        return True
+    if ch == '%':
+        pair = buffer[p + 1:p + 3]
+        # UTF-8 續字節（0x80-0xBF）屬於前一個字符
+        return (len(pair) == 2 and all(c in string.hexdigits for c in pair)
+                and not 0x80 <= int(pair, 16) <= 0xBF)
+    if ch == '\\':
+        kind = buffer[p + 1:p + 2]
+        if kind == 'u':
+            digits = buffer[p + 2:p + 6]
+            # 低位代理屬於前一個 \uXXXX
+            return (len(digits) == 4 and all(c in string.hexdigits for c in digits)
+                    and not 0xDC00 <= int(digits, 16) <= 0xDFFF)
+        return kind in ('U', 'x')
+    return False
+
+
+def find_split(buffer: str, base64_mode: bool = False) -> int:
+    """
+    返回緩衝區的安全切分位置：切分點之前的部分可以獨立解碼，之後的部分留到下一塊。
+    優先在後半段最後一個換行/空白之後切分（實體與各種轉義都不含空白）；
+    沒有空白時向前找一個轉義序列的開頭或非字母數字的邊界。
+    Base64 模式下還要保證切分點前的 Base64 字符數是 4 的倍數
+    """
+    cut = len(buffer)
+    half = len(buffer) // 2
+    for sep in ('\n', ' ', '\t', '\r'):
+        idx = buffer.rfind(sep, half)
+        if idx >= 0:
+            cut = idx + 1
+            break
+    else:
+        for p in range(len(buffer) - 1, max(0, len(buffer) - SPLIT_LOOKBACK), -1):
+            prev = buffer[p - 1]
+            if _is_token_start(buffer, p) or (
+                    not buffer[p].isalnum() and not prev.isalnum() and prev not in '&#%\\'):
+                cut = p
+                break
+
+    if base64_mode:
+        extra = len(re.sub(r'\s+', '', buffer[:cut])) % 4
+        while extra and cut > 0:
+            cut -= 1
+            if not buffer[cut].isspace():
+                extra -= 1
+    return cut
+
+
+def iter_stream_chunks(f, chunk_size: int = STREAM_CHUNK_SIZE, base64_mode: bool = False, head: str = ''):
+    """從文本文件逐塊讀取（head 為已讀出的開頭），上一塊切分點之後的尾巴併入下一塊，內存中最多保留約兩塊"""
+    buffer = head
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            if buffer:
+                yield buffer
+            return
+        # 還有後續數據時才切分，最後一塊整體輸出，不會留下零碎的尾巴
+        cut = find_split(buffer, base64_mode)
+        if cut:
+            yield buffer[:cut]
+        buffer = buffer[cut:] + data
+
+
+_stream_decoder = None
+
+
+def _split_base64_method(method: str) -> Tuple[str, str]:
+    """'base64_url_safe_gbk' -> ('url_safe', 'gbk')"""
+    for variant in BASE64_VARIANTS:
+        prefix = f'base64_{variant}_'
+        if method.startswith(prefix):
+            return variant, method[len(prefix):]
+    raise ValueError(f"不是 Base64 解碼方法: {method}")
+
+
+def _decode_chunk(task):
+    """
+    解碼一塊文本（可在子進程中執行）
+    Base64 方法只返回解碼後的字節，由主進程按順序用增量解碼器轉成文本，避免多字節字符跨塊被拆開；
+    其他方法先試整個文件選定的方法，該塊質量下降時再完整搜索
+    """
+    global _stream_decoder
+    method, chunk = task
+    if _stream_decoder is None:
+        _stream_decoder = AdvancedDecoder()
+    if method.startswith('base64_'):
+        variant, _ = _split_base64_method(method)
+        return _stream_decoder._base64_bytes(chunk, variant) or b''
+    if method != 'identity':
+        _stream_decoder.site_methods['stream'] = method
+    return _stream_decoder.decode_best(chunk, 'stream://stream')[1]
+
+
+def _map_ordered(func, tasks, workers: int):
+    """按順序返回 func(task) 的結果；workers > 1 時用進程池，同時在途的任務不超過 workers * 2 個"""
+    if workers <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(func, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def decode_file_stream(input_file: str, output_file: str, chunk_size: int = STREAM_CHUNK_SIZE, workers: int = 0):
+    """
+    流式解碼文件：按 chunk_size 字符分塊，在不拆開轉義序列的位置切分，
+    逐塊解碼並立即寫入 output_file，內存佔用與文件大小無關。
+    解碼方法由第一塊決定；workers > 1 時各塊分發到進程池並行解碼（輸出順序不變）
+    返回 (方法名, 輸出字符數, 中文字符數)
+    """
+    decoder = AdvancedDecoder()
+    total_chars = 0
+    total_cjk = 0
+    chunk_count = 0
+
+    with open(input_file, 'r', encoding='utf-8') as f, open(output_file, 'w', encoding='utf-8') as out:
+        # 用第一塊（在安全位置切分後）選定解碼方法
+        head = f.read(chunk_size)
+        base64_mode = decoder.looks_base64(head)
+        method, _ = decoder.decode_best(head[:find_split(head, base64_mode)] or head)
+        print(f"解碼方法: {method}")
+
+        byte_decoder = None
+        if method.startswith('base64_'):
+            byte_decoder = codecs.getincrementaldecoder(_split_base64_method(method)[1])(errors='ignore')
+
+        chunks = iter_stream_chunks(f, chunk_size, base64_mode, head)
+        for result in _map_ordered(_decode_chunk, ((method, chunk) for chunk in chunks), workers):
+            if byte_decoder is not None:
+                result = byte_decoder.decode(result)
+            out.write(result)
+            chunk_count += 1
+            total_chars += len(result)
+            total_cjk += text_stats.count_cjk(result)
+        if byte_decoder is not None:
+            tail = byte_decoder.decode(b'', final=True)
+            out.write(tail)
+            total_chars += len(tail)
+
+    print(f"已解碼 {chunk_count} 塊，輸出 {total_chars} 字符，中文 {total_cjk} 字")
+    print(f"結果已保存到: {output_file}")
+    return method, total_chars, total_cjk
+
+
+def decode_file(input_file: str, output_file: str = None, stream: bool = False,
+                chunk_size: int = STREAM_CHUNK_SIZE, workers: int = 0):
+    """
+    解碼文件
+    stream=True 時改用分塊流式解碼寫入輸出文件（見 decode_file_stream，此時返回輸出文件路徑）
+    """
+    if stream:
+        if not output_file:
+            raise ValueError("流式解碼需要指定輸出文件")
+        decode_file_stream(input_file, output_file, chunk_size, workers)
+        return output_file
 
-def decode_file(input_file: str, output_file: str = None):
-    """解碼文件"""
     decoder = AdvancedDecoder()
     
     with open(input_file, 'r', encoding='utf-8') as f:
@@ -275,11 +642,10 @@ def decode_file(input_file: str, output_file: str = None):
     
     # 找出最佳結果（包含最多中文的）
     best_result = content
-    best_chinese_count = len(decoder.extract_chinese(content))
+    best_chinese_count = text_stats.count_cjk(content)
     
     for method, decoded in results.items():
-        chinese_text = decoder.extract_chinese(decoded)
-        chinese_count = len(chinese_text)
+        chinese_count = text_stats.count_cjk(decoded)
         
         print(f"\n方法: {method}")
         print(f"中文字符數: {chinese_count}")
@@ -299,13 +665,16 @@ def decode_file(input_file: str, output_file: str = None):
     return best_result
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("用法: python advanced_decoder.py <輸入文件> [輸出文件]")
-        sys.exit(1)
-    
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    
-    decode_file(input_file, output_file)
+    import argparse
+
+    parser = argparse.ArgumentParser(description='進階解碼器')
+    parser.add_argument('input_file', help='輸入文件')
+    parser.add_argument('output_file', nargs='?', help='輸出文件')
+    parser.add_argument('--stream', action='store_true',
+                        help='分塊流式解碼，邊解邊寫，適合大文件')
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help='流式解碼每塊字符數')
+    parser.add_argument('--workers', type=int, default=0, help='流式解碼的並行進程數（0 表示單進程）')
+    args = parser.parse_args()
+
+    decode_file(args.input_file, args.output_file, stream=args.stream,
+                chunk_size=args.chunk_size, workers=args.workers)
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+清理引擎基準測試：比較逐條規則 re.sub / re.search 的舊實現與預編譯單次掃描的 RuleSet，
+並歸因兩者的輸出差異。新引擎的規則取自 --url 所屬域名的清理規則包（cleaning_rules/）；
+舊實現是基線代碼原文照抄，規則寫死，對應 m.zashuwu.com 規則包。
+
+_clean_content 的預期差異（逐行過濾應完全一致）：
+- 跨行刪除：基線最後一條郵件廣告規則把換行寫成 [^\\n]，會連同其間的正文一起刪掉，規則包已修正
+- 較長規則優先：規則包把「最新地址：发邮件至…」等排在前綴規則「最新地址」之前，
+  整行刪除；基線先刪前綴，留下「：发邮件至 …」殘句
+
+語料可以是章節 txt 目錄或章節庫 (chapters.sqlite)，未提供時生成帶廣告行的合成語料。
+使用方法：
+    python benchmark_cleaning.py novels/ precise_output/ --repeat 3
+    python benchmark_cleaning.py novels/chapters.sqlite --output bench_output.txt
+    python benchmark_cleaning.py --synthetic 5000
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+from text_cleaner import RULE_PACKS
+
+BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+# 基線 _clean_content 最後一條規則原文，其中 [^\\n] 能匹配換行
+LEGACY_CROSS_LINE_RE = re.compile(r'记(?:得|住)?[^\\n]{0,20}?(?:邮件|邮箱)[^\\n]*?@[^\\n]*', re.IGNORECASE)
+
+SAMPLE_AD_LINES = [
+    '最新地址：发邮件至 Dz@ZASHUWU.COM',
+    '记得发邮件至地址：Dz@ZASHUWU.COM',
+    '记住【杂书屋】：ZASHUWU.COM',
+    '剩余4212章待阅，点击下章继续阅读。',
+    '【收藏杂书屋，防止丢失阅读进度】',
+    '请记住本站域名 手机阅读更方便',
+    'https://m.zashuwu.com/book/123.html',
+    '本章未完，點擊下一頁繼續閱讀',
+]
+
+
+def legacy_precise_clean(text):
+    """舊版 PreciseContentCrawler._clean_content（基線原文照抄，僅去掉 self）"""
+    if not text:
+        return ""
+
+    # 去除推薦作品、更多相關作品、章節報錯及其後續內容
+    import re
+    markers_pattern = r'\[推荐作品\]|\[更多相关作品\]|\[章节报错\]'
+    # 只保留標記前的內容
+    text = re.split(markers_pattern, text)[0]
+
+    # NOTE: 章節標題不一定出現在每頁頂部，移除標題前文本的邏輯應在整章拼接後處理
+
+    # 移除常見廣告語（僅針對單行，不跨多行）
+    ad_patterns = [
+        r'本章未完[^\n]*?點擊[^\n]*?下一頁',
+        r'請記住[^\n]*?域名',
+        r'手機[^\n]*?閱讀',
+        r'最新網址',
+        r'最新地址',
+        r'继续阅读',
+        # 根据样本：最新地址：发邮件至 Dz@ZASHUWU.COM
+        r'最新地址：发邮件至[^\n]*',
+        # 根据样本：记得发邮件至地址：Dz@ZASHUWU.COM
+        r'记得发邮件至地址：[^\n]*',
+        r'無彈窗',
+        r'更新最快',
+        r'本站[^\n]*?域名',
+
+        # 新增 – 針對 m.zashuwu.com 常見插入行
+        r'海量小说[^\n]*',
+        r'【[^\n]*?阅读度】',
+        # 邮件/邮箱寻址广告，如“记得邮件找地址：Dz@ZASHUWU.COM”或“记邮箱找地址：Dz@ZASHUWU.COM”
+        r'记(?:得)?(?:邮件|邮箱)[^\n]*?@[^\n]*',
+        # 根据样本：邮箱地址：Dz@ZASHUWU.COM
+        r'邮箱地址[:：][^\n]*',
+        r'最新网址发邮件[^\n]*',
+        # 根据样本：最新地址请发邮件：dz@zashuwu.com
+        r'最新地址请发邮件[:：][^\n]*',
+        r'发邮件取最新域名[^\n]*',
+        # 根据章节末尾广告样本，过滤“发邮件获取最新域名：...”
+        r'发邮件获取最新域名[:：][^\n]*',
+        # 根据样本：发邮箱获取最新域名：DZ@ZASHUWU.COM
+        r'发邮箱获取最新域名[:：][^\n]*',
+        # 根据样本：记得发邮件联系：dz@zashuwu.com
+        r'记得发邮件联系[:：][^\n]*',
+        r'记住[：:][^\n]*?ZASHUWU\.COM',
+        r'杂书屋[：:][^\n]*',
+        # 根据样本：记住【杂书屋】：ZASHUWU.COM
+        r'记住【杂书屋】：[^\n]*',
+        # 根据样本：记住【日虎读书网】：RIHUDS.COM
+        r'记住【日虎读书网】：[^\n]*',
+        r'注册会员可关闭广告[^\n]*',
+        r'您当前阅读进度[^\n]*',
+        # 剩余章节提示，如“剩余4212章待阅，点击下章继续阅读。”
+        r'剩余?\s*\d+\s*章待阅[^\n]*',
+        r'阅读历史[^\n]*?搜书',
+        # 新增 – 针对收藏阅读进度提示及下一章跳转提示
+        r'【收藏[^\n]*?防止丢失阅读进度】',
+        r'(?:正|本)文未完[^\n]*?点击[^\n]*?下一章',
+        r'【[^\n]*?阅读进度】',
+        # 根据样本：卡书屋：KASHUWU.COM
+        r'卡书屋[：:][^\n]*',
+    ]
+
+    # 新增：過濾 “记得在邮件里找地址：dz@zashuwu.com” 等變體
+    ad_patterns.append(r'记(?:得|住)?[^\\n]{0,20}?(?:邮件|邮箱)[^\\n]*?@[^\\n]*')
+
+    for pattern in ad_patterns:
+        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+
+    text = text.replace('叶洄', '叶洵')
+    text = text.replace('叶淘', '叶洵')
+    text = text.replace('叶洽', '叶洵')
+    text = text.replace('叶渊', '叶洵')
+    text = text.replace('叶汐', '叶洵')
+    text = text.replace('叶洺', '叶洵')
+
+    # 清理多餘空行
+    text = re.sub(r'\n\s*\n+', '\n\n', text)
+
+    return text.strip()
+
+
+def sequential_clean(rules, text):
+    """按規則包的順序逐條 re.sub：規則與新引擎相同，只是不合併成單次掃描，用於歸因輸出差異"""
+    if not text:
+        return ""
+    if rules.cut_markers:
+        text = re.split('|'.join(rules.cut_markers), text)[0]
+    for pattern in rules.patterns:
+        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+    for old, new in rules.replacements.items():
+        text = text.replace(old, new)
+    return BLANK_LINES_RE.sub('\n\n', text).strip()
+
+
+def engine_precise_clean(rules, text):
+    if not text:
+        return ""
+    text = rules.apply(text)
+    return BLANK_LINES_RE.sub('\n\n', text).strip()
+
+
+def classify_precise_mismatch(rules, text, engine_out):
+    """歸因 _clean_content 新舊輸出的差異，預期的兩類見模塊說明"""
+    cut = re.split('|'.join(rules.cut_markers), text)[0] if rules.cut_markers else text
+    if any('\n' in m.group(0) for m in LEGACY_CROSS_LINE_RE.finditer(cut)):
+        return r'跨行刪除（基線 [^\\n] 誤寫）'
+    if sequential_clean(rules, text) == engine_out:
+        return '較長規則優先（基線先刪前綴留下殘句）'
+    return '未預期'
+
+
+def legacy_line_clean(text):
+    """舊版 novel_crawler_playwright.clean_content（基線原文照抄）"""
+    ad_patterns = [
+        r'.*雜書屋.*',
+        r'.*杂书屋.*',
+        r'.*zashuwu\.com.*',
+        r'.*ZASHUWU\.COM.*',
+        r'.*記郵件找地址.*',
+        r'.*记邮件找地址.*',
+        r'.*dz@.*',
+        r'.*請記住.*',
+        r'.*请记住.*',
+        r'.*手機閱讀.*',
+        r'.*手机阅读.*',
+        r'.*加入書簽.*',
+        r'.*加入书签.*',
+        r'.*最新章節.*',
+        r'.*最新章节.*',
+        r'.*http[s]?://.*\.com.*',
+        r'^--$',
+        r'^\s*$'
+    ]
+
+    lines = text.split('\n')
+    cleaned_lines = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        is_ad = False
+        for pattern in ad_patterns:
+            if re.search(pattern, line, re.IGNORECASE):
+                is_ad = True
+                break
+
+        if not is_ad:
+            cleaned_lines.append(line)
+
+    return '\n'.join(cleaned_lines)
+
+
+def load_corpus(paths):
+    texts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.txt'):
+                        with open(os.path.join(root, name), 'r', encoding='utf-8', errors='ignore') as f:
+                            texts.append(f.read())
+        elif path.endswith('.sqlite'):
+            conn = sqlite3.connect(path)
+            texts.extend(row[0] for row in conn.execute('SELECT text FROM chapters WHERE text IS NOT NULL'))
+            conn.close()
+        else:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                texts.append(f.read())
+    return texts
+
+
+def synthetic_corpus(count, names, seed=0):
+    rng = random.Random(seed)
+    common = '的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长'
+    names = list(names) + ['叶洵']
+    texts = []
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.randint(60, 120)):
+            roll = rng.random()
+            if roll < 0.05:
+                lines.append(rng.choice(SAMPLE_AD_LINES))
+            else:
+                line = ''.join(rng.choice(common) for _ in range(rng.randint(20, 60)))
+                if roll < 0.15:
+                    pos = rng.randint(0, len(line))
+                    line = line[:pos] + rng.choice(names) + line[pos:]
+                lines.append(line + '。')
+            if rng.random() < 0.3:
+                lines.append('')
+        texts.append('\n'.join(lines))
+    return texts
+
+
+def bench(label, func, texts, repeat):
+    best = float('inf')
+    outputs = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [func(t) for t in texts]
+        best = min(best, time.perf_counter() - start)
+    return label, best, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='章節清理引擎基準測試')
+    parser.add_argument('corpus', nargs='*', help='章節 txt 目錄、txt 文件或 chapters.sqlite')
+    parser.add_argument('--synthetic', type=int, default=2000, help='未提供語料時生成的合成章節數')
+    parser.add_argument('--repeat', type=int, default=3, help='每個實現重複次數，取最快一次')
+    parser.add_argument('--output', help='結果另存到文件（例如 bench_output.txt）')
+    parser.add_argument('--url', default='https://m.zashuwu.com/',
+                        help='按此 URL 的域名選擇清理規則包 (預設: m.zashuwu.com)')
+    args = parser.parse_args()
+
+    rules = RULE_PACKS.rules_for(args.url)
+    texts = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.synthetic, rules.replacements)
+    total_chars = sum(len(t) for t in texts)
+    lines = [f"語料: {len(texts)} 章, {total_chars / 1e6:.1f}M 字符"
+             f"{'' if args.corpus else ' (合成)'}, 規則包: {RULE_PACKS.pack_name_for(args.url)}"]
+
+    if RULE_PACKS.pack_name_for(args.url) != 'zashuwu':
+        lines.append("注意: 舊實現固定使用 m.zashuwu.com 的規則，與其他規則包的輸出差異沒有參考價值")
+
+    for name, legacy, engine, classify in (
+        ('_clean_content', legacy_precise_clean, engine_precise_clean, classify_precise_mismatch),
+        ('clean_content (逐行)', legacy_line_clean, lambda _rules, text: _rules.filter_lines(text), None),
+    ):
+        _, legacy_time, legacy_out = bench('legacy', legacy, texts, args.repeat)
+        _, engine_time, engine_out = bench('engine', lambda t: engine(rules, t), texts, args.repeat)
+        causes = Counter(
+            classify(rules, text, b) if classify else '未預期'
+            for text, a, b in zip(texts, legacy_out, engine_out) if a != b
+        )
+        lines.append(
+            f"{name}: 舊實現 {legacy_time:.3f}s, RuleSet {engine_time:.3f}s, "
+            f"加速 {legacy_time / engine_time:.1f}x, "
+            f"吞吐 {total_chars / engine_time / 1e6:.1f}M 字符/s, 輸出不一致 {sum(causes.values())} 章"
+        )
+        lines.extend(f"  {cause}: {count} 章" for cause, count in causes.most_common())
+
+    report = '\n'.join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+章節存儲：以單個 SQLite（WAL 模式）文件保存整本書的章節，取代輸出目錄中零散的 txt 文件。
+
+每個章節按 (book, idx) 存一行，包含 URL、標題、狀態、原始文本、清理後文本與內容哈希。
+寫入先進入緩衝區，每 batch_size 章在一個事務中批量提交；按章節序號讀取整本書是一次索引掃描。
+
+    store = ChapterStore.for_output_dir(output_dir)
+    store.put('czbooks_1', 12, url, title, text)
+    store.flush()
+    for chapter in store.iter_chapters('czbooks_1'):
+        ...
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+STORE_FILENAME = 'chapters.sqlite'
+
+_COLUMNS = ('book', 'idx', 'url', 'title', 'status', 'raw_text', 'text', 'content_hash', 'updated_at')
+
+
+def content_hash(text):
+    """章節文本的內容哈希（用於判斷章節是否變化）"""
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+
+def read_chapter_file(path):
+    """
+    解析爬蟲保存的章節 txt（開頭為「標題:」「網址:」「狀態:」等標頭，
+    以一行 '-' 分隔正文），返回 dict；沒有標頭時整個文件視為正文
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = f.read()
+
+    headers = {}
+    head, sep, body = data.partition('\n' + '-' * 50 + '\n')
+    if sep:
+        for line in head.splitlines():
+            key, colon, value = line.partition(':')
+            if colon:
+                headers[key.strip()] = value.strip()
+    if not sep or not headers:
+        body = data
+
+    return {
+        'title': headers.get('標題', ''),
+        'url': headers.get('網址', ''),
+        'status': headers.get('狀態', 'success'),
+        'text': body.lstrip('\n'),
+    }
+
+
+class ChapterStore:
+    """按書名與章節序號索引的章節庫"""
+
+    def __init__(self, path, batch_size=200):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = []
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chapters (
+                book TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                url TEXT,
+                title TEXT,
+                status TEXT NOT NULL,
+                raw_text TEXT,
+                text TEXT,
+                content_hash TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (book, idx)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_chapters_url ON chapters(url)')
+        self.conn.commit()
+
+    @classmethod
+    def for_output_dir(cls, output_dir, **kwargs):
+        """在輸出目錄下打開（或創建）預設的章節庫文件"""
+        return cls(os.path.join(output_dir, STORE_FILENAME), **kwargs)
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+    def put(self, book, idx, url, title, text, raw_text=None, status='success'):
+        """緩衝一個章節，累積到 batch_size 後自動在一個事務中寫入"""
+        row = (book, idx, url, title, status, raw_text, text,
+               content_hash(text) if text else None, time.time())
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """寫入所有緩衝中的章節"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(f'''
+                INSERT INTO chapters ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})
+                ON CONFLICT(book, idx) DO UPDATE SET
+                    url = excluded.url,
+                    title = excluded.title,
+                    status = excluded.status,
+                    raw_text = COALESCE(excluded.raw_text, chapters.raw_text),
+                    text = excluded.text,
+                    content_hash = excluded.content_hash,
+                    updated_at = excluded.updated_at
+            ''', self._pending)
+        self._pending = []
+
+    def import_dir(self, book, directory):
+        """
+        把舊的章節 txt 目錄導入章節庫，章節序號取自文件名開頭的數字
+        返回導入的章節數
+        """
+        count = 0
+        for name in os.listdir(directory):
+            match = re.match(r'(\d+)_.*\.txt$', name)
+            if not match:
+                continue
+            chapter = read_chapter_file(os.path.join(directory, name))
+            self.put(book, int(match.group(1)), chapter['url'], chapter['title'],
+                     chapter['text'], status=chapter['status'])
+            count += 1
+        self.flush()
+        return count
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def books(self):
+        """返回章節庫中的所有書名"""
+        self.flush()
+        with self._lock:
+            return [row[0] for row in self.conn.execute('SELECT DISTINCT book FROM chapters ORDER BY book')]
+
+    def get(self, book, idx):
+        """返回單個章節 dict，不存在時返回 None"""
+        self.flush()
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM chapters WHERE book = ? AND idx = ?", (book, idx)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def iter_chapters(self, book, status='success', with_text=True, fetch_size=256):
+        """
+        按章節序號順序逐章返回 dict（一次索引掃描，分批讀取，不會把整本書載入內存）
+        status=None 時返回所有狀態的章節；with_text=False 時不讀取正文
+        """
+        self.flush()
+        columns = _COLUMNS if with_text else tuple(c for c in _COLUMNS if c not in ('raw_text', 'text'))
+        sql = f"SELECT {', '.join(columns)} FROM chapters WHERE book = ?"
+        params = [book]
+        if status is not None:
+            sql += ' AND status = ?'
+            params.append(status)
+        sql += ' ORDER BY idx'
+
+        cursor = self.conn.cursor()
+        with self._lock:
+            cursor.execute(sql, params)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+
+    def counts(self, book):
+        """返回 {狀態: 章節數}"""
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT status, COUNT(*) FROM chapters WHERE book = ? GROUP BY status', (book,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
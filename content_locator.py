@@ -2,18 +2,61 @@
 """
 智能內容區域定位工具
 幫助精確定位小說網站的內容區域
+
+互動模式分析單個頁面；批量模式（--batch）對每個域名抽樣若干章節，
+多個瀏覽器並行在頁面內評分，按各樣本的結果投票選出穩定的選擇器，
+一次為大量域名生成 content_rules_<域名>.json
 """
 
 import os
+import csv
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 import base64
+from text_stats import count_cjk
+from content_scorer import score_in_browser
+from http_utils import DomainRateLimiter
+
+
+def create_firefox(headless=False):
+    """創建 Firefox 瀏覽器"""
+    options = Options()
+    if headless:
+        options.add_argument('--headless')
+    return webdriver.Firefox(options=options)
+
+
+def is_usable_candidate(candidate):
+    """評分候選的尺寸與字數是否像正文區域"""
+    rect = candidate['rect']
+    return rect['width'] > 200 and rect['height'] > 100 and candidate['chars'] > 50
+
+
+def save_content_rules(domain, selector, output_dir='.', **extra):
+    """保存域名的爬取規則到 content_rules_<域名>.json，返回 (規則, 文件路徑)"""
+    rules = {
+        'domain': domain,
+        'content_selector': selector,
+        'wait_time': 3,
+        'encoding': 'auto',
+        'javascript_render': True,
+        'created_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        **extra,
+    }
+    rules_file = os.path.join(output_dir, f"content_rules_{domain}.json")
+    with open(rules_file, 'w', encoding='utf-8') as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2)
+    return rules, rules_file
 
 
 class ContentLocator:
@@ -25,10 +68,7 @@ class ContentLocator:
 
     def _setup_driver(self):
         """設置瀏覽器"""
-        options = Options()
-        if self.headless:
-            options.add_argument('--headless')
-        self.driver = webdriver.Firefox(options=options)
+        self.driver = create_firefox(self.headless)
 
     def analyze_page(self, url):
         """分析頁面結構"""
@@ -36,99 +76,29 @@ class ContentLocator:
         self.driver.get(url)
         time.sleep(3)
 
-        # 收集所有可能的內容區域
+        # 在頁面內按文字密度評分（鏈接密度、中文比例、句讀），一次得到前10個候選
         candidates = []
-
-        # 1. 通過類名和ID查找
-        selectors = [
-            # 常見的內容選擇器
-            ("div[class*='content']", "class-content"),
-            ("div[id*='content']", "id-content"),
-            ("div[class*='chapter']", "class-chapter"),
-            ("div[class*='article']", "class-article"),
-            ("div[class*='text']", "class-text"),
-            ("div[class*='read']", "class-read"),
-            ("div[class*='novel']", "class-novel"),
-            ("article", "tag-article"),
-            ("main", "tag-main"),
-
-            # 中文網站常見
-            ("div[class*='正文']", "class-正文"),
-            ("div[class*='内容']", "class-内容"),
-            ("div[class*='章节']", "class-章节"),
-        ]
-
-        for selector, name in selectors:
-            elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-            for idx, elem in enumerate(elements):
-                try:
-                    # 獲取元素信息
-                    rect = elem.rect
-                    text = elem.text[:200] if elem.text else ""
-                    html = elem.get_attribute('outerHTML')[:500]
-
-                    # 計算文字密度
-                    text_length = len(elem.text) if elem.text else 0
-                    chinese_chars = sum(1 for c in elem.text if '\u4e00' <= c <= '\u9fff') if elem.text else 0
-
-                    if rect['width'] > 200 and rect['height'] > 100 and text_length > 50:
-                        candidates.append({
-                            'selector': f"{selector}:nth-of-type({idx + 1})" if len(elements) > 1 else selector,
-                            'name': name,
-                            'rect': rect,
-                            'text_length': text_length,
-                            'chinese_chars': chinese_chars,
-                            'density': chinese_chars / text_length if text_length > 0 else 0,
-                            'preview': text,
-                            'element': elem
-                        })
-                except:
-                    continue
-
-        # 2. 通過文本特徵查找
-        all_divs = self.driver.find_elements(By.TAG_NAME, "div")
-        for div in all_divs:
+        for scored in score_in_browser(self.driver, limit=10, preview_length=200):
+            if not is_usable_candidate(scored):
+                continue
             try:
-                text = div.text
-                if not text or len(text) < 100:
-                    continue
-
-                # 檢查是否包含小說特徵
-                chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
-                density = chinese_chars / len(text)
-
-                # 高中文密度且包含標點符號
-                if density > 0.5 and any(p in text for p in ['。', '！', '？', '，']):
-                    rect = div.rect
-                    if rect['width'] > 300 and rect['height'] > 200:
-                        # 獲取唯一選擇器
-                        class_name = div.get_attribute('class')
-                        id_name = div.get_attribute('id')
-
-                        selector = None
-                        if id_name:
-                            selector = f"#{id_name}"
-                        elif class_name:
-                            selector = f"div.{class_name.split()[0]}"
-
-                        if selector and not any(c['selector'] == selector for c in candidates):
-                            candidates.append({
-                                'selector': selector,
-                                'name': 'text-feature',
-                                'rect': rect,
-                                'text_length': len(text),
-                                'chinese_chars': chinese_chars,
-                                'density': density,
-                                'preview': text[:200],
-                                'element': div
-                            })
-            except:
+                elem = self.driver.find_element(By.CSS_SELECTOR, scored['selector'])
+            except Exception:
                 continue
-
-        # 排序候選區域
-        candidates.sort(key=lambda x: x['chinese_chars'], reverse=True)
-
-        return candidates[:10]  # 返回前10個候選
+            candidates.append({
+                'selector': scored['selector'],
+                'name': 'density-score',
+                'rect': scored['rect'],
+                'text_length': scored['chars'],
+                'chinese_chars': scored['cjk'],
+                'density': scored['cjk'] / scored['chars'],
+                'link_density': scored['linkDensity'],
+                'score': scored['score'],
+                'preview': scored.get('preview', ''),
+                'element': elem
+            })
+
+        return candidates
 
     def visualize_candidates(self, url, candidates):
         """可視化候選區域"""
@@ -173,14 +143,15 @@ class ContentLocator:
             print(f"   選擇器: {candidate['selector']}")
             print(f"   尺寸: {candidate['rect']['width']}x{candidate['rect']['height']}")
             print(f"   文字數: {candidate['text_length']} (中文: {candidate['chinese_chars']})")
-            print(f"   中文密度: {candidate['density']:.2%}")
+            print(f"   中文密度: {candidate['density']:.2%}  鏈接密度: {candidate['link_density']:.2%}")
+            print(f"   評分: {candidate['score']:.1f}")
             print(f"   預覽: {candidate['preview'][:100]}...")
 
         # 自動推薦
         if candidates:
-            best = max(candidates, key=lambda x: x['chinese_chars'] * x['density'])
+            best = max(candidates, key=lambda x: x['score'])
             best_idx = candidates.index(best)
-            print(f"\n推薦選擇: [{best_idx + 1}] (中文字數最多且密度最高)")
+            print(f"\n推薦選擇: [{best_idx + 1}] (文字密度評分最高)")
 
         # 用戶選擇
         while True:
@@ -228,7 +199,7 @@ class ContentLocator:
             # 獲取文本
             text = elem.text
 
-            chinese_count = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+            chinese_count = count_cjk(text)
 
             print("\n選擇器測試成功！")
             print(f"內容預覽: {text[:500]}...")
@@ -248,22 +219,7 @@ class ContentLocator:
 
     def generate_rules(self, url, selector):
         """生成爬取規則"""
-        domain = urlparse(url).netloc
-
-        rules = {
-            'domain': domain,
-            'content_selector': selector,
-            'wait_time': 3,
-            'encoding': 'auto',
-            'javascript_render': True,
-            'created_time': time.strftime('%Y-%m-%d %H:%M:%S')
-        }
-
-        # 保存規則
-        rules_file = f"content_rules_{domain}.json"
-        with open(rules_file, 'w', encoding='utf-8') as f:
-            json.dump(rules, f, ensure_ascii=False, indent=2)
-
+        rules, rules_file = save_content_rules(urlparse(url).netloc, selector)
         print(f"\n規則已保存: {rules_file}")
 
         return rules
@@ -326,18 +282,190 @@ if __name__ == "__main__":
 
         return output_file
 
+def read_sample_urls(paths):
+    """從章節列表 CSV（第二欄為 URL）或每行一個 URL 的文本文件讀取 URL"""
+    urls = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                rows = (row[1] for row in csv.reader(f) if len(row) > 1)
+            else:
+                rows = f
+            urls.extend(url.strip().strip('"') for url in rows if url.strip().strip('"').startswith('http'))
+    return urls
+
+
+def pick_samples(urls, count):
+    """在章節列表中均勻抽取 count 個 URL（首尾都包含，避免只看到開頭幾章）"""
+    urls = list(dict.fromkeys(urls))
+    if len(urls) <= count:
+        return urls
+    if count == 1:
+        return [urls[len(urls) // 2]]
+    return [urls[round(i * (len(urls) - 1) / (count - 1))] for i in range(count)]
+
+
+def vote_selector(samples):
+    """
+    按各樣本頁面的評分候選投票，返回 (選擇器, 首選票數, 出現次數)；沒有候選時返回 (None, 0, 0)
+
+    排序依據：出現在多少個樣本的候選中（穩定性）> 在多少個樣本中排第一 > 累計得分。
+    只在某一章出現的選擇器（如 nth-of-type 隨側欄變化）因此排在各章都出現的選擇器之後
+    """
+    tally = {}
+    for candidates in samples:
+        seen = set()
+        for rank, candidate in enumerate(candidates):
+            selector = candidate['selector']
+            if selector in seen:
+                continue
+            seen.add(selector)
+            appearances, firsts, score = tally.get(selector, (0, 0, 0.0))
+            tally[selector] = (appearances + 1, firsts + (rank == 0), score + candidate['score'])
+    if not tally:
+        return None, 0, 0
+    selector, (appearances, firsts, _) = max(tally.items(), key=lambda item: item[1])
+    return selector, firsts, appearances
+
+
+class BatchContentLocator:
+    """非互動批量模式：每個域名抽樣 N 章，多個瀏覽器並行評分後投票生成規則"""
+
+    def __init__(self, workers=4, samples=3, headless=True, delay=2.0, min_agreement=0.5,
+                 output_dir='.', page_timeout=30):
+        """
+        Args:
+            workers: 並行的瀏覽器數量
+            samples: 每個域名抽樣的章節數
+            delay: 同一域名兩次導航之間的最小間隔（秒）
+            min_agreement: 選中的選擇器至少要在這個比例的樣本中排第一，才寫入規則
+            output_dir: content_rules_*.json 的輸出目錄
+        """
+        self.workers = max(1, workers)
+        self.samples = max(1, samples)
+        self.headless = headless
+        self.rate_limiter = DomainRateLimiter(delay)
+        self.min_agreement = min_agreement
+        self.output_dir = output_dir
+        self.page_timeout = page_timeout
+
+    def plan(self, urls):
+        """按域名分組並抽樣，返回 {域名: [樣本URL]}"""
+        by_domain = {}
+        for url in urls:
+            by_domain.setdefault(urlparse(url).netloc, []).append(url)
+        return {domain: pick_samples(domain_urls, self.samples) for domain, domain_urls in by_domain.items()}
+
+    def score_page(self, driver, url):
+        """打開頁面並在頁面內評分，返回可用的候選列表"""
+        self.rate_limiter.wait(url)
+        driver.get(url)
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        return [c for c in score_in_browser(driver, limit=5) if is_usable_candidate(c)]
+
+    def _worker(self, tasks, results, lock):
+        """每個工作線程使用自己的瀏覽器，從共享任務列表中取 URL"""
+        try:
+            driver = create_firefox(self.headless)
+        except Exception as e:
+            print(f"瀏覽器啟動失敗: {e}")
+            return
+        try:
+            driver.set_page_load_timeout(self.page_timeout)
+            while True:
+                with lock:
+                    if not tasks:
+                        return
+                    url = tasks.pop()
+                try:
+                    candidates = self.score_page(driver, url)
+                except Exception as e:
+                    print(f"  ✗ {url}: {e}")
+                    continue
+                with lock:
+                    results[urlparse(url).netloc].append(candidates)
+                print(f"  ✓ {url}: {candidates[0]['selector'] if candidates else '無候選'}")
+        finally:
+            driver.quit()
+
+    def run(self, urls):
+        """分析全部域名並寫入規則文件，返回 {域名: 結果摘要}"""
+        plan = self.plan(urls)
+        # 各域名的樣本交錯排列，並行的瀏覽器盡量同時訪問不同網站
+        tasks = []
+        for round_index in range(self.samples):
+            tasks.extend(sample_urls[round_index] for sample_urls in plan.values() if round_index < len(sample_urls))
+        tasks.reverse()  # 從尾部彈出
+
+        print(f"批量分析 {len(plan)} 個域名，共 {len(tasks)} 個樣本頁面，{self.workers} 個瀏覽器")
+        results = {domain: [] for domain in plan}
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks)) or 1) as executor:
+            for _ in range(min(self.workers, len(tasks))):
+                executor.submit(self._worker, tasks, results, lock)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = {}
+        for domain, samples in results.items():
+            selector, firsts, appearances = vote_selector(samples)
+            agreement = firsts / len(samples) if samples else 0.0
+            entry = {
+                'selector': selector,
+                'samples': len(samples),
+                'agreement': round(agreement, 2),
+                'appearances': appearances,
+            }
+            if selector and agreement >= self.min_agreement:
+                _, entry['rules_file'] = save_content_rules(
+                    domain, selector, self.output_dir,
+                    detected_samples=len(samples), agreement=round(agreement, 2))
+                entry['status'] = 'ok'
+            else:
+                entry['status'] = 'unstable' if selector else 'failed'
+            summary[domain] = entry
+            print(f"{domain}: {entry['status']} {selector or '-'} "
+                  f"(首選 {firsts}/{len(samples)}，出現 {appearances}/{len(samples)})")
+
+        summary_file = os.path.join(self.output_dir, 'content_rules_summary.json')
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        ok = sum(1 for entry in summary.values() if entry['status'] == 'ok')
+        print(f"\n完成：{ok}/{len(summary)} 個域名生成規則，摘要: {summary_file}")
+        return summary
+
 
 def main():
     import argparse
 
     parser = argparse.ArgumentParser(description='內容區域定位工具')
-    parser.add_argument('--url', required=True, help='要分析的網頁URL')
+    parser.add_argument('--url', help='要分析的網頁URL')
+    parser.add_argument('--batch', nargs='+', metavar='FILE',
+                        help='批量模式：章節列表 CSV 或 URL 列表文件，按域名抽樣分析並生成規則')
+    parser.add_argument('--samples', type=int, default=3, help='批量模式每個域名抽樣的章節數')
+    parser.add_argument('--workers', type=int, default=4, help='批量模式並行的瀏覽器數量')
+    parser.add_argument('--delay', type=float, default=2.0, help='批量模式同一域名兩次導航之間的最小間隔（秒）')
+    parser.add_argument('--min-agreement', type=float, default=0.5,
+                        help='批量模式選擇器至少在這個比例的樣本中排第一才寫入規則')
+    parser.add_argument('--output-dir', default='.', help='批量模式規則文件輸出目錄')
     parser.add_argument('--test-selector', help='測試指定的CSS選擇器')
     parser.add_argument('--auto', action='store_true', help='自動選擇最佳區域')
     parser.add_argument('--headless', action='store_true', help='無頭模式')
 
     args = parser.parse_args()
 
+    if args.batch:
+        BatchContentLocator(
+            workers=args.workers,
+            samples=args.samples,
+            headless=True,
+            delay=args.delay,
+            min_agreement=args.min_agreement,
+            output_dir=args.output_dir,
+        ).run(read_sample_urls(args.batch))
+        return
+    if not args.url:
+        parser.error('需要 --url 或 --batch')
+
     # 創建定位器
     locator = ContentLocator(headless=args.headless)
 
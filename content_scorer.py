@@ -0,0 +1,348 @@
+"""
+正文區域評分：線性時間的樣板（導航、側欄、頁腳）過濾，供所有提取器共用。
+
+同一套算法有 Python 版（score_nodes，輸入 html_extract 各解析後端產生的扁平節點表）
+和瀏覽器內的 JavaScript 版（CONTENT_SCORER_JS，Selenium / Playwright 直接在頁面上執行），
+兩者對同一頁面給出相同的候選與選擇器。
+
+算法（一次自底向上的遍歷）：
+- 每個元素彙總子樹的可見字符數、鏈接內字符數、中文字數、句讀數與元素數
+- 每段至少 MIN_BLOCK_CHARS 字的文字塊（不在鏈接內）得分 1 + 句讀數 + min(字數 / 100, 3)，
+  加到它所在的塊級容器（跳過 p、span 等行內標籤），容器的父元素再得一半；
+  因此得分集中在直接包含正文段落的元素上，而不是包住整頁的最外層 div
+- 最終得分 = 累計分 × (1 - 鏈接密度) × min(1, 文字密度 / DENSITY_NORM) × (0.5 + 0.5 × 中文比例)
+  鏈接密度 = 鏈接內字符 / 全部字符；文字密度 = 非鏈接字符 / 元素數
+
+扁平節點表按先序排列，每項為 (tag, parent, text, id, classes)：
+文字節點 tag 為 '#text'，只有 text；元素節點 text 為 None。
+"""
+import re
+import threading
+from urllib.parse import urlparse
+
+import text_stats
+from json_cache import load_json, save_json_atomic
+
+TEXT = '#text'
+
+MIN_BLOCK_CHARS = 10
+DENSITY_NORM = 10
+
+# 文字塊所在的容器向上跳過的行內/段落標籤
+INLINE_TAGS = frozenset(['p', 'span', 'font', 'b', 'strong', 'i', 'em', 'u', 'small', 'big', 'center', 'label'])
+
+SENTENCE_PUNCT_RE = re.compile('[，。！？；：、…“”,]')
+_IDENT_RE = re.compile(r'[A-Za-z_][\w-]*')
+
+
+def score_nodes(nodes, limit=5):
+    """
+    對扁平節點表評分，返回得分最高的 limit 個候選 dict（按得分降序）：
+    index, score, chars, cjk, punct, link_density, text_density
+    """
+    n = len(nodes)
+    chars = [0] * n
+    links = [0] * n
+    cjk = [0] * n
+    punct = [0] * n
+    tags = [0] * n
+    acc = [0.0] * n
+
+    # 先序的逆序：子節點總在父節點之前處理
+    for i in range(n - 1, -1, -1):
+        tag, parent, text = nodes[i][0], nodes[i][1], nodes[i][2]
+        if tag == TEXT:
+            stats = text_stats.text_stats(text)
+            chars[i] = stats.visible
+            cjk[i] = stats.cjk
+            punct[i] = len(SENTENCE_PUNCT_RE.findall(text))
+            if chars[i] >= MIN_BLOCK_CHARS and parent >= 0:
+                container = parent
+                for _ in range(2):
+                    if nodes[container][0] in INLINE_TAGS and nodes[container][1] >= 0:
+                        container = nodes[container][1]
+                if nodes[container][0] != 'a':
+                    block = 1 + punct[i] + min(chars[i] / 100, 3)
+                    acc[container] += block
+                    grandparent = nodes[container][1]
+                    if grandparent >= 0:
+                        acc[grandparent] += block / 2
+        else:
+            tags[i] += 1
+            if tag == 'a':
+                links[i] = chars[i]
+        if parent >= 0:
+            chars[parent] += chars[i]
+            links[parent] += links[i]
+            cjk[parent] += cjk[i]
+            punct[parent] += punct[i]
+            tags[parent] += tags[i]
+
+    candidates = []
+    for i in range(n):
+        if nodes[i][0] == TEXT or acc[i] <= 0 or not chars[i]:
+            continue
+        link_density = links[i] / chars[i]
+        text_density = (chars[i] - links[i]) / tags[i]
+        score = (acc[i] * (1 - link_density) * min(1.0, text_density / DENSITY_NORM)
+                 * (0.5 + 0.5 * cjk[i] / chars[i]))
+        candidates.append({
+            'index': i,
+            'score': score,
+            'chars': chars[i],
+            'cjk': cjk[i],
+            'punct': punct[i],
+            'link_density': link_density,
+            'text_density': text_density,
+        })
+    candidates.sort(key=lambda c: c['score'], reverse=True)
+    return candidates[:limit]
+
+
+def subtree_text(nodes, index, separator=''):
+    """節點子樹的文字：各文字節點去掉首尾空白後以 separator 連接（等同 get_text(separator, strip=True)）"""
+    parts = []
+    depth_parents = {index}
+    for j in range(index + 1, len(nodes)):
+        tag, parent = nodes[j][0], nodes[j][1]
+        if parent not in depth_parents:
+            break
+        if tag == TEXT:
+            text = nodes[j][2].strip()
+            if text:
+                parts.append(text)
+        else:
+            depth_parents.add(j)
+    return separator.join(parts)
+
+
+def css_selector(nodes, index):
+    """
+    為節點生成 CSS 選擇器：唯一的 id 優先，其次唯一的「標籤.類名」，
+    否則用 :nth-of-type 向上接到最近的可唯一定位的祖先（與 JS 版規則相同）
+    """
+    id_counts = {}
+    class_counts = {}
+    nth = [0] * len(nodes)
+    sibling_counts = {}
+    for i, (tag, parent, _, node_id, classes) in enumerate(nodes):
+        if tag == TEXT:
+            continue
+        if node_id:
+            id_counts[node_id] = id_counts.get(node_id, 0) + 1
+        for cls in classes or ():
+            key = (tag, cls)
+            class_counts[key] = class_counts.get(key, 0) + 1
+        key = (parent, tag)
+        sibling_counts[key] = sibling_counts.get(key, 0) + 1
+        nth[i] = sibling_counts[key]
+
+    parts = []
+    i = index
+    while i >= 0:
+        tag, parent, _, node_id, classes = nodes[i]
+        if node_id and _IDENT_RE.fullmatch(node_id) and id_counts[node_id] == 1:
+            parts.append(f'#{node_id}')
+            break
+        cls = next((c for c in classes or () if _IDENT_RE.fullmatch(c)), None)
+        if cls and class_counts[(tag, cls)] == 1:
+            parts.append(f'{tag}.{cls}')
+            break
+        if tag in ('body', 'html') or parent < 0:
+            parts.append(tag)
+            break
+        parts.append(f'{tag}.{cls}:nth-of-type({nth[i]})' if cls else f'{tag}:nth-of-type({nth[i]})')
+        i = parent
+    return ' > '.join(reversed(parts))
+
+
+def best_content(nodes, separator='', limit=5):
+    """返回最佳候選 dict（另含 selector 與 text），沒有候選時返回 None"""
+    candidates = score_nodes(nodes, limit)
+    if not candidates:
+        return None
+    best = candidates[0]
+    best['selector'] = css_selector(nodes, best['index'])
+    best['text'] = subtree_text(nodes, best['index'], separator)
+    return best
+
+
+# 瀏覽器內版本：page.evaluate(CONTENT_SCORER_JS, opts) 或
+# driver.execute_script(f"return ({CONTENT_SCORER_JS})(arguments[0]);", opts)
+# opts: {limit: 5, withText: false, previewLength: 0}
+# 返回候選陣列 [{selector, score, chars, cjk, punct, linkDensity, textDensity, rect, text?, preview?}]
+CONTENT_SCORER_JS = r"""
+(opts) => {
+    opts = opts || {};
+    const limit = opts.limit || 5;
+    const MIN_BLOCK_CHARS = 10, DENSITY_NORM = 10;
+    const INLINE = new Set(['p', 'span', 'font', 'b', 'strong', 'i', 'em', 'u', 'small', 'big', 'center', 'label']);
+    const SKIP = new Set(['script', 'style']);
+    const IDENT = /^[A-Za-z_][\w-]*$/;
+    const PUNCT = /[，。！？；：、…“”,]/g;
+    const CJK = /[㐀-䶿一-鿿\u{20000}-\u{2A6DF}\u{2A700}-\u{2EBEF}\u{30000}-\u{3134F}]/gu;
+    const VISIBLE = /[^\s​]/g;
+
+    // 先序扁平節點表
+    const root = document.body || document.documentElement;
+    const nodes = [];
+    const stack = [[root, -1]];
+    while (stack.length) {
+        const [node, parent] = stack.pop();
+        if (node.nodeType === 3) {
+            nodes.push({tag: '#text', parent, text: node.nodeValue});
+            continue;
+        }
+        if (node.nodeType !== 1) continue;
+        const tag = node.tagName.toLowerCase();
+        if (SKIP.has(tag)) continue;
+        const index = nodes.length;
+        nodes.push({tag, parent, node, id: node.id, classes: Array.from(node.classList)});
+        for (let c = node.lastChild; c; c = c.previousSibling) stack.push([c, index]);
+    }
+
+    const n = nodes.length;
+    const chars = new Array(n).fill(0), links = new Array(n).fill(0), cjk = new Array(n).fill(0);
+    const punct = new Array(n).fill(0), tags = new Array(n).fill(0), acc = new Array(n).fill(0);
+    for (let i = n - 1; i >= 0; i--) {
+        const item = nodes[i], parent = item.parent;
+        if (item.tag === '#text') {
+            chars[i] = (item.text.match(VISIBLE) || []).length;
+            cjk[i] = (item.text.match(CJK) || []).length;
+            punct[i] = (item.text.match(PUNCT) || []).length;
+            if (chars[i] >= MIN_BLOCK_CHARS && parent >= 0) {
+                let container = parent;
+                for (let k = 0; k < 2; k++) {
+                    if (INLINE.has(nodes[container].tag) && nodes[container].parent >= 0) container = nodes[container].parent;
+                }
+                if (nodes[container].tag !== 'a') {
+                    const block = 1 + punct[i] + Math.min(chars[i] / 100, 3);
+                    acc[container] += block;
+                    const grandparent = nodes[container].parent;
+                    if (grandparent >= 0) acc[grandparent] += block / 2;
+                }
+            }
+        } else {
+            tags[i] += 1;
+            if (item.tag === 'a') links[i] = chars[i];
+        }
+        if (parent >= 0) {
+            chars[parent] += chars[i]; links[parent] += links[i]; cjk[parent] += cjk[i];
+            punct[parent] += punct[i]; tags[parent] += tags[i];
+        }
+    }
+
+    const candidates = [];
+    for (let i = 0; i < n; i++) {
+        if (nodes[i].tag === '#text' || acc[i] <= 0 || !chars[i]) continue;
+        const linkDensity = links[i] / chars[i];
+        const textDensity = (chars[i] - links[i]) / tags[i];
+        const score = acc[i] * (1 - linkDensity) * Math.min(1, textDensity / DENSITY_NORM)
+            * (0.5 + 0.5 * cjk[i] / chars[i]);
+        candidates.push({index: i, score, chars: chars[i], cjk: cjk[i], punct: punct[i], linkDensity, textDensity});
+    }
+    candidates.sort((a, b) => b.score - a.score);
+
+    // 選擇器（規則同 Python 版 css_selector）
+    const idCounts = {}, classCounts = {}, nth = new Array(n).fill(0), siblingCounts = {};
+    for (let i = 0; i < n; i++) {
+        const item = nodes[i];
+        if (item.tag === '#text') continue;
+        if (item.id) idCounts[item.id] = (idCounts[item.id] || 0) + 1;
+        for (const cls of item.classes) {
+            const key = item.tag + '.' + cls;
+            classCounts[key] = (classCounts[key] || 0) + 1;
+        }
+        const key = item.parent + ' ' + item.tag;
+        siblingCounts[key] = (siblingCounts[key] || 0) + 1;
+        nth[i] = siblingCounts[key];
+    }
+    const selectorFor = (index) => {
+        const parts = [];
+        for (let i = index; i >= 0; i = nodes[i].parent) {
+            const item = nodes[i];
+            if (item.id && IDENT.test(item.id) && idCounts[item.id] === 1) { parts.push('#' + item.id); break; }
+            const cls = item.classes.find(c => IDENT.test(c));
+            if (cls && classCounts[item.tag + '.' + cls] === 1) { parts.push(item.tag + '.' + cls); break; }
+            if (item.tag === 'body' || item.tag === 'html' || item.parent < 0) { parts.push(item.tag); break; }
+            parts.push(cls ? `${item.tag}.${cls}:nth-of-type(${nth[i]})` : `${item.tag}:nth-of-type(${nth[i]})`);
+        }
+        return parts.reverse().join(' > ');
+    };
+
+    return candidates.slice(0, limit).map((c, rank) => {
+        const node = nodes[c.index].node;
+        const r = node.getBoundingClientRect();
+        const result = {
+            selector: selectorFor(c.index), score: c.score, chars: c.chars, cjk: c.cjk, punct: c.punct,
+            linkDensity: c.linkDensity, textDensity: c.textDensity,
+            rect: {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height},
+        };
+        if (opts.withText && rank === 0) result.text = node.innerText || node.textContent || '';
+        if (opts.previewLength) result.preview = (node.innerText || '').substring(0, opts.previewLength);
+        return result;
+    });
+}
+"""
+
+
+def score_in_browser(driver, limit=5, with_text=False, preview_length=0):
+    """在 Selenium 頁面中執行 CONTENT_SCORER_JS，返回候選列表（鍵名見 CONTENT_SCORER_JS）"""
+    opts = {'limit': limit, 'withText': with_text, 'previewLength': preview_length}
+    return driver.execute_script(f"return ({CONTENT_SCORER_JS})(arguments[0]);", opts) or []
+
+
+ELEMENT_STATS_JS = r"""
+(el) => {
+    const CJK = /[㐀-䶿一-鿿\u{20000}-\u{2A6DF}\u{2A700}-\u{2EBEF}\u{30000}-\u{3134F}]/gu;
+    const VISIBLE = /[^\s​]/g;
+    const count = (text, re) => ((text || '').match(re) || []).length;
+    const text = el.textContent || '';
+    let links = 0;
+    for (const a of el.querySelectorAll('a')) links += count(a.textContent, VISIBLE);
+    const chars = count(text, VISIBLE);
+    const r = el.getBoundingClientRect();
+    return {
+        chars, cjk: count(text, CJK), linkDensity: chars ? links / chars : 0,
+        rect: {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height},
+    };
+}
+"""
+
+
+def element_stats_in_browser(driver, element):
+    """頁面中單個元素的字數、中文字數、鏈接密度與位置（鍵名同 score_in_browser 的候選）"""
+    return driver.execute_script(f"return ({ELEMENT_STATS_JS})(arguments[0]);", element)
+
+
+class SiteSelectorCache:
+    """按域名記錄正文選擇器，可持久化到 JSON 文件"""
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.selectors = load_json(cache_file, {}) if cache_file else {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """URL 所屬域名記錄的選擇器，沒有時返回 None"""
+        return self.selectors.get(urlparse(url).netloc) if url else None
+
+    def remember(self, url, selector):
+        domain = urlparse(url).netloc if url else None
+        if not domain or not selector:
+            return
+        with self._lock:
+            if self.selectors.get(domain) == selector:
+                return
+            self.selectors[domain] = selector
+            self._save()
+
+    def forget(self, url):
+        """移除域名記錄（選擇器在新頁面上失效時使用）"""
+        with self._lock:
+            if url and self.selectors.pop(urlparse(url).netloc, None) is not None:
+                self._save()
+
+    def _save(self):
+        if self.cache_file:
+            save_json_atomic(self.cache_file, self.selectors)
@@ -0,0 +1,115 @@
+"""
+爬取任務日誌：以 SQLite（WAL 模式）記錄每個 URL 的狀態、嘗試次數與輸出路徑，
+讓所有爬蟲在中斷後可以續爬，重跑時只處理失敗或輸出文件缺失的章節。
+
+    journal = CrawlJournal(os.path.join(output_dir, 'crawl_journal.sqlite'))
+    done = journal.completed_urls()
+    for url in urls:
+        if url in done:
+            continue
+        journal.start(url)
+        ...
+        journal.finish(url, 'success', output_path=filepath)
+"""
+import os
+import sqlite3
+import threading
+import time
+
+JOURNAL_FILENAME = 'crawl_journal.sqlite'
+
+SUCCESS = 'success'
+FAILED = 'failed'
+RUNNING = 'running'
+
+
+class CrawlJournal:
+    """以 URL 為鍵的持久化任務日誌，可被多個線程/進程共用"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                output_path TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)')
+        self.conn.commit()
+
+    @classmethod
+    def for_output_dir(cls, output_dir):
+        """在輸出目錄下打開（或創建）預設的日誌文件"""
+        return cls(os.path.join(output_dir, JOURNAL_FILENAME))
+
+    def completed_urls(self, check_files=True):
+        """
+        返回已成功完成的 URL 集合（一次索引查詢，10 萬筆也只需毫秒級）
+        check_files=True 時，輸出文件已被刪除的 URL 視為未完成
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT url, output_path FROM jobs WHERE status = ?', (SUCCESS,)
+            ).fetchall()
+        if not check_files:
+            return {url for url, _ in rows}
+        return {url for url, path in rows if not path or os.path.exists(path)}
+
+    def get(self, url):
+        """返回單個 URL 的記錄 dict，不存在時返回 None"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT url, status, attempts, output_path, error, updated_at FROM jobs WHERE url = ?',
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ('url', 'status', 'attempts', 'output_path', 'error', 'updated_at')
+        return dict(zip(keys, row))
+
+    def start(self, url):
+        """標記 URL 開始處理並累加嘗試次數"""
+        with self._lock:
+            self.conn.execute('''
+                INSERT INTO jobs (url, status, attempts, updated_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = jobs.attempts + 1,
+                    updated_at = excluded.updated_at
+            ''', (url, RUNNING, time.time()))
+            self.conn.commit()
+
+    def finish(self, url, status, output_path=None, error=None):
+        """記錄 URL 的處理結果（status 為 'success' 或其他失敗狀態）"""
+        with self._lock:
+            self.conn.execute('''
+                INSERT INTO jobs (url, status, attempts, output_path, error, updated_at)
+                VALUES (?, ?, 1, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = excluded.status,
+                    output_path = COALESCE(excluded.output_path, jobs.output_path),
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+            ''', (url, status, output_path, error, time.time()))
+            self.conn.commit()
+
+    def stats(self):
+        """返回 {狀態: 數量}"""
+        with self._lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,175 @@
+"""
+多本書章節的優先級調度：同時爬幾十本書時，不再按 CSV 順序逐本排空，而是
+
+- 優先級：連載追更的新章節 > 未爬過的存量章節 > 失敗重試（重試按指數退避延後）
+- 每本書公平輪轉：同一優先級內按書輪流取章，不會一本書佔滿所有工作進程
+- 按域名交錯：某域名還在請求間隔內或已達並發上限時跳過它，先做其他域名的章節，
+  寧可先做低優先級的章節也不讓工作進程空等
+
+    scheduler = ChapterScheduler(domain_delay=3, domain_concurrency=2)
+    scheduler.add(ScheduledJob('m1', 120, url, payload), PRIORITY_NEW)
+    run_scheduled(scheduler, run_job, workers=4, executor=ProcessPoolExecutor(4))
+"""
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, NamedTuple
+from urllib.parse import urlparse
+
+from http_utils import DomainRateLimiter
+
+PRIORITY_NEW = 0        # 連載追更：上次爬取之後新出的章節
+PRIORITY_BACKLOG = 1    # 尚未爬過的存量章節
+PRIORITY_RETRY = 2      # 失敗重試
+
+# 失敗重試：第 n 次重試延後 RETRY_BACKOFF * 2^(n-1) 秒
+RETRY_BACKOFF = 30.0
+MAX_RETRIES = 2
+
+
+class ScheduledJob(NamedTuple):
+    book: str
+    idx: int
+    url: str
+    payload: Any = None     # 交給執行函數的任務內容
+    attempts: int = 0
+    not_before: float = 0.0  # 重試任務最早可執行的時刻（time.monotonic()）
+
+
+class ChapterScheduler:
+    """按優先級、書籍輪轉與域名可用性選出下一章"""
+
+    def __init__(self, domain_delay=0.0, domain_concurrency=0, max_retries=MAX_RETRIES,
+                 retry_backoff=RETRY_BACKOFF):
+        """
+        Args:
+            domain_delay: 同一域名兩次請求之間的最小間隔（秒），可為 (最小, 最大) 隨機範圍
+            domain_concurrency: 同一域名同時執行的章節上限，0 表示不限
+            max_retries: 每章失敗後最多重試次數
+        """
+        self.rate_limiter = DomainRateLimiter(domain_delay)
+        self.domain_concurrency = domain_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # 優先級 -> {書名: deque[ScheduledJob]}，OrderedDict 的順序即輪轉順序
+        self.queues = {}
+        self.running = {}   # 域名 -> 執行中的章節數
+        self.failed = []    # 重試次數用完的任務
+
+    def __len__(self):
+        return sum(len(q) for books in self.queues.values() for q in books.values())
+
+    def add(self, job, priority=PRIORITY_BACKLOG):
+        books = self.queues.setdefault(priority, OrderedDict())
+        books.setdefault(job.book, deque()).append(job)
+
+    def _domain_ready(self, url, now):
+        domain = urlparse(url).netloc
+        if self.domain_concurrency and self.running.get(domain, 0) >= self.domain_concurrency:
+            return False
+        return self.rate_limiter.ready_at(url) <= now
+
+    def next(self):
+        """
+        取出下一個可以立即執行的任務並預約其域名的請求時刻，沒有時返回 None
+        （隊列不為空時可用 wait_time() 得知最早何時會有任務可執行）
+        """
+        now = time.monotonic()
+        for priority in sorted(self.queues):
+            books = self.queues[priority]
+            for book in list(books):
+                queue = books[book]
+                job = queue[0]
+                if job.not_before > now or not self._domain_ready(job.url, now):
+                    continue
+                queue.popleft()
+                # 這本書輪到隊尾，同一優先級的其他書先取
+                if queue:
+                    books.move_to_end(book)
+                else:
+                    del books[book]
+                domain = urlparse(job.url).netloc
+                self.running[domain] = self.running.get(domain, 0) + 1
+                self.rate_limiter.reserve(job.url)
+                return job
+        return None
+
+    def wait_time(self):
+        """距離最早有任務可執行還要等的秒數（只考慮請求間隔與重試延後）"""
+        now = time.monotonic()
+        heads = [q[0] for books in self.queues.values() for q in books.values()]
+        if not heads:
+            return 0.0
+        return max(0.0, min(max(job.not_before, self.rate_limiter.ready_at(job.url)) for job in heads) - now)
+
+    def _release(self, job):
+        domain = urlparse(job.url).netloc
+        self.running[domain] = max(0, self.running.get(domain, 0) - 1)
+
+    def done(self, job):
+        self._release(job)
+
+    def retry(self, job):
+        """任務失敗：還有重試次數時延後放入重試隊列，返回是否會重試"""
+        self._release(job)
+        if job.attempts >= self.max_retries:
+            self.failed.append(job)
+            return False
+        delay = self.retry_backoff * (2 ** job.attempts)
+        self.add(job._replace(attempts=job.attempts + 1, not_before=time.monotonic() + delay), PRIORITY_RETRY)
+        return True
+
+
+def run_scheduled(scheduler, run_job, workers=1, executor=None, poll=1.0):
+    """
+    按調度順序執行全部任務，工作進程 / 線程始終保持 workers 個任務在執行
+
+    Args:
+        run_job: run_job(job) -> 是否成功；拋出異常視為失敗。使用進程池時必須可被 pickle
+        executor: concurrent.futures 執行器，None 時在當前線程中逐個執行
+    Returns:
+        (成功數, 最終失敗的任務列表)
+    """
+    succeeded = 0
+    running = {}
+
+    def finish(job, ok):
+        nonlocal succeeded
+        if ok:
+            succeeded += 1
+            scheduler.done(job)
+        elif scheduler.retry(job):
+            print(f"[調度] {job.book} 第 {job.idx} 章失敗，稍後重試（第 {job.attempts + 1} 次）")
+
+    while len(scheduler) or running:
+        while len(running) < workers:
+            job = scheduler.next()
+            if job is None:
+                break
+            if executor is None:
+                try:
+                    ok = run_job(job)
+                except Exception as e:
+                    print(f"[調度] {job.book} 第 {job.idx} 章出錯: {e}")
+                    ok = False
+                finish(job, ok)
+            else:
+                running[executor.submit(run_job, job)] = job
+
+        if not running:
+            if len(scheduler):
+                time.sleep(min(max(scheduler.wait_time(), 0.05), poll))
+            continue
+
+        timeout = min(max(scheduler.wait_time(), 0.05), poll) if len(scheduler) else None
+        completed, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in completed:
+            job = running.pop(future)
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"[調度] {job.book} 第 {job.idx} 章出錯: {e}")
+                ok = False
+            finish(job, ok)
+
+    return succeeded, scheduler.failed
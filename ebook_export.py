@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+電子書導出：把章節庫（chapter_store.ChapterStore）中的一本書導出為 txt 或 EPUB。
+
+章節按序號逐章寫出，不會把整本書拼成一個字串。電子書旁保存每章內容哈希的清單
+（<電子書>.manifest.json），重新導出時只重寫內容變化的章節。
+使用方法：
+    python ebook_export.py novel_output/chapters.sqlite --book czbooks_1 -o novel.epub
+    python ebook_export.py novel_output/chapters.sqlite --book czbooks_1 --import-dir novel_output -o novel.txt
+"""
+import argparse
+import itertools
+import os
+import re
+import zipfile
+from html import escape
+
+from chapter_store import ChapterStore, content_hash, read_chapter_file
+from json_cache import load_json, save_json_atomic
+
+TXT_SEPARATOR = '\n\n' + '=' * 80 + '\n\n'
+CHAPTER_FILE_PATTERN = re.compile(r'(\d+)_.*\.txt$')
+
+
+def iter_chapter_files(directory):
+    """
+    按文件名開頭的章節序號（數值順序，1000_ 排在 999_ 之後）逐個讀取章節 txt，
+    一次只讀一個文件；不符合「序號_標題.txt」的文件（例如合併後的電子書）會被忽略
+    """
+    numbered = []
+    for name in os.listdir(directory):
+        match = CHAPTER_FILE_PATTERN.match(name)
+        if match:
+            numbered.append((int(match.group(1)), name))
+    for idx, name in sorted(numbered):
+        chapter = read_chapter_file(os.path.join(directory, name))
+        chapter['idx'] = idx
+        yield chapter
+
+
+def _manifest_path(path):
+    return f"{path}.manifest.json"
+
+
+def _load_manifest(path, fmt):
+    """讀取電子書旁的章節哈希清單，清單缺失、格式不符或電子書已被改動時返回 None"""
+    manifest = load_json(_manifest_path(path))
+    if not isinstance(manifest, dict) or manifest.get('format') != fmt or not os.path.exists(path):
+        return None
+    if fmt == 'txt' and os.path.getsize(path) != manifest.get('size'):
+        return None
+    return manifest
+
+
+def _save_manifest(path, manifest):
+    save_json_atomic(_manifest_path(path), manifest, indent=None)
+
+
+def _chapter_hash(chapter):
+    return chapter.get('content_hash') or content_hash(chapter.get('text'))
+
+
+def _chapter_text(chapter, load_text):
+    if 'text' in chapter or load_text is None:
+        return chapter.get('text') or ''
+    return load_text(chapter) or ''
+
+
+def _same_chapter(entry, chapter):
+    return (entry['idx'] == chapter.get('idx') and entry['title'] == (chapter.get('title') or '')
+            and entry['hash'] == _chapter_hash(chapter))
+
+
+def _split_unchanged(chapters, old_entries, same):
+    """
+    逐章與清單比對，返回 (未變化的章節數, 從第一個變化章節起的迭代器)；章節全部未變化時迭代器為 None
+    未變化的章節比對完即丟棄，整本書不會同時留在內存中
+    """
+    chapters = iter(chapters)
+    unchanged = 0
+    for chapter in chapters:
+        if unchanged >= len(old_entries) or not same(old_entries[unchanged], chapter, unchanged):
+            return unchanged, itertools.chain([chapter], chapters)
+        unchanged += 1
+    return unchanged, None
+
+
+def _append_txt_chapters(f, chapters, entries, load_text):
+    for chapter in chapters:
+        entries.append({
+            'idx': chapter.get('idx'),
+            'title': chapter.get('title') or '',
+            'hash': _chapter_hash(chapter),
+            'offset': f.tell(),
+        })
+        if f.tell():
+            f.write(TXT_SEPARATOR.encode('utf-8'))
+        if chapter.get('title'):
+            f.write((chapter['title'] + '\n\n').encode('utf-8'))
+        f.write(_chapter_text(chapter, load_text).encode('utf-8'))
+
+
+def write_txt(chapters, path, load_text=None):
+    """
+    把章節（含 'title'、'text' 的 dict）逐章寫入 txt，返回寫入的章節數
+    先寫臨時文件再替換，導出中斷不會破壞舊的電子書；同時寫出章節哈希清單供增量更新
+    """
+    tmp_path = f"{path}.tmp"
+    entries = []
+    with open(tmp_path, 'wb') as f:
+        _append_txt_chapters(f, chapters, entries, load_text)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    _save_manifest(path, {'format': 'txt', 'size': size, 'chapters': entries})
+    return len(entries)
+
+
+def update_txt(chapters, path, load_text=None):
+    """
+    增量更新 txt：保留第一個變化章節之前的字節不動，從該章節的偏移處截斷後只寫出其後的章節
+    返回 (章節總數, 重寫的章節數)；沒有可用的哈希清單時整本重寫
+    chapters 可以是逐章產生的迭代器；可以不帶 'text'（只需 idx/title/content_hash），此時用 load_text(chapter) 讀取需要重寫的章節
+    """
+    manifest = _load_manifest(path, 'txt')
+    if manifest is None:
+        count = write_txt(chapters, path, load_text)
+        return count, count
+
+    old_entries = manifest['chapters']
+    first_changed, changed = _split_unchanged(chapters, old_entries,
+                                              lambda entry, chapter, _: _same_chapter(entry, chapter))
+    if changed is None and first_changed == len(old_entries):
+        return first_changed, 0
+
+    entries = old_entries[:first_changed]
+    offset = old_entries[first_changed]['offset'] if first_changed < len(old_entries) else manifest['size']
+    # 改寫過程中清單失效，中斷後下次會整本重寫
+    os.remove(_manifest_path(path))
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        _append_txt_chapters(f, changed or (), entries, load_text)
+        size = f.tell()
+    _save_manifest(path, {'format': 'txt', 'size': size, 'chapters': entries})
+    return len(entries), len(entries) - first_changed
+
+
+def _chapter_xhtml(title, text):
+    paragraphs = ''.join(f'<p>{escape(line)}</p>\n' for line in (text or '').splitlines() if line.strip())
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="zh">\n'
+        f'<head><title>{escape(title)}</title></head>\n'
+        f'<body>\n<h2>{escape(title)}</h2>\n{paragraphs}</body>\n</html>\n'
+    )
+
+
+_CONTAINER_XML = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+    '</container>\n'
+)
+
+
+def _content_opf(book_title, entries):
+    manifest = ''.join(
+        f'<item id="{item_id}" href="{href}" media-type="application/xhtml+xml"/>\n'
+        for item_id, href, _ in entries
+    )
+    spine = ''.join(f'<itemref idref="{item_id}"/>\n' for item_id, _, _ in entries)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid">\n'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+        f'<dc:identifier id="bookid">{escape(book_title)}</dc:identifier>\n'
+        f'<dc:title>{escape(book_title)}</dc:title>\n'
+        '<dc:language>zh</dc:language>\n'
+        '</metadata>\n'
+        '<manifest>\n'
+        '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n'
+        f'{manifest}</manifest>\n'
+        f'<spine>\n{spine}</spine>\n'
+        '</package>\n'
+    )
+
+
+def _nav_xhtml(book_title, entries):
+    items = ''.join(f'<li><a href="{href}">{escape(title)}</a></li>\n' for _, href, title in entries)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="zh">\n'
+        f'<head><title>{escape(book_title)}</title></head>\n'
+        f'<body>\n<nav epub:type="toc"><h1>{escape(book_title)}</h1>\n<ol>\n{items}</ol></nav>\n</body>\n</html>\n'
+    )
+
+
+def _epub_chapter_entry(n, chapter):
+    title = chapter.get('title') or f'第{n}章'
+    href = f"ch{chapter.get('idx', n):05d}.xhtml"
+    return {'idx': chapter.get('idx', n), 'title': chapter.get('title') or '',
+            'hash': _chapter_hash(chapter), 'href': href, 'label': title}
+
+
+def _write_epub_chapters(zf, chapters, entries, load_text):
+    for chapter in chapters:
+        entry = _epub_chapter_entry(len(entries) + 1, chapter)
+        zf.writestr(f"OEBPS/{entry['href']}", _chapter_xhtml(entry['label'], _chapter_text(chapter, load_text)),
+                    compress_type=zipfile.ZIP_DEFLATED)
+        entries.append(entry)
+
+
+def _write_epub_index(zf, book_title, entries):
+    toc = [(e['href'][:-len('.xhtml')], e['href'], e['label']) for e in entries]
+    zf.writestr('OEBPS/nav.xhtml', _nav_xhtml(book_title, toc), compress_type=zipfile.ZIP_DEFLATED)
+    zf.writestr('OEBPS/content.opf', _content_opf(book_title, toc), compress_type=zipfile.ZIP_DEFLATED)
+
+
+def write_epub(chapters, path, book_title='novel', load_text=None):
+    """
+    把章節逐章寫入 EPUB 壓縮包，返回寫入的章節數
+    每章一個 xhtml 條目，目錄與 OPF 在所有章節寫完後最後寫入
+    """
+    tmp_path = f"{path}.tmp"
+    entries = []
+    with zipfile.ZipFile(tmp_path, 'w') as zf:
+        # mimetype 必須是第一個且不壓縮的條目
+        zf.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        zf.writestr('META-INF/container.xml', _CONTAINER_XML, compress_type=zipfile.ZIP_DEFLATED)
+        _write_epub_chapters(zf, chapters, entries, load_text)
+        _write_epub_index(zf, book_title, entries)
+    os.replace(tmp_path, path)
+    _save_manifest(path, {'format': 'epub', 'chapters': entries})
+    return len(entries)
+
+
+def update_epub(chapters, path, book_title='novel', load_text=None):
+    """
+    增量更新 EPUB：章節條目按序號排列在壓縮包中，第一個變化章節之前的條目從舊壓縮包直接複製，
+    只有其後的章節與目錄從章節內容重新生成，追載連載新章節時只需讀取並渲染新章節；
+    新壓縮包先寫到臨時文件再替換舊文件
+    返回 (章節總數, 重寫的章節數)；沒有可用的哈希清單時整本重寫
+    """
+    manifest = _load_manifest(path, 'epub')
+    src = None
+    if manifest is not None:
+        try:
+            src = zipfile.ZipFile(path)
+        except (OSError, zipfile.BadZipFile):
+            pass
+    # 壓縮包與清單對不上（缺少清單中的章節條目）時同樣整本重寫
+    if src is None or not ({f"OEBPS/{e['href']}" for e in manifest['chapters']} | {'OEBPS/nav.xhtml'}
+                           <= set(src.namelist())):
+        if src is not None:
+            src.close()
+        count = write_epub(chapters, path, book_title, load_text)
+        return count, count
+
+    old_entries = manifest['chapters']
+    first_changed, changed = _split_unchanged(
+        chapters, old_entries,
+        lambda entry, chapter, n: (_same_chapter(entry, chapter)
+                                   and entry['href'] == _epub_chapter_entry(n + 1, chapter)['href']))
+    if changed is None and first_changed == len(old_entries):
+        src.close()
+        return first_changed, 0
+
+    cut_name = (f"OEBPS/{old_entries[first_changed]['href']}" if first_changed < len(old_entries)
+                else 'OEBPS/nav.xhtml')
+    cut = src.getinfo(cut_name).header_offset
+
+    # 改寫過程中清單失效，中斷後下次會整本重寫
+    os.remove(_manifest_path(path))
+    tmp_path = f"{path}.tmp"
+    with src, zipfile.ZipFile(tmp_path, 'w') as zf:
+        # 第一個變化章節之前的條目直接從舊壓縮包複製，不必重新讀取章節庫與渲染 xhtml
+        for info in src.infolist():
+            if info.header_offset < cut:
+                zf.writestr(info, src.read(info), compress_type=info.compress_type)
+
+        entries = old_entries[:first_changed]
+        _write_epub_chapters(zf, changed or (), entries, load_text)
+        _write_epub_index(zf, book_title, entries)
+    os.replace(tmp_path, path)
+    _save_manifest(path, {'format': 'epub', 'chapters': entries})
+    return len(entries), len(entries) - first_changed
+
+
+def write_ebook(chapters, path, book_title='novel', load_text=None):
+    """按輸出文件擴展名（.epub / 其他為 txt）寫出章節，返回章節數"""
+    if path.lower().endswith('.epub'):
+        return write_epub(chapters, path, book_title, load_text)
+    return write_txt(chapters, path, load_text)
+
+
+def update_ebook(chapters, path, book_title='novel', load_text=None):
+    """按輸出文件擴展名增量更新電子書，返回 (章節總數, 重寫的章節數)"""
+    if path.lower().endswith('.epub'):
+        return update_epub(chapters, path, book_title, load_text)
+    return update_txt(chapters, path, load_text)
+
+
+def export_book(store, book, path, book_title=None, incremental=True):
+    """
+    導出章節庫中的一本書，返回 (章節總數, 重寫的章節數)
+    incremental=True 時先只讀取章節哈希比對，只有需要重寫的章節才從章節庫讀取正文
+    """
+    if not incremental:
+        count = write_ebook(store.iter_chapters(book), path, book_title or book)
+        return count, count
+    return update_ebook(store.iter_chapters(book, with_text=False), path, book_title or book,
+                        load_text=lambda chapter: store.get(book, chapter['idx'])['text'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='從章節庫導出 txt / EPUB 電子書')
+    parser.add_argument('store', help='章節庫文件 (chapters.sqlite)')
+    parser.add_argument('--book', required=True, help='書名（章節庫中的 book 鍵）')
+    parser.add_argument('--output', '-o', required=True, help='輸出文件，.epub 結尾導出 EPUB，否則導出 txt')
+    parser.add_argument('--title', help='電子書標題（預設為書名）')
+    parser.add_argument('--import-dir', help='先把舊的章節 txt 目錄導入章節庫')
+    parser.add_argument('--full', action='store_true', help='忽略章節哈希清單，整本重新生成')
+    args = parser.parse_args()
+
+    with ChapterStore(args.store) as store:
+        if args.import_dir:
+            print(f"導入 {store.import_dir(args.book, args.import_dir)} 個章節文件")
+        count, rewritten = export_book(store, args.book, args.output, args.title, incremental=not args.full)
+    print(f"已導出 {count} 章（重寫 {rewritten} 章）: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
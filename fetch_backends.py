@@ -0,0 +1,610 @@
+"""
+可插拔的抓取後端：同一個「載入 URL → 取得正文」操作的多種實現，按成本從低到高排列。
+
+    http       (成本 1)  requests 下載 HTML，用 ContentExtractor 提取正文
+    inittxt    (成本 2)  正文由 initTxt 動態加載時，直接下載 initTxt 指向的文本並解碼
+    selenium   (成本 10) 瀏覽器渲染後提取（Chrome 或 Firefox）
+    playwright (成本 20) Playwright Chromium 渲染後提取
+    ocr        (成本 100) 截取內容區域後 OCR / OpenAI 識別（PreciseContentCrawler），需明確啟用
+
+FetchRouter 從最便宜的後端開始，正文質量不合格（中文太少或密度太低）或出錯時升級到下一個，
+並按域名記住成功的後端，之後同一網站的章節直接從它開始，大多數章節不會啟動瀏覽器。
+各後端按域名的成功率與首選後端持久化在輸出目錄的 fetch_backends.json；首選後端較貴時
+定期探測更便宜的後端，合格即自動降級（某章需要 Playwright 不代表整本書都要用它）。
+
+    router = FetchRouter(default_backends(), cache_file='auto_output/fetch_backends.json')
+    result = router.fetch(url)
+    if result.ok:
+        print(result.backend, result.text)
+    router.close()
+
+    python fetch_backends.py --csv m1.csv --output auto_output --backends http,inittxt,selenium,ocr
+    python fetch_backends.py --csv a.csv b.csv c.csv --interleave --delay 5   # 多個網站交錯，互相填滿等待時間
+"""
+import argparse
+import os
+import threading
+import time
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+import requests
+
+from advanced_decoder import AdvancedDecoder, SITE_METHODS_FILENAME
+from crawl_journal import CrawlJournal
+from crawl_scheduler import ChapterScheduler, ScheduledJob, run_scheduled
+from html_extract import ContentExtractor, SELECTORS_FILENAME
+from http_utils import find_init_txt_url, fetch_initTxt_content_http, get_random_proxy, load_proxies
+from json_cache import load_json, save_json_atomic
+import text_stats
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+except ImportError:
+    webdriver = None
+
+try:
+    from playwright.sync_api import sync_playwright
+except ImportError:
+    sync_playwright = None
+
+try:
+    from precise_content_crawler import PreciseContentCrawler
+except ImportError:
+    PreciseContentCrawler = None
+
+# 按域名記錄成功後端的快取文件名（放在輸出目錄下）
+FETCH_BACKENDS_FILENAME = 'fetch_backends.json'
+
+# 首選後端不是最便宜的時，每隔多少章探測一次更便宜的後端；探測失敗後間隔加倍的上限
+PROBE_INTERVAL = 20
+MAX_PROBE_INTERVAL = 320
+# 近期成功率的指數加權係數
+RATE_ALPHA = 0.2
+
+# 正文質量門檻：中文字數與中文佔非空白字符的比例
+MIN_CJK = 100
+MIN_DENSITY = 0.3
+
+# 驗證頁（Cloudflare 質詢、reCAPTCHA / hCaptcha、站內人機驗證）的特徵字串
+VERIFICATION_MARKERS = (
+    'challenge-platform', 'cf-challenge', 'challenge-form', 'Just a moment...',
+    'g-recaptcha', 'recaptcha/api', 'h-captcha', 'hcaptcha.com',
+    '人機驗證', '人机验证', '安全驗證', '安全验证', '我不是機器人', '请完成验证',
+)
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+
+class FetchResult(NamedTuple):
+    url: str
+    backend: str
+    text: str
+    html: str = ''
+    error: str = ''
+    ok: bool = False    # 由 FetchRouter 按質量門檻判定
+    attempts: tuple = ()    # 由 FetchRouter 填入：本次依次嘗試的 (後端名, 是否合格)
+    probing: bool = False   # 由 FetchRouter 填入：本次是否為探測更便宜後端的嘗試
+
+
+def is_verification_page(html):
+    """頁面是否為驗證頁而不是章節"""
+    return bool(html) and any(marker in html for marker in VERIFICATION_MARKERS)
+
+
+def is_good_content(text, min_cjk=MIN_CJK, min_density=MIN_DENSITY):
+    """正文是否合格：中文字數與中文密度都達到門檻"""
+    stats = text_stats.text_stats(text or '')
+    return stats.cjk >= min_cjk and stats.visible > 0 and stats.cjk / stats.visible >= min_density
+
+
+class FetchBackend:
+    """
+    抓取後端基類
+
+    fetch(url, context) 返回 FetchResult；context 是同一次 FetchRouter.fetch 中各後端共享的字典，
+    前面的後端可以把已下載的內容放進去供後面的後端重用（如 http 下載的 HTML 給 inittxt 找 initTxt）
+    """
+    name = ''
+    cost = 0
+
+    def available(self):
+        """依賴是否已安裝"""
+        return True
+
+    def fetch(self, url, context):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HttpBackend(FetchBackend):
+    name = 'http'
+    cost = 1
+
+    def __init__(self, extractor=None, session=None, get=None, proxies=None, timeout=15):
+        """
+        Args:
+            extractor: 正文提取器，預設新建一個只在內存中記錄選擇器的 ContentExtractor
+            session: requests 會話，預設新建
+            get: 下載函數 get(url) -> response 或 None（如 NovelScraper.get_with_retry），
+                 預設用 session 直接下載；context 中的 'get' 優先（預取器）
+            proxies: 代理列表，每次請求隨機選一個
+        """
+        self.extractor = extractor or ContentExtractor()
+        self.session = session or requests.Session()
+        if session is None:
+            self.session.headers['User-Agent'] = USER_AGENT
+        self.get = get
+        self.proxies = proxies
+        self.timeout = timeout
+
+    def _get(self, url):
+        proxy = get_random_proxy(self.proxies) if self.proxies else None
+        response = self.session.get(url, timeout=self.timeout,
+                                    proxies={'http': proxy, 'https': proxy} if proxy else None)
+        response.raise_for_status()
+        return response
+
+    def fetch(self, url, context):
+        response = (context.get('get') or self.get or self._get)(url)
+        if response is None:
+            return FetchResult(url, self.name, '', error='no response')
+        # 響應頭沒有聲明編碼時 requests 會按 ISO-8859-1 解碼，改用內容推斷的編碼
+        if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = response.apparent_encoding
+        html = response.text
+        context['html'] = html
+        return FetchResult(url, self.name, self.extractor.extract(html, url), html)
+
+
+class InitTxtBackend(FetchBackend):
+    name = 'inittxt'
+    cost = 2
+
+    def __init__(self, decoder=None, session=None, proxies=None, timeout=15):
+        self.decoder = decoder or AdvancedDecoder()
+        self.session = session or requests.Session()
+        if session is None:
+            self.session.headers['User-Agent'] = USER_AGENT
+        self.proxies = proxies
+        self.timeout = timeout
+
+    def fetch(self, url, context):
+        html = context.get('html')
+        if html is None:
+            proxy = get_random_proxy(self.proxies) if self.proxies else None
+            response = self.session.get(url, timeout=self.timeout,
+                                        proxies={'http': proxy, 'https': proxy} if proxy else None)
+            response.raise_for_status()
+            html = context['html'] = response.text
+        init_url = find_init_txt_url(html, url)
+        if not init_url:
+            return FetchResult(url, self.name, '', error='initTxt not found')
+        raw = fetch_initTxt_content_http(init_url, referer=url, proxies=self.proxies, timeout=self.timeout)
+        _, text = self.decoder.decode_best(raw, url)
+        return FetchResult(url, self.name, text)
+
+
+class SeleniumBackend(FetchBackend):
+    name = 'selenium'
+    cost = 10
+
+    def __init__(self, extractor=None, browser='chrome', headless=True, page_timeout=30, driver_factory=None,
+                 proxy=None):
+        """
+        Args:
+            extractor: 正文提取器；瀏覽器渲染後的 DOM 與 HTTP 下載的不同，預設單獨新建一個
+            browser: 'chrome' 或 'firefox'
+            driver_factory: 自定義創建 WebDriver 的函數，預設按 browser 創建
+            proxy: 瀏覽器使用的代理（'http://host:port'），整個瀏覽器生命週期固定不變
+        """
+        self.extractor = extractor or ContentExtractor()
+        self.browser = browser
+        self.headless = headless
+        self.proxy = proxy
+        self.page_timeout = page_timeout
+        self.driver_factory = driver_factory
+        self.driver = None
+
+    def available(self):
+        return webdriver is not None or self.driver_factory is not None
+
+    def _create_driver(self):
+        if self.driver_factory:
+            return self.driver_factory()
+        if self.browser == 'firefox':
+            options = webdriver.FirefoxOptions()
+            if self.headless:
+                options.add_argument('--headless')
+            options.set_preference('general.useragent.override', USER_AGENT)
+            if self.proxy:
+                parsed = urlparse(self.proxy)
+                options.set_preference('network.proxy.type', 1)
+                for scheme in ('http', 'ssl'):
+                    options.set_preference(f'network.proxy.{scheme}', parsed.hostname)
+                    options.set_preference(f'network.proxy.{scheme}_port', parsed.port)
+            driver = webdriver.Firefox(options=options)
+        else:
+            options = webdriver.ChromeOptions()
+            if self.headless:
+                options.add_argument('--headless=new')
+            options.add_argument('--no-sandbox')
+            options.add_argument('--disable-dev-shm-usage')
+            options.add_argument('--disable-blink-features=AutomationControlled')
+            options.add_argument(f'--user-agent={USER_AGENT}')
+            if self.proxy:
+                options.add_argument(f'--proxy-server={self.proxy}')
+            driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(self.page_timeout)
+        return driver
+
+    def fetch(self, url, context):
+        if self.driver is None:
+            self.driver = self._create_driver()
+        self.driver.get(url)
+        WebDriverWait(self.driver, self.page_timeout).until(
+            EC.presence_of_element_located((By.TAG_NAME, 'body')))
+        html = self.driver.page_source
+        return FetchResult(url, self.name, self.extractor.extract(html, url), html)
+
+    def close(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+
+class PlaywrightBackend(FetchBackend):
+    """Playwright 同步 API 只能在啟動它的線程中使用"""
+    name = 'playwright'
+    cost = 20
+
+    def __init__(self, extractor=None, headless=True, page_timeout=30, proxy=None):
+        self.extractor = extractor or ContentExtractor()
+        self.headless = headless
+        self.proxy = proxy
+        self.page_timeout = page_timeout
+        self._playwright = None
+        self._browser = None
+        self._page = None
+
+    def available(self):
+        return sync_playwright is not None
+
+    def fetch(self, url, context):
+        if self._page is None:
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(
+                headless=self.headless, proxy={'server': self.proxy} if self.proxy else None)
+            self._page = self._browser.new_page(user_agent=USER_AGENT)
+        self._page.goto(url, wait_until='networkidle', timeout=self.page_timeout * 1000)
+        html = self._page.content()
+        return FetchResult(url, self.name, self.extractor.extract(html, url), html)
+
+    def close(self):
+        try:
+            if self._browser is not None:
+                self._browser.close()
+            if self._playwright is not None:
+                self._playwright.stop()
+        except Exception:
+            pass
+        self._playwright = self._browser = self._page = None
+
+
+class OcrBackend(FetchBackend):
+    """截圖識別，用於正文被圖片化、HTML 中沒有文字的網站；每章都要調用 OCR / OpenAI，成本最高"""
+    name = 'ocr'
+    cost = 100
+
+    def __init__(self, crawler_factory=None, use_openai=True, openai_key=None, browser='firefox'):
+        """
+        Args:
+            crawler_factory: 創建 PreciseContentCrawler 的函數，預設按其餘參數創建
+            use_openai: 用 OpenAI 識別，False 時用 OCR 服務
+        """
+        self.crawler_factory = crawler_factory
+        self.use_openai = use_openai
+        self.openai_key = openai_key or os.getenv('OPENAI_API_KEY')
+        self.browser = browser
+        self.crawler = None
+
+    def available(self):
+        return PreciseContentCrawler is not None or self.crawler_factory is not None
+
+    def _create_crawler(self):
+        if self.crawler_factory:
+            return self.crawler_factory()
+        return PreciseContentCrawler(use_ocr=not self.use_openai, use_openai=self.use_openai,
+                                     openai_key=self.openai_key, browser=self.browser)
+
+    def fetch(self, url, context):
+        if self.crawler is None:
+            self.crawler = self._create_crawler()
+        text, _ = self.crawler.crawl_page(url)
+        return FetchResult(url, self.name, text or '', error='' if text else 'capture failed')
+
+    def close(self):
+        if self.crawler is not None and self.crawler.driver:
+            try:
+                self.crawler.driver.quit()
+            except Exception:
+                pass
+            self.crawler.driver = None
+        self.crawler = None
+
+
+BACKENDS = {
+    'http': HttpBackend,
+    'inittxt': InitTxtBackend,
+    'selenium': SeleniumBackend,
+    'playwright': PlaywrightBackend,
+    'ocr': OcrBackend,
+}
+
+# 未指定時使用的後端（OCR 按章計費，需明確啟用）
+DEFAULT_BACKENDS = ('http', 'inittxt', 'selenium', 'playwright')
+
+
+def default_backends(names=None, browser='chrome', headless=True, proxies=None, output_dir=None):
+    """
+    按名稱創建後端（預設 DEFAULT_BACKENDS），未安裝依賴的後端由 FetchRouter 跳過
+    提供 output_dir 時 http 後端的選擇器與 inittxt 的解碼方法按域名持久化到輸出目錄；
+    提供 proxies 時 HTTP 請求每次隨機選代理，瀏覽器固定使用其中一個
+    """
+    browser_proxy = get_random_proxy(proxies) if proxies else None
+    backends = []
+    for name in names or DEFAULT_BACKENDS:
+        if name == 'http':
+            cache_file = os.path.join(output_dir, SELECTORS_FILENAME) if output_dir else None
+            backends.append(HttpBackend(ContentExtractor(cache_file=cache_file), proxies=proxies))
+        elif name == 'inittxt':
+            cache_file = os.path.join(output_dir, SITE_METHODS_FILENAME) if output_dir else None
+            backends.append(InitTxtBackend(AdvancedDecoder(cache_file), proxies=proxies))
+        elif name == 'selenium':
+            backends.append(SeleniumBackend(browser=browser, headless=headless, proxy=browser_proxy))
+        elif name == 'playwright':
+            backends.append(PlaywrightBackend(headless=headless, proxy=browser_proxy))
+        elif name == 'ocr':
+            backends.append(OcrBackend())
+        else:
+            raise ValueError(f"未知的抓取後端: {name}")
+    return backends
+
+
+class FetchRouter:
+    """
+    按成本從低到高嘗試後端，質量不合格時升級，並按域名統計各後端的成功率
+
+    每個域名記錄當前首選的後端，之後的章節從它開始；首選後端不是最便宜的時，
+    每隔 probe_interval 章從最便宜的後端重新試一次（探測），更便宜的後端合格即自動降級。
+    探測沒有找到更便宜的後端時探測間隔加倍（上限 MAX_PROBE_INTERVAL），降級後恢復。
+    """
+
+    def __init__(self, backends, cache_file=None, quality=is_good_content, probe_interval=PROBE_INTERVAL):
+        """
+        Args:
+            backends: FetchBackend 列表，依賴未安裝的會被跳過
+            cache_file: 按域名記錄首選後端與成功率的 JSON 文件，None 時只在內存中記錄
+            quality: 判斷正文是否合格的函數 quality(text) -> bool
+            probe_interval: 每隔多少章探測一次更便宜的後端，0 表示不探測
+        """
+        self.backends = sorted((b for b in backends if b.available()), key=lambda b: b.cost)
+        if not self.backends:
+            raise ValueError("沒有可用的抓取後端")
+        self.quality = quality
+        self.probe_interval = probe_interval
+        self.cache_file = cache_file
+        self.domains = {}
+        self._lock = threading.Lock()
+        if cache_file:
+            self.load(cache_file)
+
+    def load(self, path):
+        """載入按域名記錄的首選後端與成功率（不改變保存位置，多進程時各進程可只讀共享的記錄）"""
+        if not os.path.exists(path):
+            return
+        try:
+            # 舊格式只記錄 {域名: 後端名}
+            self.domains = {domain: entry if isinstance(entry, dict) else self._new_entry(entry)
+                            for domain, entry in load_json(path, {}).items()}
+        except AttributeError:
+            self.domains = {}
+
+    def _new_entry(self, preferred=None):
+        return {'preferred': preferred, 'since_probe': 0, 'probe_interval': self.probe_interval, 'backends': {}}
+
+    def _index(self, name):
+        for i, backend in enumerate(self.backends):
+            if backend.name == name:
+                return i
+        return None
+
+    def _probe_due(self, entry):
+        return (self.probe_interval > 0 and bool(self._index(entry['preferred']))
+                and entry['since_probe'] >= entry['probe_interval'])
+
+    def plan(self, url):
+        """
+        本次嘗試的後端：域名有首選後端時從它開始（更便宜的之前不合格），到了探測的時候、
+        或沒有記錄時從最便宜的開始
+        """
+        entry = self.domains.get(urlparse(url).netloc)
+        start = self._index(entry['preferred']) if entry else None
+        if start is None or self._probe_due(entry):
+            return list(self.backends)
+        return self.backends[start:]
+
+    def fetch(self, url, **context):
+        """
+        依次嘗試後端，返回第一個合格的結果（ok=True）；都不合格時返回正文最長的結果（ok=False）
+        context 中的鍵傳給各後端，如 get=prefetcher.get
+        """
+        domain = urlparse(url).netloc
+        entry = self.domains.get(domain)
+        probing = bool(entry) and self._probe_due(entry)
+        best = None
+        winner = None
+        outcomes = []
+        for backend in self.plan(url):
+            try:
+                result = backend.fetch(url, context)
+            except Exception as e:
+                result = FetchResult(url, backend.name, '', error=str(e))
+            ok = self.quality(result.text)
+            outcomes.append((backend.name, ok))
+            if ok:
+                winner = backend.name
+                best = result._replace(ok=True)
+                break
+            if best is None or len(result.text) > len(best.text):
+                best = result
+        self.record(url, outcomes, winner, probing)
+        return best._replace(attempts=tuple(outcomes), probing=probing)
+
+    def record(self, url, outcomes, winner=None, probing=False):
+        """
+        記錄一次抓取的結果並更新域名的首選後端；fetch 會自動調用。
+        多進程時工作進程把 FetchResult 的 attempts / probing 發給單一寫入者，由它調用本方法並保存
+        """
+        domain = urlparse(url).netloc
+        with self._lock:
+            entry = self.domains.setdefault(domain, self._new_entry())
+            for name, ok in outcomes:
+                stats = entry['backends'].setdefault(name, {'success': 0, 'failure': 0, 'rate': None})
+                stats['success' if ok else 'failure'] += 1
+                # 近期成功率（指數加權），比累計次數更能反映網站當前的情況
+                rate = float(ok) if stats['rate'] is None else (1 - RATE_ALPHA) * stats['rate'] + RATE_ALPHA * ok
+                stats['rate'] = round(rate, 3)
+
+            if probing:
+                entry['since_probe'] = 0
+                previous = self._index(entry['preferred'])
+                if winner is not None and self._index(winner) < previous:
+                    entry['probe_interval'] = self.probe_interval
+                else:
+                    entry['probe_interval'] = min(entry['probe_interval'] * 2, MAX_PROBE_INTERVAL)
+            else:
+                entry['since_probe'] += 1
+            if winner is not None:
+                entry['preferred'] = winner
+            self._save()
+
+    def _save(self):
+        if self.cache_file:
+            save_json_atomic(self.cache_file, self.domains)
+
+    def report(self):
+        """各域名的首選後端與各後端的累計成功 / 失敗次數、近期成功率"""
+        lines = []
+        for domain, entry in sorted(self.domains.items()):
+            parts = [f"{name} {stats['success']}/{stats['success'] + stats['failure']} ({stats['rate']:.0%})"
+                     for name, stats in entry['backends'].items() if stats['rate'] is not None]
+            lines.append(f"{domain}: 首選 {entry['preferred']}；" + '，'.join(parts))
+        return '\n'.join(lines)
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+
+def read_chapter_csv(path):
+    """讀取章節列表 CSV（web scraper 導出格式），返回 [(title, url)]"""
+    import csv
+    chapters = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            title = (row.get('tablescraper-selected-row') or '').strip()
+            url = (row.get('tablescraper-selected-row href') or '').strip()
+            if url:
+                chapters.append((title, url))
+    return chapters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按成本逐級升級抓取後端爬取章節')
+    parser.add_argument('--csv', nargs='+', required=True, help='章節列表 CSV，可多個')
+    parser.add_argument('--output', default='auto_output', help='輸出目錄')
+    parser.add_argument('--backends', default=','.join(DEFAULT_BACKENDS),
+                        help=f"逗號分隔的後端名稱（{'、'.join(BACKENDS)}），預設 {','.join(DEFAULT_BACKENDS)}")
+    parser.add_argument('--probe-interval', type=int, default=PROBE_INTERVAL,
+                        help='每隔多少章探測一次更便宜的後端，0 表示不探測')
+    parser.add_argument('--browser', choices=['chrome', 'firefox'], default='chrome', help='selenium 後端的瀏覽器')
+    parser.add_argument('--visible', action='store_true', help='顯示瀏覽器窗口')
+    parser.add_argument('--proxies', default=None, help='代理列表文件')
+    parser.add_argument('--delay', type=float, default=2.0,
+                        help='每章之間的延遲秒數；--interleave 時為同一域名兩次請求的最小間隔')
+    parser.add_argument('--interleave', action='store_true',
+                        help='多個 CSV 按域名交錯執行：某域名在請求間隔內時先抓其他域名的章節')
+    parser.add_argument('--no-resume', action='store_true', help='不跳過任務日誌中已完成的章節')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    proxies = load_proxies(args.proxies) if args.proxies else None
+    router = FetchRouter(
+        default_backends(args.backends.split(','), browser=args.browser, headless=not args.visible,
+                         proxies=proxies, output_dir=args.output),
+        cache_file=os.path.join(args.output, FETCH_BACKENDS_FILENAME),
+        probe_interval=args.probe_interval,
+    )
+    print(f"可用後端: {', '.join(b.name for b in router.backends)}")
+    journal = CrawlJournal.for_output_dir(args.output)
+    done_urls = set() if args.no_resume else journal.completed_urls()
+    usage = {}
+
+    jobs = []
+    for csv_path in args.csv:
+        book = os.path.splitext(os.path.basename(csv_path))[0]
+        sub_out = os.path.join(args.output, book)
+        os.makedirs(sub_out, exist_ok=True)
+        for idx, (title, url) in enumerate(read_chapter_csv(csv_path), 1):
+            if url not in done_urls:
+                jobs.append(ScheduledJob(book, idx, url, (sub_out, title)))
+
+    def crawl(job):
+        sub_out, title = job.payload
+        journal.start(job.url)
+        result = router.fetch(job.url)
+        if not result.ok:
+            journal.finish(job.url, 'no_content', error=result.error or 'low quality')
+            print(f"[失敗] {job.book} {title}: {result.error or '正文質量不合格'}")
+            return False
+        path = os.path.join(sub_out, f"{job.idx:04d}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"{title}\n\n{result.text}")
+        journal.finish(job.url, 'success', output_path=path)
+        usage[result.backend] = usage.get(result.backend, 0) + 1
+        print(f"[{result.backend}] {job.book} {title} ({len(result.text)} 字)")
+        return True
+
+    started = time.monotonic()
+    try:
+        if args.interleave:
+            # 每個域名同時只有一章在抓，請求間隔按域名計算，間隔內的空檔由其他域名的章節填滿
+            scheduler = ChapterScheduler(domain_delay=args.delay, domain_concurrency=1, max_retries=0)
+            for job in jobs:
+                scheduler.add(job)
+            run_scheduled(scheduler, crawl)
+        else:
+            for job in jobs:
+                crawl(job)
+                time.sleep(args.delay)
+    finally:
+        router.close()
+        journal.close()
+
+    elapsed = time.monotonic() - started
+    print(f"共 {len(jobs)} 章，用時 {elapsed:.0f} 秒；各後端成功章節數: {usage}")
+    print(router.report())
+
+
+if __name__ == '__main__':
+    main()
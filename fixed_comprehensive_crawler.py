@@ -10,6 +10,9 @@ import time
 import csv
 import argparse
 from urllib.parse import urljoin, urlparse
+from http_utils import DomainRateLimiter
+from prefetch import TabPrefetcher
+from crawl_journal import CrawlJournal
 
 # 確保只使用 Firefox
 FORCE_FIREFOX = True
@@ -32,10 +35,13 @@ def read_urls_from_csv(csv_file):
     return urls
 
 class ComprehensiveCrawler:
-    def __init__(self, use_ocr=False, delay=3, headless=True):
+    def __init__(self, use_ocr=False, delay=3, headless=True, prefetch=0, resume=True):
         self.use_ocr = use_ocr
         self.delay = delay
         self.headless = headless
+        self.prefetch = prefetch  # 預取深度：處理當前頁面時在備用分頁中提前加載後續頁面
+        self.prefetcher = None
+        self.resume = resume  # 跳過任務日誌中已成功的 URL
         self.driver = None
         self.ocr_reader = None
         self.decoder = None
@@ -163,34 +169,34 @@ class ComprehensiveCrawler:
             print(f"✗ Firefox 驅動設置失敗: {e}")
             return False
 
-    def decode_content(self, content):
+    def decode_content(self, content, url=None):
         """解碼內容"""
         if self.decoder:
-            # 使用進階解碼器
-            results = self.decoder.decode_all(content)
-
-            # 找出包含最多中文的結果
-            best_result = content
-            best_chinese_count = len(self.decoder.extract_chinese(content))
-
-            for method, decoded in results.items():
-                chinese_count = len(self.decoder.extract_chinese(decoded))
-                if chinese_count > best_chinese_count:
-                    best_result = decoded
-                    best_chinese_count = chinese_count
-
-            return best_result
+            # 使用進階解碼器：原文已可讀時直接返回，否則先試該網站上次勝出的方法，
+            # 再按可能性逐個嘗試，遇到可讀結果即停止
+            method, decoded = self.decoder.decode_best(content, url)
+            if method != 'identity':
+                print(f"  解碼方式: {method}")
+            return decoded
         else:
             # 基本解碼
             import html
             return html.unescape(content)
 
+    def open_page(self, url):
+        """打開頁面，啟用預取時直接切換到已在背景加載的分頁"""
+        if self.prefetcher:
+            return self.prefetcher.navigate(url)
+        self.driver.get(url)
+        return False
+
     def crawl_page(self, url):
         """爬取單個頁面"""
         try:
             print(f"訪問: {url}")
-            self.driver.get(url)
-            time.sleep(self.delay)
+            # 預取的分頁已在背景加載並執行過 JavaScript，無需再等待
+            if not self.open_page(url):
+                time.sleep(self.delay)
 
             # 獲取頁面源碼
             page_source = self.driver.page_source
@@ -225,7 +231,7 @@ class ComprehensiveCrawler:
                     content = ""
 
             # 3. 解碼內容
-            decoded_content = self.decode_content(content)
+            decoded_content = self.decode_content(content, url)
 
             # 4. OCR 處理（如果啟用且內容太少）
             if self.use_ocr and len(decoded_content.strip()) < 100:
@@ -254,10 +260,27 @@ class ComprehensiveCrawler:
     def crawl_urls(self, urls, output_dir="output"):
         """爬取多個 URL"""
         os.makedirs(output_dir, exist_ok=True)
-
-        for i, url in enumerate(urls, 1):
+        if self.decoder:
+            # 各網站勝出的解碼方法跨次運行保留
+            from advanced_decoder import SITE_METHODS_FILENAME
+            self.decoder.set_cache_file(os.path.join(output_dir, SITE_METHODS_FILENAME))
+
+        # 任務日誌：跳過已完成的 URL，文件名仍按 URL 在列表中的位置編號
+        journal = CrawlJournal.for_output_dir(output_dir)
+        done_urls = journal.completed_urls() if self.resume else set()
+        pending = [(i, url) for i, url in enumerate(urls, 1) if url not in done_urls]
+        if len(pending) < len(urls):
+            print(f"任務日誌中已完成 {len(urls) - len(pending)} 個URL，將跳過")
+
+        if self.prefetch > 0:
+            self.prefetcher = TabPrefetcher(self.driver, [url for _, url in pending], self.prefetch,
+                                            DomainRateLimiter(self.delay))
+            print(f"已啟用預取，深度: {self.prefetch}")
+
+        for i, url in pending:
             print(f"\n爬取 {i}/{len(urls)}: {url}")
 
+            journal.start(url)
             content = self.crawl_page(url)
 
             if content:
@@ -269,10 +292,20 @@ class ComprehensiveCrawler:
                 with open(filepath, 'w', encoding='utf-8') as f:
                     f.write(content)
 
+                journal.finish(url, 'success', output_path=filepath)
                 print(f"  已保存: {filepath} ({len(content)} 字)")
             else:
+                journal.finish(url, 'failed', error='no content')
                 print("  無內容")
 
+            if self.prefetcher:
+                self.prefetcher.pump()
+
+        if self.prefetcher:
+            self.prefetcher.close()
+            self.prefetcher = None
+        journal.close()
+
     def __del__(self):
         """清理資源"""
         if self.driver:
@@ -287,6 +320,8 @@ def main():
     parser.add_argument('--headless', action='store_true', help='無頭模式')
     parser.add_argument('--output', default='output', help='輸出目錄')
     parser.add_argument('--test', action='store_true', help='測試模式（只爬取前5個）')
+    parser.add_argument('--prefetch', type=int, default=0, help='預取深度：處理當前頁面時在備用分頁中提前加載後N頁')
+    parser.add_argument('--no-resume', action='store_true', help='忽略任務日誌，重新爬取已完成的URL')
 
     args = parser.parse_args()
 
@@ -303,7 +338,9 @@ def main():
     crawler = ComprehensiveCrawler(
         use_ocr=args.use_ocr,
         delay=args.delay,
-        headless=args.headless
+        headless=args.headless,
+        prefetch=args.prefetch,
+        resume=not args.no_resume
     )
 
     # 開始爬取
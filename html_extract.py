@@ -0,0 +1,238 @@
+"""
+HTML 正文提取：按候選 CSS 選擇器查找正文節點，都不命中時由 content_scorer 按文字密度評分找出正文區域。
+
+解析後端可替換，預設使用 C 實現的解析器（selectolax 優先，其次 lxml + cssselect），
+都未安裝時退回 BeautifulSoup(html.parser)。各後端的結果一致：
+- 節點文字等同 BeautifulSoup 的 get_text(strip=True)（不含 script/style 與註釋）
+- nodes() 把文檔展開成 content_scorer 使用的先序扁平節點表，評分只需一次線性遍歷
+- 按域名記住命中的（或評分找出的）選擇器，之後的章節直接先試它
+
+    extractor = ContentExtractor(cache_file='novel_output/content_selectors.json')
+    text = extractor.extract(html, url)
+"""
+import content_scorer
+from content_scorer import TEXT, SiteSelectorCache
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    CSSSelector = None
+
+try:
+    from bs4 import BeautifulSoup, CData, NavigableString, Tag
+except ImportError:
+    BeautifulSoup = None
+
+SELECTORS_FILENAME = 'content_selectors.json'
+
+# 常見的小說內容選擇器，按優先順序
+DEFAULT_SELECTORS = [
+    '.chapter-content',
+    '.content',
+    '.novel-content',
+    '#content',
+    '.text-content',
+    'div[class*="content"]',
+    'div[id*="content"]',
+]
+
+_SKIPPED_TAGS = ['script', 'style']
+
+
+class SelectolaxBackend:
+    name = 'selectolax'
+
+    def parse(self, html):
+        tree = LexborHTMLParser(html)
+        tree.strip_tags(_SKIPPED_TAGS)
+        return tree
+
+    def select_one(self, doc, selector):
+        return doc.css_first(selector)
+
+    def text(self, node):
+        return node.text(deep=True, separator='', strip=True)
+
+    def nodes(self, doc):
+        root = doc.body or doc.root
+        if root is None:
+            return []
+        result = []
+        index_of = {}
+        # traverse() 先返回 root 本身
+        for node in root.traverse(include_text=True):
+            parent = index_of.get(node.parent.mem_id) if result else -1
+            if parent is None:
+                continue
+            if node.is_text_node:
+                result.append((TEXT, parent, node.text_content or '', None, None))
+            elif not node.tag.startswith(('-', '_')):
+                index_of[node.mem_id] = len(result)
+                attrs = node.attributes
+                result.append((node.tag, parent, None, attrs.get('id'), (attrs.get('class') or '').split()))
+        return result
+
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def __init__(self):
+        self._selectors = {}
+
+    def parse(self, html):
+        try:
+            doc = lxml.html.document_fromstring(html)
+        except ValueError:
+            # 帶編碼聲明的 XML/XHTML 字串必須以字節傳入
+            doc = lxml.html.document_fromstring(html.encode('utf-8'))
+        for node in doc.xpath('//script|//style|//comment()'):
+            node.drop_tree()
+        return doc
+
+    def select_one(self, doc, selector):
+        compiled = self._selectors.get(selector)
+        if compiled is None:
+            compiled = self._selectors[selector] = CSSSelector(selector)
+        matches = compiled(doc)
+        return matches[0] if matches else None
+
+    def text(self, node):
+        return ''.join(s.strip() for s in node.itertext())
+
+    def nodes(self, doc):
+        root = doc.find('body')
+        result = []
+        # 元素的 text 屬於元素本身，tail 屬於其父元素，按文件順序入棧
+        stack = [(root if root is not None else doc, -1)]
+        while stack:
+            item, parent = stack.pop()
+            if isinstance(item, str):
+                result.append((TEXT, parent, item, None, None))
+                continue
+            if not isinstance(item.tag, str):
+                continue
+            index = len(result)
+            result.append((item.tag, parent, None, item.get('id'), (item.get('class') or '').split()))
+            for child in reversed(item):
+                if child.tail:
+                    stack.append((child.tail, index))
+                stack.append((child, index))
+            if item.text:
+                stack.append((item.text, index))
+        return result
+
+
+class Bs4Backend:
+    name = 'bs4'
+
+    def parse(self, html):
+        return BeautifulSoup(html, 'html.parser')
+
+    def select_one(self, doc, selector):
+        return doc.select_one(selector)
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+    def nodes(self, doc):
+        root = doc.body or doc
+        result = [(root.name, -1, None, root.get('id'), root.get('class') or [])]
+        index_of = {id(root): 0}
+        for node in root.descendants:
+            parent = index_of.get(id(node.parent))
+            if parent is None:
+                continue
+            if isinstance(node, Tag):
+                if node.name in _SKIPPED_TAGS:
+                    continue
+                index_of[id(node)] = len(result)
+                result.append((node.name, parent, None, node.get('id'), node.get('class') or []))
+            elif type(node) in (NavigableString, CData):
+                # 與 get_text() 相同，只計普通文字與 CDATA（不含註釋）
+                result.append((TEXT, parent, str(node), None, None))
+        return result
+
+
+BACKENDS = {
+    'selectolax': (SelectolaxBackend, lambda: LexborHTMLParser is not None),
+    'lxml': (LxmlBackend, lambda: CSSSelector is not None),
+    'bs4': (Bs4Backend, lambda: BeautifulSoup is not None),
+}
+
+
+def available_backends():
+    """已安裝的後端名稱，按預設優先順序"""
+    return [name for name, (_, available) in BACKENDS.items() if available()]
+
+
+def get_backend(name=None):
+    """返回解析後端實例；name 為 None 時選第一個可用的"""
+    if name is None:
+        names = available_backends()
+        if not names:
+            raise ImportError("需要安裝 selectolax、lxml+cssselect 或 beautifulsoup4 之一")
+        name = names[0]
+    if name not in BACKENDS:
+        raise ValueError(f"未知的解析後端: {name}（可選: {', '.join(BACKENDS)}）")
+    backend_class, available = BACKENDS[name]
+    if not available():
+        raise ImportError(f"解析後端 {name} 未安裝")
+    return backend_class()
+
+
+class ContentExtractor:
+    """按選擇器提取正文，並按域名快取命中的選擇器"""
+
+    def __init__(self, selectors=None, backend=None, cache_file=None):
+        """
+        Args:
+            selectors: 候選選擇器，預設 DEFAULT_SELECTORS
+            backend: 解析後端名稱（'selectolax'、'lxml'、'bs4'），None 時自動選擇
+            cache_file: 按域名記錄選擇器的 JSON 文件，None 時只在內存中記錄
+        """
+        self.selectors = list(selectors or DEFAULT_SELECTORS)
+        self.backend = get_backend(backend)
+        self.site_selectors = SiteSelectorCache(cache_file)
+
+    def extract(self, html, url=None):
+        """
+        返回正文文字：第一個命中的選擇器所選節點的文字；
+        節點不存在或沒有文字時按文字密度評分取正文區域，並記住它的選擇器
+        """
+        if not html or not html.strip():
+            return ""
+        doc = self.backend.parse(html)
+        known = self.site_selectors.get(url)
+        selectors = [known] + [s for s in self.selectors if s != known] if known else self.selectors
+
+        for selector in selectors:
+            node = self.backend.select_one(doc, selector)
+            if node is None:
+                continue
+            content = self.backend.text(node)
+            if content and selector != known:
+                self.site_selectors.remember(url, selector)
+            if content:
+                return content
+            break
+
+        best = self.detect(doc)
+        if best is None:
+            return ""
+        self.site_selectors.remember(url, best['selector'])
+        return best['text']
+
+    def detect(self, doc, separator=''):
+        """
+        對已解析的文檔（或 HTML 字串）做文字密度評分，
+        返回最佳候選（含 selector 與 text，見 content_scorer.best_content），沒有時返回 None
+        """
+        if isinstance(doc, str):
+            doc = self.backend.parse(doc)
+        return content_scorer.best_content(self.backend.nodes(doc), separator)
@@ -3,6 +3,8 @@
 """
 import re
 import random
+import threading
+import time
 from urllib.parse import urlparse
 
 import requests
@@ -41,6 +43,43 @@ def validate_proxies(proxy_list, test_url='http://httpbin.org/ip', timeout=5):
     return [p for p in proxy_list if validate_proxy(p, test_url, timeout)]
 
 
+class DomainRateLimiter:
+    """
+    按域名限制請求頻率
+    interval 可為固定秒數，或 (最小, 最大) 範圍（每次隨機取值，模擬人類閱讀）
+    """
+
+    def __init__(self, interval=3.0):
+        self.interval = interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def _pick_interval(self):
+        if isinstance(self.interval, (tuple, list)):
+            return random.uniform(*self.interval)
+        return self.interval
+
+    def reserve(self, url):
+        """預約該域名下一個可用的請求時刻（time.monotonic() 時間），並把後續時刻往後推"""
+        domain = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(domain, now))
+            self._next_slot[domain] = slot + self._pick_interval()
+            return slot
+
+    def ready_at(self, url):
+        """該域名下一個可用的請求時刻（time.monotonic() 時間），不預約"""
+        with self._lock:
+            return self._next_slot.get(urlparse(url).netloc, 0.0)
+
+    def wait(self, url):
+        """阻塞直到該域名可以發出下一個請求"""
+        delay = self.reserve(url) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
 def extract_init_txt_url_http(page_url, proxies=None, timeout=10):
     """使用純 HTTP 方式解析頁面，提取 initTxt 動態加載的內容 URL"""
     headers = {
@@ -54,10 +93,17 @@ def extract_init_txt_url_http(page_url, proxies=None, timeout=10):
     proxies_dict = {'http': proxy, 'https': proxy} if proxy else None
     resp = requests.get(page_url, headers=headers, proxies=proxies_dict, timeout=timeout)
     resp.raise_for_status()
-    html = resp.text
+    url = find_init_txt_url(resp.text, page_url)
+    if not url:
+        raise ValueError(f"initTxt URL not found in page: {page_url}")
+    return url
+
+
+def find_init_txt_url(html, page_url):
+    """從已下載的頁面 HTML 中找出 initTxt 的內容 URL，沒有時返回 None"""
     match = re.search(r'initTxt\((?:"|\')(.*?)(?:"|\')', html)
     if not match:
-        raise ValueError(f"initTxt URL not found in page: {page_url}")
+        return None
     url = match.group(1)
     if url.startswith('//'):
         url = 'https:' + url
@@ -0,0 +1,426 @@
+"""
+分布式爬取任務隊列：以 SQLite（WAL 模式，靠文件鎖保證原子領取）保存章節任務，
+任意機器上的工作進程領取任務、用現有的爬蟲類執行、把結果寫回隊列，
+再由一個匯總進程把結果寫入各書的章節庫與任務日誌。
+
+- 領取（lease）帶可見性超時：工作進程掛掉或斷網時，超時後任務自動回到可領取狀態，由其他節點重試；
+  長任務（OCR）在執行期間定期續租
+- 確認（ack）是冪等的：同一任務只有第一次確認生效，之後的重複確認（包括租約過期後被重試的那一份）直接忽略
+- 生產任務以 (書名, URL) 為鍵，重複導入同一 CSV 不會產生重複任務
+
+    python job_queue.py --db jobs.sqlite produce --csv m1.csv m2.csv
+    python job_queue.py --db jobs.sqlite work --backends http,selenium --worker-id nodeA-1
+    python job_queue.py --db jobs.sqlite collect --output novels
+    python job_queue.py --db jobs.sqlite status
+
+多台機器共用隊列時把 jobs.sqlite 放在共享目錄上（需支持 POSIX 文件鎖）。
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import NamedTuple
+
+from chapter_store import ChapterStore
+from crawl_journal import CrawlJournal
+from fetch_backends import (DEFAULT_BACKENDS, FETCH_BACKENDS_FILENAME, FetchRouter, default_backends,
+                            is_verification_page, read_chapter_csv)
+from http_utils import load_proxies
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# 租約（可見性超時）秒數；執行期間每隔三分之一租期續租一次
+VISIBILITY_TIMEOUT = 300
+MAX_ATTEMPTS = 3
+# 隊列暫時為空時工作進程重新查詢的間隔
+POLL_INTERVAL = 5.0
+
+
+class Job(NamedTuple):
+    id: int
+    key: str
+    payload: dict
+    token: str          # 本次租約的憑證，續租、確認、退回時使用
+    attempts: int
+
+
+class JobQueue:
+    """SQLite 任務隊列，可被多個線程 / 進程 / 節點共用"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                lease_token TEXT,
+                lease_until REAL,
+                worker TEXT,
+                result TEXT,
+                error TEXT,
+                collected INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(queue, status, priority, id)')
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE：先取得寫鎖再讀，保證多個節點不會領到同一個任務"""
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def put(self, payload, key, queue='chapters', priority=0, max_attempts=MAX_ATTEMPTS):
+        """加入任務，key 已存在時忽略；返回是否新加入"""
+        with self._lock:
+            cursor = self.conn.execute('''
+                INSERT OR IGNORE INTO jobs (queue, key, payload, priority, status, max_attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (queue, key, json.dumps(payload, ensure_ascii=False), priority, PENDING, max_attempts,
+                  time.time()))
+            return cursor.rowcount == 1
+
+    def lease(self, worker, queue='chapters', timeout=VISIBILITY_TIMEOUT):
+        """領取一個可執行的任務（待處理，或租約已過期），沒有時返回 None"""
+        now = time.time()
+        with self._lock:
+            self._transaction()
+            try:
+                # 租約過期且已用完嘗試次數的任務不再重試
+                self.conn.execute('''
+                    UPDATE jobs SET status = ?, error = COALESCE(error, 'lease expired'), updated_at = ?
+                    WHERE queue = ? AND status = ? AND lease_until < ? AND attempts >= max_attempts
+                ''', (FAILED, now, queue, LEASED, now))
+                row = self.conn.execute('''
+                    SELECT id, key, payload, attempts FROM jobs
+                    WHERE queue = ? AND (status = ? OR (status = ? AND lease_until < ?))
+                    ORDER BY priority DESC, id LIMIT 1
+                ''', (queue, PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    self.conn.execute('COMMIT')
+                    return None
+                job_id, key, payload, attempts = row
+                token = uuid.uuid4().hex
+                self.conn.execute('''
+                    UPDATE jobs SET status = ?, attempts = attempts + 1, lease_token = ?, lease_until = ?,
+                                    worker = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (LEASED, token, now + timeout, worker, now, job_id))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return Job(job_id, key, json.loads(payload), token, attempts + 1)
+
+    def extend(self, job, timeout=VISIBILITY_TIMEOUT):
+        """續租；租約已被他人接手時返回 False"""
+        with self._lock:
+            cursor = self.conn.execute('''
+                UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_token = ?
+            ''', (time.time() + timeout, time.time(), job.id, LEASED, job.token))
+            return cursor.rowcount == 1
+
+    def ack(self, job, result):
+        """
+        確認完成並保存結果；任務已完成時忽略（冪等），返回本次確認是否生效。
+        租約過期後被其他節點接手的任務仍接受遲到的結果，之後那個節點的確認會被忽略
+        """
+        with self._lock:
+            cursor = self.conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = NULL, lease_token = NULL, lease_until = NULL,
+                                collected = 0, updated_at = ?
+                WHERE id = ? AND status != ?
+            ''', (DONE, json.dumps(result, ensure_ascii=False), time.time(), job.id, DONE))
+            return cursor.rowcount == 1
+
+    def nack(self, job, error):
+        """退回任務：還有嘗試次數時回到待處理，否則記為失敗；租約已不屬於自己時忽略"""
+        with self._lock:
+            cursor = self.conn.execute('''
+                UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,
+                                error = ?, lease_token = NULL, lease_until = NULL, updated_at = ?
+                WHERE id = ? AND status = ? AND lease_token = ?
+            ''', (FAILED, PENDING, error, time.time(), job.id, LEASED, job.token))
+            return cursor.rowcount == 1
+
+    def requeue_failed(self, queue='chapters'):
+        """把失敗的任務重置為待處理（重新計算嘗試次數），返回數量"""
+        with self._lock:
+            cursor = self.conn.execute('''
+                UPDATE jobs SET status = ?, attempts = 0, updated_at = ? WHERE queue = ? AND status = ?
+            ''', (PENDING, time.time(), queue, FAILED))
+            return cursor.rowcount
+
+    def uncollected(self, queue='chapters'):
+        """已完成但尚未匯總的任務：[(id, payload, result)]"""
+        with self._lock:
+            rows = self.conn.execute('''
+                SELECT id, payload, result FROM jobs WHERE queue = ? AND status = ? AND collected = 0 ORDER BY id
+            ''', (queue, DONE)).fetchall()
+        return [(job_id, json.loads(payload), json.loads(result)) for job_id, payload, result in rows]
+
+    def failed(self, queue='chapters'):
+        """失敗的任務：[(payload, error)]"""
+        with self._lock:
+            rows = self.conn.execute('SELECT payload, error FROM jobs WHERE queue = ? AND status = ?',
+                                     (queue, FAILED)).fetchall()
+        return [(json.loads(payload), error) for payload, error in rows]
+
+    def mark_collected(self, job_ids):
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('UPDATE jobs SET collected = 1 WHERE id = ?', [(i,) for i in job_ids])
+            self.conn.execute('COMMIT')
+
+    def stats(self, queue='chapters'):
+        """返回 {狀態: 數量}"""
+        with self._lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status',
+                                     (queue,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class FetchHandler:
+    """用 FetchRouter（HTTP → initTxt → 瀏覽器逐級升級）執行章節任務"""
+
+    def __init__(self, backends=DEFAULT_BACKENDS, browser='chrome', headless=True, proxies=None, cache_dir=None):
+        """
+        Args:
+            cache_dir: 按域名的後端統計、正文選擇器與解碼方法的保存目錄，None 時只在內存中記錄；
+                       多個節點共用同一目錄時以最後保存的為準
+        """
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.router = FetchRouter(
+            default_backends(list(backends), browser=browser, headless=headless, proxies=proxies,
+                             output_dir=cache_dir),
+            cache_file=os.path.join(cache_dir, FETCH_BACKENDS_FILENAME) if cache_dir else None,
+        )
+
+    def __call__(self, payload):
+        result = self.router.fetch(payload['url'])
+        if is_verification_page(result.html):
+            raise RuntimeError('verification page')
+        if not result.ok:
+            raise RuntimeError(result.error or 'low quality content')
+        return {'text': result.text, 'backend': result.backend}
+
+    def close(self):
+        self.router.close()
+
+
+class OcrHandler:
+    """用 PreciseContentCrawler 截圖識別執行章節任務"""
+
+    def __init__(self, rules_file=None, openai_key=None, browser='firefox'):
+        from precise_content_crawler import PreciseContentCrawler
+        self.crawler = PreciseContentCrawler(rules_file=rules_file, use_openai=True,
+                                             openai_key=openai_key or os.getenv('OPENAI_API_KEY'),
+                                             browser=browser)
+
+    def __call__(self, payload):
+        text, _ = self.crawler.crawl_page(payload['url'])
+        if not text:
+            raise RuntimeError('capture failed')
+        return {'text': text, 'backend': 'ocr'}
+
+    def close(self):
+        if self.crawler.driver:
+            self.crawler.driver.quit()
+            self.crawler.driver = None
+
+
+class QueueWorker:
+    """從隊列領取任務並交給 handler 執行；執行期間在後台線程續租"""
+
+    def __init__(self, job_queue, handler, worker_id=None, timeout=VISIBILITY_TIMEOUT, poll=POLL_INTERVAL,
+                 delay=0.0):
+        """
+        Args:
+            handler: handler(payload) -> 結果 dict，拋出異常表示失敗（任務退回，由其他節點重試）
+            worker_id: 寫入隊列的節點標識，預設為 主機名-進程號
+            delay: 兩個任務之間的延遲秒數
+        """
+        self.queue = job_queue
+        self.handler = handler
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.timeout = timeout
+        self.poll = poll
+        self.delay = delay
+
+    def _keep_alive(self, job, stop):
+        while not stop.wait(self.timeout / 3):
+            if not self.queue.extend(job, self.timeout):
+                return
+
+    def run_one(self, job):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(job, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handler(job.payload)
+        except Exception as e:
+            self.queue.nack(job, str(e))
+            print(f"[{self.worker_id}] 失敗 {job.key} (第 {job.attempts} 次): {e}")
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+        if self.queue.ack(job, result):
+            print(f"[{self.worker_id}] 完成 {job.key} ({result.get('backend')}, {len(result.get('text', ''))} 字)")
+        else:
+            print(f"[{self.worker_id}] {job.key} 已由其他節點完成，忽略本次結果")
+        return True
+
+    def run(self, max_jobs=None, exit_when_empty=False):
+        """持續領取並執行任務，返回執行的任務數"""
+        count = 0
+        while max_jobs is None or count < max_jobs:
+            job = self.queue.lease(self.worker_id, timeout=self.timeout)
+            if job is None:
+                if exit_when_empty:
+                    break
+                time.sleep(self.poll)
+                continue
+            self.run_one(job)
+            count += 1
+            if self.delay:
+                time.sleep(self.delay)
+        return count
+
+
+def produce(job_queue, csv_paths, priority=0):
+    """把 CSV 中的章節加入隊列，書名為 CSV 檔名；返回新加入的任務數"""
+    added = 0
+    for csv_path in csv_paths:
+        book = os.path.splitext(os.path.basename(csv_path))[0]
+        for idx, (title, url) in enumerate(read_chapter_csv(csv_path), 1):
+            payload = {'book': book, 'idx': idx, 'title': title, 'url': url}
+            added += job_queue.put(payload, key=f"{book}:{url}", priority=priority)
+    return added
+
+
+def collect(job_queue, output_dir):
+    """把已完成的任務寫入 output_dir/<書名>/ 的章節庫、任務日誌與章節 txt；可重複執行"""
+    stores, journals = {}, {}
+    collected = []
+
+    def book_dir(book):
+        directory = os.path.join(output_dir, book)
+        if book not in journals:
+            journals[book] = CrawlJournal.for_output_dir(directory)
+        return directory
+
+    try:
+        for job_id, payload, result in job_queue.uncollected():
+            book = payload['book']
+            directory = book_dir(book)
+            if book not in stores:
+                stores[book] = ChapterStore.for_output_dir(directory)
+            stores[book].put(book, payload['idx'], payload['url'], payload['title'], result['text'])
+            safe_title = "".join(c for c in payload['title'] if c.isalnum() or c in (' ', '-', '_')).rstrip()
+            path = os.path.join(directory, f"{payload['idx']:03d}_{safe_title}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"標題: {payload['title']}\n")
+                f.write(f"網址: {payload['url']}\n")
+                f.write("狀態: success\n")
+                f.write("-" * 50 + "\n\n")
+                f.write(result['text'])
+            journals[book].finish(payload['url'], 'success', output_path=path)
+            collected.append(job_id)
+        for payload, error in job_queue.failed():
+            book_dir(payload['book'])
+            journals[payload['book']].finish(payload['url'], 'failed', error=error)
+    finally:
+        for store in stores.values():
+            store.flush()
+        for journal in journals.values():
+            journal.close()
+    # 先寫入章節庫再標記，匯總中途中斷時下次會重寫而不是丟失
+    job_queue.mark_collected(collected)
+    return len(collected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分布式爬取任務隊列')
+    parser.add_argument('--db', default='jobs.sqlite', help='隊列數據庫文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('produce', help='把 CSV 中的章節加入隊列')
+    p.add_argument('--csv', nargs='+', required=True, help='章節列表 CSV，書名為檔名')
+    p.add_argument('--priority', type=int, default=0, help='優先級，數值大的先執行')
+    p.add_argument('--requeue-failed', action='store_true', help='同時把失敗的任務重置為待處理')
+
+    w = sub.add_parser('work', help='領取並執行任務')
+    w.add_argument('--mode', choices=['fetch', 'ocr'], default='fetch',
+                   help='fetch：按成本逐級升級的抓取後端；ocr：截圖 + OpenAI 識別')
+    w.add_argument('--backends', default=','.join(DEFAULT_BACKENDS), help='fetch 模式的抓取後端')
+    w.add_argument('--browser', choices=['chrome', 'firefox'], default=None, help='使用的瀏覽器')
+    w.add_argument('--visible', action='store_true', help='顯示瀏覽器窗口')
+    w.add_argument('--proxies', default=None, help='代理列表文件')
+    w.add_argument('--cache-dir', default=None,
+                   help='fetch 模式按域名記住的後端、選擇器與解碼方法的保存目錄，預設為隊列數據庫所在目錄')
+    w.add_argument('--rules', default=None, help='ocr 模式的內容定位規則文件')
+    w.add_argument('--openai-key', default=None, help='ocr 模式的 OpenAI API key')
+    w.add_argument('--worker-id', default=None, help='節點標識，預設為 主機名-進程號')
+    w.add_argument('--visibility-timeout', type=float, default=VISIBILITY_TIMEOUT, help='租約秒數')
+    w.add_argument('--delay', type=float, default=0.0, help='兩個任務之間的延遲秒數')
+    w.add_argument('--exit-when-empty', action='store_true', help='隊列為空時退出，不繼續等待')
+
+    c = sub.add_parser('collect', help='把已完成的結果寫入各書的章節庫')
+    c.add_argument('--output', default='novels', help='輸出目錄，每本書一個子目錄')
+
+    sub.add_parser('status', help='顯示各狀態的任務數')
+    args = parser.parse_args()
+
+    job_queue = JobQueue(args.db)
+    try:
+        if args.command == 'produce':
+            if args.requeue_failed:
+                print(f"重置失敗任務 {job_queue.requeue_failed()} 個")
+            print(f"新加入任務 {produce(job_queue, args.csv, args.priority)} 個")
+        elif args.command == 'work':
+            if args.mode == 'ocr':
+                handler = OcrHandler(args.rules, args.openai_key, browser=args.browser or 'firefox')
+            else:
+                handler = FetchHandler(args.backends.split(','), browser=args.browser or 'chrome',
+                                       headless=not args.visible,
+                                       proxies=load_proxies(args.proxies) if args.proxies else None,
+                                       cache_dir=args.cache_dir or os.path.dirname(os.path.abspath(args.db)))
+            worker = QueueWorker(job_queue, handler, args.worker_id, timeout=args.visibility_timeout,
+                                 delay=args.delay)
+            try:
+                print(f"執行了 {worker.run(exit_when_empty=args.exit_when_empty)} 個任務")
+            finally:
+                handler.close()
+        elif args.command == 'collect':
+            print(f"匯總 {collect(job_queue, args.output)} 章")
+        print(f"隊列狀態: {job_queue.stats()}")
+    finally:
+        job_queue.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+按域名記錄的快取文件（選擇器、分頁模板、解碼方法、抓取後端統計等）的 JSON 讀寫
+
+    templates = load_json(cache_file, {})
+    save_json_atomic(cache_file, templates)
+"""
+import json
+import os
+import threading
+
+
+def load_json(path, default=None):
+    """讀取 JSON 文件，文件不存在或內容損壞時返回 default"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json_atomic(path, data, indent=2):
+    """
+    先寫臨時文件再替換，寫入中斷不會留下半個 JSON；
+    臨時文件名按進程與線程區分，多個進程同時保存同一個快取文件時以最後替換的為準
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
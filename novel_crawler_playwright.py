@@ -18,7 +18,12 @@ import re
 import time
 import argparse
 from http_utils import load_proxies, validate_proxies, get_random_proxy
+from crawl_journal import CrawlJournal
+from text_cleaner import RULE_PACKS
+from content_scorer import CONTENT_SCORER_JS, SiteSelectorCache
 
+# 按域名記住文字密度評分找到的正文選擇器，同站後續章節直接先試它
+DETECTED_SELECTORS = SiteSelectorCache()
 
 async def read_urls_from_csv(csv_file):
     """從CSV文件讀取URL"""
@@ -33,47 +38,9 @@ async def read_urls_from_csv(csv_file):
     return urls
 
 
-def clean_content(text):
-    """清理內容中的廣告"""
-    ad_patterns = [
-        r'.*雜書屋.*',
-        r'.*杂书屋.*',
-        r'.*zashuwu\.com.*',
-        r'.*ZASHUWU\.COM.*',
-        r'.*記郵件找地址.*',
-        r'.*记邮件找地址.*',
-        r'.*dz@.*',
-        r'.*請記住.*',
-        r'.*请记住.*',
-        r'.*手機閱讀.*',
-        r'.*手机阅读.*',
-        r'.*加入書簽.*',
-        r'.*加入书签.*',
-        r'.*最新章節.*',
-        r'.*最新章节.*',
-        r'.*http[s]?://.*\.com.*',
-        r'^--$',
-        r'^\s*$'
-    ]
-
-    lines = text.split('\n')
-    cleaned_lines = []
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        is_ad = False
-        for pattern in ad_patterns:
-            if re.search(pattern, line, re.IGNORECASE):
-                is_ad = True
-                break
-
-        if not is_ad:
-            cleaned_lines.append(line)
-
-    return '\n'.join(cleaned_lines)
+def clean_content(text, url=None):
+    """按 URL 所屬域名的清理規則包（cleaning_rules/*.json）去除廣告行"""
+    return RULE_PACKS.rules_for(url).filter_lines(text)
 
 
 async def crawl_novel_content(page, url):
@@ -113,8 +80,9 @@ async def crawl_novel_content(page, url):
         await page.wait_for_timeout(2000)
 
         # 嘗試獲取內容
+        known = DETECTED_SELECTORS.get(url)
         content = await page.evaluate("""
-            () => {
+            (known) => {
                 // 優先嘗試txtContent
                 const txtContent = document.getElementById('txtContent');
                 if (txtContent && txtContent.innerText && txtContent.innerText.length > 100) {
@@ -122,11 +90,12 @@ async def crawl_novel_content(page, url):
                     return txtContent.innerText;
                 }
 
-                // 嘗試其他選擇器
+                // 嘗試其他選擇器（本域名之前評分找到的選擇器優先）
                 const selectors = [
                     '#content', '#chaptercontent', '#chapter-content', '#BookText',
                     '.readcontent', '.read-content', '.novel-content'
                 ];
+                if (known) selectors.unshift(known);
 
                 for (const selector of selectors) {
                     const el = document.querySelector(selector);
@@ -136,34 +105,21 @@ async def crawl_novel_content(page, url):
                     }
                 }
 
-                // 查找最大的文本塊
-                const divs = document.getElementsByTagName('div');
-                let maxLength = 0;
-                let maxText = '';
-
-                for (const div of divs) {
-                    const text = div.innerText || '';
-                    if (text.length > maxLength && 
-                        !text.includes('[都市小说]') && 
-                        !text.includes('最新章节') &&
-                        text.length > 500) {
-                        maxLength = text.length;
-                        maxText = text;
-                    }
-                }
-
-                if (maxLength > 500) {
-                    console.log('Using largest text block');
-                    return maxText;
-                }
-
                 return '';
             }
-        """)
+        """, known)
+
+        if not content:
+            # 按文字密度評分（鏈接密度、中文比例、句讀）找出正文區域
+            candidates = await page.evaluate(CONTENT_SCORER_JS, {'limit': 1, 'withText': True})
+            if candidates and len(candidates[0].get('text', '')) > 500:
+                print(f"文字密度評分找到內容區域: {candidates[0]['selector']}")
+                DETECTED_SELECTORS.remember(url, candidates[0]['selector'])
+                content = candidates[0]['text']
 
         if content:
             print(f"成功獲取內容，長度: {len(content)}")
-            return clean_content(content)
+            return clean_content(content, url)
 
         # 如果還是沒有內容，嘗試等待更長時間
         print("第一次嘗試失敗，等待更長時間...")
@@ -182,7 +138,7 @@ async def crawl_novel_content(page, url):
 
         if content and len(content) > 100:
             print(f"第二次嘗試成功，長度: {len(content)}")
-            return clean_content(content)
+            return clean_content(content, url)
 
         # 調試信息
         print("無法獲取內容，保存調試信息...")
@@ -232,6 +188,7 @@ async def main():
     parser.add_argument('--end', type=int, default=None, help='結束索引')
     parser.add_argument('--proxy-file', type=str, default=None,
                         help='可選，代理文件，每行一個代理，支持 http(s)://user:pass@ip:port')
+    parser.add_argument('--no-resume', action='store_true', help='忽略任務日誌，重新爬取已完成的URL')
 
     args = parser.parse_args()
 
@@ -260,6 +217,13 @@ async def main():
         end = args.end if args.end is not None else len(urls)
         urls = urls[args.start:end]
 
+    # 任務日誌：跳過已完成的 URL
+    journal = CrawlJournal.for_output_dir(args.output)
+    done_urls = set() if args.no_resume else journal.completed_urls()
+    pending = [(i, url) for i, url in enumerate(urls) if url not in done_urls]
+    if len(pending) < len(urls):
+        print(f"任務日誌中已完成 {len(urls) - len(pending)} 個URL，將跳過")
+
     async with async_playwright() as p:
         # 啟動瀏覽器
         launch_args = ['--disable-blink-features=AutomationControlled']
@@ -290,7 +254,7 @@ async def main():
         page.on('console', lambda msg: print(f'[Console] {msg.text}'))
 
         # 爬取每個URL
-        for i, url in enumerate(urls):
+        for n, (i, url) in enumerate(pending):
             current_index = i + args.start
             print(f"\n爬取 {current_index + 1}/{len(urls) + args.start}: {url}")
 
@@ -299,6 +263,7 @@ async def main():
             chapter_num = chapter_match.group(1) if chapter_match else str(current_index + 1)
 
             # 爬取內容
+            journal.start(url)
             content = await crawl_novel_content(page, url)
 
             if content:
@@ -306,6 +271,7 @@ async def main():
                 filename = os.path.join(args.output, f'chapter_{chapter_num}.txt')
                 with open(filename, 'w', encoding='utf-8') as f:
                     f.write(content)
+                journal.finish(url, 'success', output_path=filename)
                 print(f"保存到 {filename}")
 
                 # 顯示預覽
@@ -317,13 +283,15 @@ async def main():
                 error_file = os.path.join(args.output, f'error_chapter_{chapter_num}.txt')
                 with open(error_file, 'w', encoding='utf-8') as f:
                     f.write(f"無法爬取內容: {url}\n")
+                journal.finish(url, 'failed', error='no content')
 
             # 延遲
-            if i < len(urls) - 1:
+            if n < len(pending) - 1:
                 print(f"等待 {args.delay} 秒...")
                 await asyncio.sleep(args.delay)
 
         await browser.close()
+        journal.close()
         print("\n爬取完成！")
 
 
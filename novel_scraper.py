@@ -1,24 +1,38 @@
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
 import time
 import os
 import json
 from urllib.parse import urljoin, urlparse
 import logging
+from http_utils import DomainRateLimiter
+from prefetch import HttpPrefetcher
+from crawl_journal import CrawlJournal
+from chapter_store import ChapterStore
+from ebook_export import export_book, iter_chapter_files, update_ebook
+from html_extract import ContentExtractor, SELECTORS_FILENAME
+from fetch_backends import FetchRouter, HttpBackend, default_backends, FETCH_BACKENDS_FILENAME
 
 
 class NovelScraper:
-    def __init__(self, csv_file_path, output_dir="novel_chapters"):
+    def __init__(self, csv_file_path, output_dir="novel_chapters", book=None, save_txt=True, html_backend=None,
+                 escalate=False):
         """
         初始化爬蟲
 
         Args:
             csv_file_path: CSV檔案路徑
             output_dir: 輸出目錄
+            book: 章節庫中的書名，預設為CSV檔名
+            save_txt: 是否在寫入章節庫之外仍保存每章的txt檔案
+            html_backend: HTML解析後端（'selectolax'、'lxml'、'bs4'），預設自動選擇已安裝的最快者
+            escalate: 正文質量不合格時逐級改用 initTxt、Selenium、Playwright 後端（見 fetch_backends），
+                      並按域名記住成功的後端
         """
         self.csv_file_path = csv_file_path
         self.output_dir = output_dir
+        self.book = book or os.path.splitext(os.path.basename(csv_file_path))[0]
+        self.save_txt = save_txt
         self.session = requests.Session()
 
         # 更強化的請求標頭，模擬真實瀏覽器
@@ -42,6 +56,17 @@ class NovelScraper:
 
         # 創建輸出目錄
         os.makedirs(output_dir, exist_ok=True)
+        self.store = ChapterStore.for_output_dir(output_dir)
+        # 正文提取器：按域名記住命中的選擇器，之後的章節直接定位
+        self.extractor = ContentExtractor(backend=html_backend,
+                                          cache_file=os.path.join(output_dir, SELECTORS_FILENAME))
+        self.router = None
+        if escalate:
+            self.router = FetchRouter(
+                [HttpBackend(self.extractor, session=self.session, get=self.get_with_retry)]
+                + default_backends(['inittxt', 'selenium', 'playwright'], output_dir=output_dir),
+                cache_file=os.path.join(output_dir, FETCH_BACKENDS_FILENAME),
+            )
 
         # 設置日誌
         logging.basicConfig(
@@ -69,14 +94,31 @@ class NovelScraper:
         except Exception as e:
             self.logger.warning(f"初始化會話失敗: {e}")
 
-    def get_with_retry(self, url, max_retries=3, base_delay=2):
-        """帶重試機制的GET請求"""
+    def _http_session(self):
+        """建立與主會話相同標頭與cookies的新會話（預取線程各用一個）"""
+        session = requests.Session()
+        session.headers.update(self.session.headers)
+        session.cookies.update(self.session.cookies)
+        return session
+
+    def get_with_retry(self, url, max_retries=3, base_delay=2, session=None, rate_limiter=None):
+        """
+        帶重試機制的GET請求
+
+        Args:
+            session: 使用的會話，預設為主會話（requests.Session 不是線程安全的，預取線程傳入各自的會話）
+            rate_limiter: DomainRateLimiter，提供時每次重試前也按域名請求間隔預約時刻
+        """
+        session = session or self.session
         for attempt in range(max_retries):
             try:
+                if attempt > 0 and rate_limiter is not None:
+                    rate_limiter.wait(url)
+
                 # 每次請求前更新referer
-                self.session.headers.update({'Referer': 'https://czbooks.net/'})
+                session.headers.update({'Referer': 'https://czbooks.net/'})
 
-                response = self.session.get(url, timeout=15)
+                response = session.get(url, timeout=15)
 
                 if response.status_code == 200:
                     return response
@@ -123,60 +165,47 @@ class NovelScraper:
             self.logger.error(f"載入CSV檔案失敗: {e}")
             return []
 
-    def extract_content(self, html):
+    def extract_content(self, html, url=None):
         """
         從HTML中提取小說內容
-        需要根據實際網站結構調整選擇器
+        候選選擇器見 html_extract.DEFAULT_SELECTORS（需要根據實際網站調整）；
+        找不到時取包含最多文字的div
+        """
+        return self.extractor.extract(html, url)
+
+    def scrape_chapter(self, chapter_info, fetch=None):
+        """
+        爬取單個章節
+
+        Args:
+            fetch: 下載函數，預設為 get_with_retry（啟用預取時傳入預取器）
         """
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # 常見的小說內容選擇器（需要根據實際網站調整）
-        content_selectors = [
-            '.chapter-content',
-            '.content',
-            '.novel-content',
-            '#content',
-            '.text-content',
-            'div[class*="content"]',
-            'div[id*="content"]'
-        ]
-
-        content = ""
-        for selector in content_selectors:
-            element = soup.select_one(selector)
-            if element:
-                content = element.get_text(strip=True)
-                break
-
-        # 如果找不到特定選擇器，嘗試查找包含最多文字的div
-        if not content:
-            divs = soup.find_all('div')
-            if divs:
-                content = max(divs, key=lambda div: len(div.get_text())).get_text(strip=True)
-
-        return content
-
-    def scrape_chapter(self, chapter_info):
-        """爬取單個章節"""
         try:
             url = chapter_info['url']
             title = chapter_info['title']
 
             self.logger.info(f"正在爬取: {title}")
 
-            # 使用新的重試機制
-            response = self.get_with_retry(url)
+            if self.router:
+                # 從域名記錄的後端開始，正文不合格時逐級升級
+                result = self.router.fetch(url, get=fetch)
+                html, content = result.html, result.text
+                self.logger.info(f"抓取後端: {result.backend}")
+            else:
+                # 使用新的重試機制
+                response = (fetch or self.get_with_retry)(url)
 
-            if response is None:
-                return {
-                    'title': title,
-                    'url': url,
-                    'content': '',
-                    'status': 'failed_after_retries'
-                }
+                if response is None:
+                    return {
+                        'title': title,
+                        'url': url,
+                        'content': '',
+                        'status': 'failed_after_retries'
+                    }
 
-            response.encoding = 'utf-8'
-            content = self.extract_content(response.text)
+                response.encoding = 'utf-8'
+                html = response.text
+                content = self.extract_content(html, url)
 
             if content:
                 self.logger.info(f"成功爬取: {title} (內容長度: {len(content)})")
@@ -191,7 +220,7 @@ class NovelScraper:
                 # 保存原始HTML用於調試
                 debug_path = os.path.join(self.output_dir, f"debug_{title[:50]}.html")
                 with open(debug_path, 'w', encoding='utf-8') as f:
-                    f.write(response.text)
+                    f.write(html)
                 return {
                     'title': title,
                     'url': url,
@@ -211,8 +240,15 @@ class NovelScraper:
             }
 
     def save_chapter(self, chapter_data, chapter_num):
-        """保存章節內容"""
+        """保存章節內容（寫入章節庫，並按 save_txt 保存txt檔案）"""
         try:
+            self.store.put(self.book, chapter_num, chapter_data['url'], chapter_data['title'],
+                           chapter_data['content'], status=chapter_data['status'])
+            if not self.save_txt:
+                # 章節庫是唯一輸出時立即提交，確保任務日誌記為成功的章節已經落盤
+                self.store.flush()
+                return self.store.path
+
             # 清理檔案名稱中的非法字符
             safe_title = "".join(c for c in chapter_data['title'] if c.isalnum() or c in (' ', '-', '_')).rstrip()
             filename = f"{chapter_num:03d}_{safe_title}.txt"
@@ -230,7 +266,7 @@ class NovelScraper:
             self.logger.error(f"保存章節失敗: {e}")
             return None
 
-    def scrape_all(self, delay=3, start_chapter=1, end_chapter=None):
+    def scrape_all(self, delay=3, start_chapter=1, end_chapter=None, prefetch=0, resume=True):
         """
         爬取所有章節
 
@@ -238,6 +274,9 @@ class NovelScraper:
             delay: 每次請求間的延遲秒數 (增加到3秒)
             start_chapter: 開始章節編號
             end_chapter: 結束章節編號 (None表示到最後)
+            prefetch: 預取深度，>0 時在處理當前章節的同時下載後續章節，
+                      延遲改為按域名的請求間隔
+            resume: 是否跳過任務日誌中已成功且輸出文件仍存在的章節
         """
         chapters = self.load_chapter_list()
         if not chapters:
@@ -252,38 +291,75 @@ class NovelScraper:
         self.logger.info(
             f"將爬取第 {start_chapter} 到第 {min(end_chapter, len(chapters))} 章，共 {len(selected_chapters)} 章")
 
+        # 任務日誌：跳過已完成的章節，只處理失敗或缺失的章節
+        journal = CrawlJournal.for_output_dir(self.output_dir)
+        done_urls = journal.completed_urls() if resume else set()
+        pending_chapters = [(i, c) for i, c in enumerate(selected_chapters, start_chapter)
+                            if c['url'] not in done_urls]
+        if len(pending_chapters) < len(selected_chapters):
+            self.logger.info(f"任務日誌中已完成 {len(selected_chapters) - len(pending_chapters)} 章，將跳過")
+
         results = []
         failed_chapters = []
 
-        for i, chapter_info in enumerate(selected_chapters, start_chapter):
-            result = self.scrape_chapter(chapter_info)
+        prefetcher = None
+        sessions = []
+        if prefetch > 0:
+            sessions = [self._http_session() for _ in range(prefetch + 1)]
+            rate_limiter = DomainRateLimiter(delay)
+            prefetcher = HttpPrefetcher(
+                lambda url, session: self.get_with_retry(url, session=session, rate_limiter=rate_limiter),
+                [c['url'] for _, c in pending_chapters],
+                lookahead=prefetch,
+                rate_limiter=rate_limiter,
+                handles=sessions,
+            )
+            self.logger.info(f"已啟用預取，深度: {prefetch}")
 
-            if result['status'] == 'success':
-                # 保存章節
-                filepath = self.save_chapter(result, i)
-                if filepath:
-                    result['saved_path'] = filepath
-                results.append(result)
-            else:
-                failed_chapters.append(chapter_info)
-                results.append(result)
-
-            # 進度報告
-            if i % 5 == 0:  # 每5章報告一次
-                success_count = sum(1 for r in results if r['status'] == 'success')
-                self.logger.info(f"進度: {i}/{end_chapter} ({success_count} 成功)")
-
-            # 更長的延遲以避免被封IP
-            if i < len(selected_chapters):  # 不是最後一章
-                self.logger.info(f"等待 {delay} 秒...")
-                time.sleep(delay)
+        try:
+            for i, chapter_info in pending_chapters:
+                journal.start(chapter_info['url'])
+                result = self.scrape_chapter(chapter_info, fetch=prefetcher.get if prefetcher else None)
+
+                if result['status'] == 'success':
+                    # 保存章節
+                    filepath = self.save_chapter(result, i)
+                    if filepath:
+                        result['saved_path'] = filepath
+                        journal.finish(chapter_info['url'], 'success', output_path=filepath)
+                    else:
+                        journal.finish(chapter_info['url'], 'save_failed')
+                    results.append(result)
+                else:
+                    failed_chapters.append(chapter_info)
+                    results.append(result)
+                    journal.finish(chapter_info['url'], result['status'], error=result.get('error'))
+
+                # 進度報告
+                if i % 5 == 0:  # 每5章報告一次
+                    success_count = sum(1 for r in results if r['status'] == 'success')
+                    self.logger.info(f"進度: {i}/{end_chapter} ({success_count} 成功)")
+
+                # 更長的延遲以避免被封IP（預取模式下由限速器控制請求間隔）
+                if not prefetcher and i < len(selected_chapters):  # 不是最後一章
+                    self.logger.info(f"等待 {delay} 秒...")
+                    time.sleep(delay)
+        finally:
+            if prefetcher:
+                prefetcher.close()
+            for session in sessions:
+                session.close()
+            if self.router:
+                self.router.close()
+            journal.close()
+            self.store.flush()
 
         # 保存結果摘要
         self.save_summary(results, failed_chapters)
 
         success_count = sum(1 for r in results if r['status'] == 'success')
         self.logger.info(
-            f"完成！總共 {len(selected_chapters)} 章，成功 {success_count} 章，失敗 {len(failed_chapters)} 章")
+            f"完成！總共 {len(pending_chapters)} 章，成功 {success_count} 章，失敗 {len(failed_chapters)} 章")
 
     def save_summary(self, results, failed_chapters):
         """保存爬取結果摘要"""
@@ -302,20 +378,19 @@ class NovelScraper:
         self.logger.info(f"結果摘要已保存至: {summary_path}")
 
     def create_ebook(self, output_filename="novel.txt"):
-        """將所有章節合併成一個電子書檔案"""
+        """
+        將所有章節按章節序號逐章寫成一個電子書檔案（.epub 結尾輸出EPUB，否則輸出txt）
+        優先從章節庫讀取，章節庫中沒有此書時讀取輸出目錄中的章節txt；
+        電子書已存在時按章節內容哈希只重寫有變化的章節
+        """
         try:
-            chapters = []
-            for filename in sorted(os.listdir(self.output_dir)):
-                if filename.endswith('.txt') and filename != output_filename:
-                    filepath = os.path.join(self.output_dir, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        chapters.append(f.read())
-
             ebook_path = os.path.join(self.output_dir, output_filename)
-            with open(ebook_path, 'w', encoding='utf-8') as f:
-                f.write('\n\n' + '=' * 80 + '\n\n'.join(chapters))
+            if self.store.counts(self.book).get('success'):
+                count, rewritten = export_book(self.store, self.book, ebook_path)
+            else:
+                count, rewritten = update_ebook(iter_chapter_files(self.output_dir), ebook_path, self.book)
 
-            self.logger.info(f"電子書已創建: {ebook_path}")
+            self.logger.info(f"電子書已創建: {ebook_path} (共 {count} 章，重寫 {rewritten} 章)")
             return ebook_path
         except Exception as e:
             self.logger.error(f"創建電子書失敗: {e}")
@@ -0,0 +1,220 @@
+"""
+內容區域分塊截圖：按視窗高度逐段滾動內容元素，每段截取一次視窗並裁出元素所在部分，逐塊產出。
+
+元素截圖（screenshot_as_png）在超長章節上會被截斷，並且整張 PNG 要一次放在內存中；
+分塊截圖任何時候只持有一張視窗截圖，內存與章節長度無關，
+調用方拿到每一塊後即可保存、提交 OCR，不必等整章截完。
+
+    for tile in iter_element_tiles(driver, content_elem, tile_height=760, overlap=20):
+        tile.image.save(f"chapter_chunk_{tile.index}.png")
+
+Chromium 上另有 CDP 快速路徑（capture_element_cdp / iter_cdp_tiles）：Page.captureScreenshot
+帶 clip 與 captureBeyondViewport 直接截取元素所在的文檔區域，不滾動、不重新佈局；
+JPEG / WebP 由瀏覽器直接編碼（可先用 CSS 濾鏡轉灰度），返回的字節原樣寫入文件，不經 PIL 重新編碼。
+"""
+import base64
+import time
+from io import BytesIO
+from typing import NamedTuple
+
+from PIL import Image
+
+# 滾動後等待重繪（和懶加載圖片）的秒數
+TILE_SETTLE = 0.15
+
+# 滾動到指定位置，返回元素在視窗中的位置；元素高度可能因懶加載而在滾動中增長
+_SCROLL_TO_JS = """
+window.scrollTo(window.scrollX, arguments[1]);
+const r = arguments[0].getBoundingClientRect();
+return {left: r.left, top: r.top, width: r.width, height: r.height,
+        docTop: r.top + window.scrollY, viewport: window.innerHeight,
+        ratio: window.devicePixelRatio || 1};
+"""
+
+# 隱藏固定定位的頁頭、浮動廣告等（不含內容元素本身及其祖先），避免它們疊在每一塊上
+_HIDE_FIXED_JS = """
+const content = arguments[0];
+const hidden = [];
+for (const el of document.querySelectorAll('body *')) {
+    const position = getComputedStyle(el).position;
+    if ((position === 'fixed' || position === 'sticky') && !el.contains(content)) {
+        hidden.push([el, el.style.visibility]);
+        el.style.visibility = 'hidden';
+    }
+}
+window.__captureHidden = hidden;
+return hidden.length;
+"""
+
+_RESTORE_FIXED_JS = """
+for (const [el, visibility] of window.__captureHidden || []) el.style.visibility = visibility;
+window.__captureHidden = null;
+"""
+
+
+# 元素在文檔中的位置（CSS 像素）
+_DOCUMENT_BOX_JS = """
+const r = arguments[0].getBoundingClientRect();
+return {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height,
+        viewport: window.innerHeight, ratio: window.devicePixelRatio || 1};
+"""
+
+_GRAYSCALE_JS = """
+const root = document.documentElement;
+if (arguments[0]) {
+    window.__captureFilter = root.style.filter;
+    root.style.filter = 'grayscale(1)';
+} else {
+    root.style.filter = window.__captureFilter || '';
+}
+"""
+
+# Chromium 單張截圖的最大邊長（設備像素），超過時應改用分塊截取
+CDP_MAX_DIMENSION = 16384
+
+
+class EncodedImage(NamedTuple):
+    """瀏覽器已編碼好的圖片字節"""
+    data: bytes
+    format: str         # 'png'、'jpeg' 或 'webp'
+
+    @property
+    def extension(self):
+        return '.jpg' if self.format == 'jpeg' else f'.{self.format}'
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+    def open(self):
+        """解碼為 PIL 圖片（僅 OCR 等需要像素時使用）"""
+        return Image.open(BytesIO(self.data))
+
+
+class Tile(NamedTuple):
+    index: int
+    top: int            # 在元素內的起始位置（CSS 像素）
+    image: object       # PIL.Image.Image，CDP 路徑下為 EncodedImage
+
+
+def image_extension(image):
+    """保存截圖時使用的擴展名"""
+    return image.extension if isinstance(image, EncodedImage) else '.png'
+
+
+def iter_element_tiles(driver, element, tile_height=None, overlap=0, settle=TILE_SETTLE, hide_fixed=True):
+    """
+    逐塊截取元素
+
+    Args:
+        tile_height: 每塊高度（CSS 像素），預設與視窗同高，超過視窗高度時按視窗高度截取
+        overlap: 相鄰兩塊的重疊高度，供 OCR 結果合併時去重
+        settle: 每次滾動後等待的秒數
+        hide_fixed: 截圖期間隱藏固定定位的元素
+    """
+    box = driver.execute_script(_SCROLL_TO_JS, element, 0)
+    tile_height = min(tile_height or box['viewport'], box['viewport'])
+    if overlap >= tile_height:
+        raise ValueError("overlap must be smaller than tile height")
+    step = tile_height - overlap
+    doc_top = box['docTop']
+
+    hidden = hide_fixed and driver.execute_script(_HIDE_FIXED_JS, element)
+    try:
+        offset = 0
+        index = 0
+        while True:
+            box = driver.execute_script(_SCROLL_TO_JS, element, doc_top + offset)
+            if settle:
+                time.sleep(settle)
+            height = box['height']
+            bottom = min(offset + tile_height, height)
+
+            with Image.open(BytesIO(driver.get_screenshot_as_png())) as shot:
+                ratio = box['ratio']
+                # 頁面接近底部時滾動會被截止，元素的實際位置以滾動後的 top 為準
+                left = max(0, round(box['left'] * ratio))
+                right = min(shot.width, round((box['left'] + box['width']) * ratio))
+                top = max(0, round((box['top'] + offset) * ratio))
+                lower = min(shot.height, round((box['top'] + bottom) * ratio))
+                tile = shot.crop((left, top, right, lower))
+                tile.load()
+            yield Tile(index, offset, tile)
+
+            if bottom >= height:
+                break
+            offset += step
+            index += 1
+    finally:
+        if hidden:
+            driver.execute_script(_RESTORE_FIXED_JS)
+
+
+def device_pixel_ratio(driver):
+    """每個 CSS 像素對應的截圖像素數（HiDPI 屏幕上大於 1）"""
+    return driver.execute_script("return window.devicePixelRatio || 1;") or 1
+
+
+def supports_cdp(driver):
+    """driver 是否為可執行 CDP 命令的 Chromium 驅動"""
+    return hasattr(driver, 'execute_cdp_cmd')
+
+
+def _cdp_screenshot(driver, clip, image_format, quality):
+    params = {
+        'format': image_format,
+        'clip': {**clip, 'scale': 1},
+        'captureBeyondViewport': True,
+        'fromSurface': True,
+    }
+    if image_format in ('jpeg', 'webp'):
+        params['quality'] = quality
+    result = driver.execute_cdp_cmd('Page.captureScreenshot', params)
+    return EncodedImage(base64.b64decode(result['data']), image_format)
+
+
+def capture_element_cdp(driver, element, image_format='jpeg', quality=85, grayscale=False):
+    """
+    用 Page.captureScreenshot 截取整個元素（含視窗外部分），返回 EncodedImage
+    元素高度超過 CDP_MAX_DIMENSION 設備像素時 Chromium 會截斷，此時拋出 ValueError，應改用 iter_cdp_tiles
+    """
+    box = driver.execute_script(_DOCUMENT_BOX_JS, element)
+    if box['height'] * box['ratio'] > CDP_MAX_DIMENSION:
+        raise ValueError(f"元素高 {box['height']:.0f}px，超過單張截圖上限，請使用分塊截取")
+    if grayscale:
+        driver.execute_script(_GRAYSCALE_JS, True)
+    try:
+        clip = {'x': box['x'], 'y': box['y'], 'width': box['width'], 'height': box['height']}
+        return _cdp_screenshot(driver, clip, image_format, quality)
+    finally:
+        if grayscale:
+            driver.execute_script(_GRAYSCALE_JS, False)
+
+
+def iter_cdp_tiles(driver, element, tile_height=None, overlap=0, image_format='jpeg', quality=85, grayscale=False):
+    """
+    按 iter_element_tiles 相同的分塊方式截取元素，但每塊都用 CDP 直接截取文檔區域，
+    不需要滾動與等待重繪，產出的 Tile.image 為瀏覽器編碼好的 EncodedImage
+    """
+    box = driver.execute_script(_DOCUMENT_BOX_JS, element)
+    tile_height = tile_height or box['viewport']
+    if overlap >= tile_height:
+        raise ValueError("overlap must be smaller than tile height")
+    step = tile_height - overlap
+
+    if grayscale:
+        driver.execute_script(_GRAYSCALE_JS, True)
+    try:
+        offset = 0
+        index = 0
+        while True:
+            bottom = min(offset + tile_height, box['height'])
+            clip = {'x': box['x'], 'y': box['y'] + offset, 'width': box['width'], 'height': bottom - offset}
+            yield Tile(index, offset, _cdp_screenshot(driver, clip, image_format, quality))
+            if bottom >= box['height']:
+                break
+            offset += step
+            index += 1
+    finally:
+        if grayscale:
+            driver.execute_script(_GRAYSCALE_JS, False)
@@ -40,20 +40,43 @@ import logging
 import random
 import sys
 import re
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse, urlunparse
+from pagination_patterns import PaginationPatternEngine
+from http_utils import DomainRateLimiter
+from prefetch import TabPrefetcher
+from crawl_journal import CrawlJournal
+from content_scorer import SiteSelectorCache, best_content, score_in_browser
+from html_extract import Bs4Backend
 
 class PaginatedNovelScraper:
-    def __init__(self, csv_file_path, output_dir="paginated_novels", headless=False, auto_verify=True):
+    def __init__(self, csv_file_path, output_dir="paginated_novels", headless=False, auto_verify=True,
+                 page_workers=1, page_mode='browser', prefetch=0, resume=True):
         """
         初始化分頁小說爬蟲
+        
+        Args:
+            page_workers: 同時抓取分頁（第2..N頁）的數量，1 表示逐頁抓取
+            page_mode: 並行抓取分頁的方式，'browser' 使用額外的瀏覽器實例，
+                       'http' 使用帶瀏覽器 cookies 的純 HTTP 請求
+            prefetch: 預取深度，>0 時在備用分頁中提前加載後續章節的第一頁
+            resume: 是否跳過任務日誌中已成功的章節
         """
         self.csv_file_path = csv_file_path
         self.output_dir = output_dir
         self.headless = headless
         self.auto_verify = auto_verify
         self.verification_timeout = 30  # 預設驗證超時時間
+        self.page_workers = max(1, page_workers)
+        self.page_mode = page_mode
+        self.prefetch = prefetch
+        self.resume = resume
         self.driver = None
+        self.prefetcher = None
+        self.page_drivers = []  # 並行抓取分頁用的額外瀏覽器
+        self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         
         # 分頁檢測的正則表達式
         self.pagination_patterns = [
@@ -61,6 +84,30 @@ class PaginatedNovelScraper:
             r'第(\d+)頁/共(\d+)頁',  # 第1頁/共3頁
             r'(\d+)/(\d+)頁',    # 1/3頁
         ]
+
+        # 「下一頁」連結，用於學習各網站的分頁URL模板（不含「下一章」）
+        self.next_page_xpaths = [
+            "//a[@rel='next']",
+            "//a[contains(normalize-space(.), '下一頁')]",
+            "//a[contains(normalize-space(.), '下一页')]",
+            "//a[contains(normalize-space(.), '下頁')]",
+            "//a[contains(normalize-space(.), '下页')]",
+        ]
+        
+        # 針對Novel543的內容選擇器
+        self.content_selectors = [
+            "#content",
+            ".content",
+            ".novel-content",
+            ".chapter-content",
+            ".text-content",
+            "div[class*='content']",
+            "div[id*='content']",
+            ".reading-content",
+            "#chapterContent"
+        ]
+        # 選擇器都不命中時由文字密度評分找出正文，按域名記住找到的選擇器
+        self.detected_selectors = SiteSelectorCache()
         
         # 常見驗證元素的選擇器
         self.verification_selectors = [
@@ -106,6 +153,9 @@ class PaginatedNovelScraper:
         # 創建輸出目錄
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         self.setup_logging()
+        
+        # 按域名快取的分頁URL模板（從第一個分頁章節的「下一頁」連結學習）
+        self.pagination_engine = PaginationPatternEngine(str(Path(output_dir) / 'pagination_templates.json'))
 
     def setup_logging(self):
         """設置日誌系統"""
@@ -123,31 +173,36 @@ class PaginatedNovelScraper:
         )
         self.logger = logging.getLogger(__name__)
 
+    def _create_driver(self):
+        """創建一個Chrome瀏覽器實例"""
+        chrome_options = Options()
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        
+        chrome_options.add_argument(f'--user-agent={self.user_agent}')
+        
+        if self.headless:
+            chrome_options.add_argument('--headless')
+        
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            service = Service(ChromeDriverManager().install())
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        except ImportError:
+            driver = webdriver.Chrome(options=chrome_options)
+        
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        return driver
+
     def setup_driver(self):
         """設置Chrome瀏覽器驅動"""
         try:
-            chrome_options = Options()
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            chrome_options.add_argument(f'--user-agent={user_agent}')
-            
             if self.headless:
-                chrome_options.add_argument('--headless')
                 self.logger.info("運行在無頭模式")
-            
-            try:
-                from webdriver_manager.chrome import ChromeDriverManager
-                service = Service(ChromeDriverManager().install())
-                self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            except ImportError:
-                self.driver = webdriver.Chrome(options=chrome_options)
-            
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            self.driver = self._create_driver()
             self.logger.info("瀏覽器驅動設置成功")
             return True
             
@@ -155,10 +210,31 @@ class PaginatedNovelScraper:
             self.logger.error(f"瀏覽器驅動設置失敗: {e}")
             return False
 
-    def wait_for_page_load(self, timeout=10):
+    def close_drivers(self):
+        """關閉主瀏覽器及所有分頁抓取用的瀏覽器"""
+        if self.prefetcher:
+            self.prefetcher.close()
+            self.prefetcher = None
+        for driver in self.page_drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self.page_drivers = []
+        if self.driver:
+            self.driver.quit()
+
+    def open_page(self, url):
+        """打開章節第一頁，啟用預取時直接切換到已在背景加載的分頁"""
+        if self.prefetcher:
+            return self.prefetcher.navigate(url)
+        self.driver.get(url)
+        return False
+
+    def wait_for_page_load(self, timeout=10, driver=None):
         """等待頁面完全加載"""
         try:
-            WebDriverWait(self.driver, timeout).until(
+            WebDriverWait(driver or self.driver, timeout).until(
                 lambda driver: driver.execute_script("return document.readyState") == "complete"
             )
             return True
@@ -427,8 +503,14 @@ class PaginatedNovelScraper:
     def construct_page_url(self, base_url, page_number):
         """
         根據基礎URL和頁碼構造分頁URL
+        優先使用已學習的域名模板，沒有模板時退回 name_N.html 格式
         例: https://www.novel543.com/0621496793/8096_1.html -> https://www.novel543.com/0621496793/8096_1_2.html
         """
+        new_url = self.pagination_engine.build_url(base_url, page_number)
+        if new_url:
+            self.logger.debug(f"按模板構造分頁URL: {new_url}")
+            return new_url
+
         try:
             # 解析URL
             parsed = urlparse(base_url)
@@ -468,26 +550,14 @@ class PaginatedNovelScraper:
             self.logger.error(f"構造分頁URL失敗: {e}")
             return None
 
-    def extract_content_from_page(self):
+    def extract_content_from_page(self, driver=None):
         """從當前頁面提取內容"""
+        driver = driver or self.driver
         try:
-            WebDriverWait(self.driver, 10).until(
+            WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
-            # 針對Novel543的特定選擇器
-            content_selectors = [
-                "#content",
-                ".content", 
-                ".novel-content",
-                ".chapter-content",
-                ".text-content",
-                "div[class*='content']",
-                "div[id*='content']",
-                ".reading-content",
-                "#chapterContent"
-            ]
-            
             content = ""
             title = ""
             
@@ -495,7 +565,7 @@ class PaginatedNovelScraper:
             title_selectors = ["h1", ".title", ".chapter-title", "h2", "h3"]
             for selector in title_selectors:
                 try:
-                    title_element = self.driver.find_element(By.CSS_SELECTOR, selector)
+                    title_element = driver.find_element(By.CSS_SELECTOR, selector)
                     if title_element:
                         title = title_element.text.strip()
                         break
@@ -503,9 +573,10 @@ class PaginatedNovelScraper:
                     continue
             
             # 獲取內容
-            for selector in content_selectors:
+            known = self.detected_selectors.get(driver.current_url)
+            for selector in ([known] if known else []) + self.content_selectors:
                 try:
-                    elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
+                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
                     if elements:
                         for element in elements:
                             text = element.text.strip()
@@ -516,12 +587,13 @@ class PaginatedNovelScraper:
                 except:
                     continue
             
-            # 如果還是找不到，使用通用方法
+            # 如果還是找不到，按文字密度評分找出正文區域
             if not content:
                 try:
-                    divs = self.driver.find_elements(By.TAG_NAME, "div")
-                    if divs:
-                        content = max(divs, key=lambda div: len(div.text)).text.strip()
+                    candidates = score_in_browser(driver, limit=1, with_text=True)
+                    if candidates:
+                        content = candidates[0]['text'].strip()
+                        self.detected_selectors.remember(driver.current_url, candidates[0]['selector'])
                 except:
                     pass
             
@@ -531,6 +603,195 @@ class PaginatedNovelScraper:
             self.logger.error(f"提取頁面內容失敗: {e}")
             return "", ""
 
+    def extract_content_from_html(self, html):
+        """從HTML源碼提取內容（純HTTP抓取分頁時使用）"""
+        from bs4 import BeautifulSoup
+        
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        content = ""
+        for selector in self.content_selectors:
+            for element in soup.select(selector):
+                text = element.get_text('\n', strip=True)
+                if len(text) > len(content):
+                    content = text
+            if content and len(content) > 100:
+                break
+        
+        if not content:
+            best = best_content(Bs4Backend().nodes(soup), separator='\n')
+            if best:
+                content = best['text']
+        
+        return content
+
+    def find_next_page_url(self, driver=None):
+        """在當前頁面中尋找「下一頁」連結"""
+        driver = driver or self.driver
+        current_url = driver.current_url
+        for xpath in self.next_page_xpaths:
+            try:
+                for link in driver.find_elements(By.XPATH, xpath):
+                    href = link.get_attribute('href')
+                    if href and href.startswith('http') and href.split('#')[0] != current_url:
+                        return href
+            except Exception:
+                continue
+        return None
+
+    def learn_pagination_template(self, base_url, current_page):
+        """
+        從當前（第一頁）頁面的「下一頁」連結學習該域名的分頁URL模板
+        同一域名只需學習一次，之後的章節直接套用模板
+        """
+        if self.pagination_engine.get_template(base_url):
+            return
+        
+        next_url = self.find_next_page_url()
+        if not next_url:
+            self.logger.debug("未找到下一頁連結，無法學習分頁模板")
+            return
+        
+        template = self.pagination_engine.learn(base_url, next_url, current_page + 1)
+        if template:
+            self.logger.info(f"🧩 已學習分頁URL模板 ({urlparse(base_url).netloc}): {template}")
+        else:
+            self.logger.debug(f"無法從下一頁連結推斷分頁模板: {next_url}")
+
+    def fetch_page_with_driver(self, driver, page_url, page_num, total_pages):
+        """用指定的瀏覽器抓取單個分頁"""
+        self.logger.info(f"  📖 爬取第 {page_num}/{total_pages} 頁...")
+        driver.get(page_url)
+        
+        # 等待頁面加載
+        self.wait_for_page_load(timeout=5, driver=driver)
+        
+        # 處理可能的驗證（僅主瀏覽器，額外瀏覽器失敗的分頁會交回主瀏覽器重試）
+        if driver is self.driver:
+            self.handle_verification(max_attempts=1, manual_timeout=min(10, self.verification_timeout))
+        
+        time.sleep(random.uniform(1, 3))
+        
+        _, content = self.extract_content_from_page(driver)
+        return content
+
+    def fetch_page_with_http(self, session, page_url, page_num, total_pages):
+        """用純HTTP請求抓取單個分頁"""
+        self.logger.info(f"  📖 爬取第 {page_num}/{total_pages} 頁 (HTTP)...")
+        time.sleep(random.uniform(1, 3))
+        response = session.get(page_url, timeout=15)
+        response.raise_for_status()
+        response.encoding = response.apparent_encoding or 'utf-8'
+        return self.extract_content_from_html(response.text)
+
+    def _http_session(self):
+        """建立帶有主瀏覽器cookies的HTTP會話"""
+        import requests
+        
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': self.user_agent,
+            'Referer': self.driver.current_url,
+        })
+        for cookie in self.driver.get_cookies():
+            session.cookies.set(cookie['name'], cookie['value'],
+                                domain=cookie.get('domain'), path=cookie.get('path', '/'))
+        return session
+
+    def _get_page_drivers(self, count):
+        """取得（必要時創建）並行抓取分頁用的額外瀏覽器"""
+        while len(self.page_drivers) < count:
+            try:
+                self.page_drivers.append(self._create_driver())
+            except Exception as e:
+                self.logger.warning(f"創建分頁瀏覽器失敗: {e}")
+                break
+        return self.page_drivers[:count]
+
+    def _fetch_page(self, fetcher, handle, page_num, page_url, total_pages):
+        """抓取單個分頁並記錄結果，失敗時返回空字串"""
+        try:
+            content = fetcher(handle, page_url, page_num, total_pages)
+        except Exception as e:
+            self.logger.error(f"    ❌ 第{page_num}頁爬取失敗: {e}")
+            return ""
+        
+        if content:
+            self.logger.debug(f"    ✅ 第{page_num}頁成功 (長度: {len(content)})")
+        else:
+            self.logger.warning(f"    ❌ 第{page_num}頁內容為空")
+        return content
+
+    def _fetch_pages_parallel(self, page_urls, total_pages):
+        """並行抓取分頁，返回 {頁碼: 內容}"""
+        if self.page_mode == 'http':
+            # requests.Session 不是線程安全的，每個工作線程各用一個會話
+            handles = [self._http_session() for _ in range(self.page_workers)]
+            fetcher = self.fetch_page_with_http
+        else:
+            handles = self._get_page_drivers(self.page_workers)
+            fetcher = self.fetch_page_with_driver
+        
+        if not handles:
+            handles = [self.driver]
+            fetcher = self.fetch_page_with_driver
+        
+        # 每個工作線程從池中借用一個瀏覽器/會話，保證同一瀏覽器不會被同時操作
+        pool = queue.Queue()
+        for handle in handles:
+            pool.put(handle)
+
+        def worker(item):
+            page_num, page_url = item
+            handle = pool.get()
+            try:
+                return page_num, self._fetch_page(fetcher, handle, page_num, page_url, total_pages)
+            finally:
+                pool.put(handle)
+        
+        self.logger.info(f"  ⚡ 並行抓取 {len(page_urls)} 個分頁 ({len(handles)} 路, {self.page_mode})")
+        with ThreadPoolExecutor(max_workers=len(handles)) as executor:
+            return dict(executor.map(worker, page_urls.items()))
+
+    def fetch_remaining_pages(self, base_url, total_pages):
+        """
+        抓取第2..N頁
+        返回: (按頁碼排序的內容列表, 失敗頁碼列表)
+        """
+        page_urls = {}
+        failed_pages = []
+        for page_num in range(2, total_pages + 1):
+            page_url = self.construct_page_url(base_url, page_num)
+            if page_url:
+                page_urls[page_num] = page_url
+            else:
+                failed_pages.append(page_num)
+        
+        if self.page_workers > 1 and len(page_urls) > 1:
+            contents = self._fetch_pages_parallel(page_urls, total_pages)
+            
+            # 並行抓取失敗的分頁，再用主瀏覽器逐頁重試一次
+            retry_pages = [page_num for page_num, content in contents.items() if not content]
+            if retry_pages:
+                self.logger.info(f"  🔁 使用主瀏覽器重試 {len(retry_pages)} 個分頁")
+            for page_num in retry_pages:
+                contents[page_num] = self._fetch_page(
+                    self.fetch_page_with_driver, self.driver, page_num, page_urls[page_num], total_pages)
+        else:
+            contents = {}
+            for page_num, page_url in page_urls.items():
+                contents[page_num] = self._fetch_page(
+                    self.fetch_page_with_driver, self.driver, page_num, page_url, total_pages)
+        
+        all_content = []
+        for page_num in sorted(contents):
+            if contents[page_num]:
+                all_content.append(contents[page_num])
+            else:
+                failed_pages.append(page_num)
+        
+        return all_content, sorted(failed_pages)
+
     def scrape_paginated_chapter(self, chapter_info):
         """爬取包含分頁的完整章節"""
         try:
@@ -540,7 +801,7 @@ class PaginatedNovelScraper:
             self.logger.info(f"🔍 開始分析章節: {chapter_title}")
             
             # 訪問第一頁
-            self.driver.get(base_url)
+            prefetched = self.open_page(base_url)
             
             # 等待頁面加載
             if not self.wait_for_page_load():
@@ -550,8 +811,9 @@ class PaginatedNovelScraper:
             if not self.handle_verification():
                 self.logger.warning(f"⚠️ 驗證處理失敗，嘗試繼續: {chapter_title}")
             
-            # 額外等待確保頁面穩定
-            time.sleep(random.uniform(2, 4))
+            # 額外等待確保頁面穩定（預取的分頁已在背景加載完成）
+            if not prefetched:
+                time.sleep(random.uniform(2, 4))
             
             # 獲取第一頁的標題和內容
             page_title, page_content = self.extract_content_from_page()
@@ -583,41 +845,14 @@ class PaginatedNovelScraper:
             # 有分頁，獲取所有頁面
             current_page, total_pages = pagination_info
             self.logger.info(f"📄 檢測到分頁章節: {total_pages} 頁")
+            self.learn_pagination_template(base_url, current_page)
             
-            all_content = [page_content]  # 第一頁內容
-            failed_pages = []
+            remaining_content, failed_pages = self.fetch_remaining_pages(base_url, total_pages)
+            all_content = [page_content] + remaining_content  # 第一頁內容在前
             
-            # 爬取剩餘頁面
-            for page_num in range(2, total_pages + 1):
-                try:
-                    page_url = self.construct_page_url(base_url, page_num)
-                    if not page_url:
-                        failed_pages.append(page_num)
-                        continue
-                    
-                    self.logger.info(f"  📖 爬取第 {page_num}/{total_pages} 頁...")
-                    self.driver.get(page_url)
-                    
-                    # 等待頁面加載
-                    self.wait_for_page_load(timeout=5)
-                    
-                    # 處理可能的驗證
-                    self.handle_verification(max_attempts=1, manual_timeout=min(10, self.verification_timeout))
-                    
-                    time.sleep(random.uniform(1, 3))
-                    
-                    _, content = self.extract_content_from_page()
-                    
-                    if content:
-                        all_content.append(content)
-                        self.logger.debug(f"    ✅ 第{page_num}頁成功 (長度: {len(content)})")
-                    else:
-                        failed_pages.append(page_num)
-                        self.logger.warning(f"    ❌ 第{page_num}頁內容為空")
-                        
-                except Exception as e:
-                    failed_pages.append(page_num)
-                    self.logger.error(f"    ❌ 第{page_num}頁爬取失敗: {e}")
+            # 模板構造的分頁全部失敗時，丟棄模板，讓下一章重新學習
+            if total_pages > 1 and not remaining_content:
+                self.pagination_engine.forget(base_url)
             
             # 合併所有內容
             combined_content = '\n\n'.join(all_content)
@@ -688,13 +923,32 @@ class PaginatedNovelScraper:
             selected_chapters = chapters[start_chapter-1:end_chapter]
             self.logger.info(f"🚀 開始爬取第 {start_chapter} 到第 {end_chapter} 章，共 {len(selected_chapters)} 章")
             
+            # 任務日誌：跳過已完成的章節（部分成功的章節會重新爬取）
+            journal = CrawlJournal.for_output_dir(self.output_dir)
+            done_urls = journal.completed_urls() if self.resume else set()
+            pending_chapters = [(i, c) for i, c in enumerate(selected_chapters, start_chapter)
+                                if c['url'] not in done_urls]
+            if len(pending_chapters) < len(selected_chapters):
+                self.logger.info(f"任務日誌中已完成 {len(selected_chapters) - len(pending_chapters)} 章，將跳過")
+            
             results = []
             success_count = 0
             total_pages = 0
             
-            for i, chapter_info in enumerate(selected_chapters, start_chapter):
+            if self.prefetch > 0:
+                self.prefetcher = TabPrefetcher(
+                    self.driver,
+                    [c['url'] for _, c in pending_chapters],
+                    lookahead=self.prefetch,
+                    rate_limiter=DomainRateLimiter(delay_range),
+                )
+                self.logger.info(f"已啟用預取，深度: {self.prefetch}")
+            
+            for n, (i, chapter_info) in enumerate(pending_chapters, 1):
+                journal.start(chapter_info['url'])
                 result = self.scrape_paginated_chapter(chapter_info)
                 
+                filepath = None
                 if result['status'] in ['success', 'partial_success']:
                     filepath = self.save_chapter(result, i)
                     if filepath:
@@ -703,17 +957,26 @@ class PaginatedNovelScraper:
                         total_pages += result.get('pages', 0)
                 
                 results.append(result)
+                if filepath:
+                    journal.finish(chapter_info['url'], result['status'], output_path=filepath)
+                else:
+                    status = 'save_failed' if result['status'] in ['success', 'partial_success'] else result['status']
+                    journal.finish(chapter_info['url'], status, error=result.get('error'))
                 
                 # 進度報告
-                progress = f"[{i-start_chapter+1}/{len(selected_chapters)}]"
+                progress = f"[{n}/{len(pending_chapters)}]"
                 pages_info = f"(共爬取 {total_pages} 頁)"
                 self.logger.info(f"{progress} 進度更新 - 成功: {success_count} {pages_info}")
                 
-                # 延遲
-                if i < end_chapter:
+                # 延遲（預取模式下由限速器控制導航間隔，這裡只打開已到時刻的分頁）
+                if self.prefetcher:
+                    self.prefetcher.pump()
+                elif n < len(pending_chapters):
                     delay = random.uniform(delay_range[0], delay_range[1])
                     time.sleep(delay)
             
+            journal.close()
+            
             # 保存摘要
             self.save_summary(results, start_chapter, end_chapter, total_pages)
             
@@ -723,8 +986,7 @@ class PaginatedNovelScraper:
             return results
             
         finally:
-            if self.driver:
-                self.driver.quit()
+            self.close_drivers()
 
     def save_summary(self, results, start_chapter, end_chapter, total_pages):
         """保存爬取結果摘要"""
@@ -761,6 +1023,12 @@ def main():
     parser.add_argument('--no-verify', action='store_true', help='關閉自動驗證處理')
     parser.add_argument('--verify-timeout', type=int, default=30, help='手動驗證超時時間（秒）')
     parser.add_argument('--custom-verify', help='自定義驗證元素選擇器（CSS選擇器）')
+    parser.add_argument('--page-workers', type=int, default=1, help='並行抓取分頁的數量（預設逐頁抓取）')
+    parser.add_argument('--page-mode', choices=['browser', 'http'], default='browser',
+                        help='並行抓取分頁的方式: browser=額外瀏覽器, http=純HTTP請求')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='預取深度：處理當前章節時在備用分頁中提前加載後N章（預設不預取）')
+    parser.add_argument('--no-resume', action='store_true', help='忽略任務日誌，重新爬取已完成的章節')
     
     args = parser.parse_args()
     
@@ -793,7 +1061,11 @@ def main():
         csv_file_path=args.csv_file,
         output_dir=args.output,
         headless=args.headless,
-        auto_verify=not args.no_verify
+        auto_verify=not args.no_verify,
+        page_workers=args.page_workers,
+        page_mode=args.page_mode,
+        prefetch=args.prefetch,
+        resume=not args.no_resume
     )
     
     # 設置驗證超時時間
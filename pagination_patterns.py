@@ -0,0 +1,147 @@
+"""
+分頁 URL 模板學習：從第一個分頁章節觀察到的「下一頁」連結推斷分頁 URL 模板，
+按域名快取後套用到之後所有章節，不必每章都在 DOM 中尋找下一頁連結。
+
+支援的模板:
+- query: 以查詢參數表示頁碼，如 ?page=2
+- path:  以路徑表示頁碼，如 8096_1_2.html、123/2.html、123/2/、1.html -> 2.html
+"""
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from json_cache import load_json, save_json_atomic
+
+
+def _common_prefix_len(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _common_suffix_len(a, b, limit):
+    n = min(len(a), len(b)) - limit
+    i = 0
+    while i < n and a[-1 - i] == b[-1 - i]:
+        i += 1
+    return i
+
+
+def infer_template(base_url, next_url, page_number=2):
+    """
+    根據章節第一頁 URL 與觀察到的第 page_number 頁 URL 推斷分頁模板
+    返回模板 dict，無法推斷時返回 None
+    """
+    base = urlparse(base_url)
+    nxt = urlparse(next_url)
+    if base.netloc != nxt.netloc:
+        return None
+
+    page = str(page_number)
+
+    # 1. 查詢參數型：?page=2
+    if base.path == nxt.path and base.query != nxt.query:
+        base_query = dict(parse_qsl(base.query))
+        for key, value in parse_qsl(nxt.query):
+            if value == page and base_query.get(key) in (None, '1', '0'):
+                template = {'kind': 'query', 'param': key}
+                break
+        else:
+            return None
+
+    # 2. 路徑型：找出兩個路徑中不同的片段，把新片段裡的頁碼換成佔位符
+    elif base.path != nxt.path:
+        prefix = _common_prefix_len(base.path, nxt.path)
+        # 前綴不可吃掉頁碼的一部分（例如 /c/1.html -> /c/12.html）
+        if prefix < len(nxt.path) and nxt.path[prefix].isdigit():
+            while prefix and nxt.path[prefix - 1].isdigit():
+                prefix -= 1
+        suffix = _common_suffix_len(base.path, nxt.path, prefix)
+        removed = base.path[prefix:len(base.path) - suffix]
+        inserted = nxt.path[prefix:len(nxt.path) - suffix]
+
+        # 插入片段中必須恰好有一個等於頁碼的數字串
+        runs = [m for m in re.finditer(r'\d+', inserted) if m.group(0) == page]
+        if len(runs) != 1:
+            return None
+        run = runs[0]
+        template = {
+            'kind': 'path',
+            'remove': removed,
+            'insert': inserted[:run.start()] + '{page}' + inserted[run.end():],
+            'suffix': base.path[len(base.path) - suffix:] if suffix else '',
+        }
+    else:
+        return None
+
+    # 自我驗證：用模板重建第 page_number 頁必須得到觀察到的 URL
+    if apply_template(template, base_url, page_number) != next_url:
+        return None
+    return template
+
+
+def apply_template(template, base_url, page_number):
+    """按模板構造第 page_number 頁的 URL，模板不適用於此 URL 時返回 None"""
+    parsed = urlparse(base_url)
+
+    if template['kind'] == 'query':
+        query = parse_qsl(parsed.query, keep_blank_values=True)
+        if any(k == template['param'] for k, _ in query):
+            query = [(k, str(page_number) if k == template['param'] else v) for k, v in query]
+        else:
+            query.append((template['param'], str(page_number)))
+        return urlunparse(parsed._replace(query=urlencode(query)))
+
+    if template['kind'] == 'path':
+        tail = template['remove'] + template['suffix']
+        if not parsed.path.endswith(tail):
+            return None
+        head = parsed.path[:len(parsed.path) - len(tail)]
+        # 被替換的片段前面若還有數字，說明對齊位置不對（例如頁碼只是章節號的一部分）
+        if template['remove'] and template['remove'][0].isdigit() and head[-1:].isdigit():
+            return None
+        new_path = head + template['insert'].format(page=page_number) + template['suffix']
+        return urlunparse(parsed._replace(path=new_path))
+
+    return None
+
+
+class PaginationPatternEngine:
+    """按域名學習並快取分頁 URL 模板"""
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.templates = load_json(cache_file, {}) if cache_file else {}
+        self._lock = threading.Lock()
+
+    def get_template(self, url):
+        """取得該 URL 所屬域名的已學習模板"""
+        return self.templates.get(urlparse(url).netloc)
+
+    def learn(self, base_url, next_url, page_number=2):
+        """從一對觀察到的 URL 學習模板並快取，返回模板或 None"""
+        template = infer_template(base_url, next_url, page_number)
+        if template:
+            with self._lock:
+                self.templates[urlparse(base_url).netloc] = template
+                self._save()
+        return template
+
+    def forget(self, url):
+        """移除域名模板（模板在新章節上失效時使用）"""
+        with self._lock:
+            if self.templates.pop(urlparse(url).netloc, None) is not None:
+                self._save()
+
+    def build_url(self, base_url, page_number):
+        """使用已快取的模板構造分頁 URL，沒有可用模板時返回 None"""
+        template = self.get_template(base_url)
+        if not template:
+            return None
+        return apply_template(template, base_url, page_number)
+
+    def _save(self):
+        if self.cache_file:
+            save_json_atomic(self.cache_file, self.templates)
@@ -19,13 +19,18 @@ python precise_content_crawler.py \
 """
 
 import os
+import re
 import json
 import time
 import csv
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from PIL import Image
@@ -33,6 +38,20 @@ from io import BytesIO
 import base64
 import openai
 from difflib import SequenceMatcher
+from http_utils import DomainRateLimiter
+from prefetch import TabPrefetcher
+from crawl_journal import CrawlJournal
+from json_cache import save_json_atomic
+from text_cleaner import RULE_PACKS
+from text_stats import count_cjk, cjk_charset
+from content_scorer import element_stats_in_browser, score_in_browser
+from page_capture import (EncodedImage, capture_element_cdp, device_pixel_ratio, image_extension,
+                          iter_cdp_tiles, iter_element_tiles, supports_cdp)
+
+BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+# 自動檢測到的選擇器按域名保存在輸出目錄的這個文件中（--rules 指定的文件只讀）
+DETECTED_RULES_FILENAME = 'content_rules.json'
 
 
 def split_image(
@@ -77,7 +96,8 @@ def ocr_chunk(image_path: str, model: str) -> str:
     """Call GPT model to OCR the given image chunk via Base64 data URI (openai>=1.x)."""
     with open(image_path, "rb") as f:
         b64 = base64.b64encode(f.read()).decode("ascii")
-    data_uri = f"data:image/png;base64,{b64}"
+    mime = mimetypes.guess_type(image_path)[0] or "image/png"
+    data_uri = f"data:{mime};base64,{b64}"
     parts = [
         {"type": "text",      "text": "请识别以下图片中的文字，并仅返回纯文本，不要额外说明："},
         {"type": "image_url", "image_url": {"url": data_uri, "detail": "high"}},
@@ -89,6 +109,42 @@ def ocr_chunk(image_path: str, model: str) -> str:
     return resp.choices[0].message.content.strip()
 
 
+class ChunkOcrPipeline:
+    """
+    分塊 OCR 流水線：每個截圖塊一保存就提交識別，按提交順序收集結果。
+    在途的塊數有上限，截圖不會遠遠跑在識別前面
+    """
+
+    def __init__(self, model, workers=2):
+        self.model = model
+        self.max_pending = workers * 2
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+
+    def submit(self, chunk_path):
+        pending = [f for f in self.futures if not f.done()]
+        if len(pending) >= self.max_pending:
+            pending[0].exception()  # 等最早提交的一塊完成
+        self.futures.append(self.executor.submit(ocr_chunk, chunk_path, self.model))
+
+    def results(self):
+        """等待全部塊識別完成，返回按順序排列的文本"""
+        try:
+            return [f.result() for f in self.futures]
+        finally:
+            self.executor.shutdown()
+
+    def cancel(self):
+        """取消尚未開始識別的塊；正在請求中的塊無法中斷，不等待它們完成"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cancel()
+
+
 def merge_texts(chunks: list[str], min_overlap_chars: int) -> str:
     """Merge OCR outputs from overlapping chunks, removing duplicated overlaps."""
     merged = chunks[0]
@@ -120,24 +176,75 @@ def proofread_text(text: str, model: str = "o4-mini") -> str:
 
 
 class PreciseContentCrawler:
-    def __init__(self, rules_file=None, use_ocr=False, use_openai=False, openai_key=None):
+    def __init__(self, rules_file=None, use_ocr=False, use_openai=False, openai_key=None,
+                 prefetch=0, delay=0, resume=True, tiled=False, tile_height=None, tile_overlap=0,
+                 browser='firefox', image_format='png', image_quality=85, grayscale=False):
         self.rules = self._load_rules(rules_file) if rules_file else {}
+        self.detected_rules_file = None  # 自動檢測規則的保存位置，crawl_urls 中設為輸出目錄
         self.use_ocr = use_ocr
         self.use_openai = use_openai
         self.openai_key = openai_key
+        self.prefetch = prefetch  # 預取深度：處理當前頁面時在備用分頁中提前加載後續頁面
+        self.rate_limiter = DomainRateLimiter(delay)  # 同一域名兩次導航之間的最小間隔（秒）
+        self.prefetcher = None
+        self.resume = resume  # 跳過任務日誌中已成功的 URL
+        # 分塊截圖：按視窗逐段滾動截取內容區域，每塊即為一個 OCR 分塊（高度、重疊與 split_image 一樣按圖像像素計）
+        self.tiled = tiled
+        self.tile_height = tile_height
+        self.tile_overlap = tile_overlap
+        # Chrome 上經 CDP 直接截取並由瀏覽器編碼（png / jpeg / webp，可轉灰度），不經 PIL 重新編碼
+        self.browser = browser
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.grayscale = grayscale
+        self.use_cdp = False
         self.driver = None
 
         self._setup()
 
     def _load_rules(self, rules_file):
-        """加載內容定位規則"""
+        """加載內容定位規則：{域名: 規則}，或 ContentLocator 生成的單域名規則文件"""
         if os.path.exists(rules_file):
             with open(rules_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                rules = json.load(f)
+            if isinstance(rules.get('domain'), str) and 'content_selector' in rules:
+                return {rules['domain']: rules}
+            return rules
         return {}
 
+    def use_detected_rules(self, output_dir):
+        """在 output_dir 中保存自動檢測到的選擇器，並沿用之前保存的（手寫規則優先）"""
+        self.detected_rules_file = os.path.join(output_dir, DETECTED_RULES_FILENAME)
+        self.rules = {**self._load_rules(self.detected_rules_file), **self.rules}
+
+    def _save_detected_rules(self):
+        """把自動檢測到的選擇器寫入檢測規則文件"""
+        if not self.detected_rules_file:
+            return
+        detected = {domain: rule for domain, rule in self.rules.items() if rule.get('detected')}
+        save_json_atomic(self.detected_rules_file, detected)
+
+    def _setup_chrome(self):
+        """創建無頭 Chrome（可使用 CDP 截圖）"""
+        options = ChromeOptions()
+        options.add_argument('--headless=new')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument('--window-size=1200,800')
+        return webdriver.Chrome(options=options)
+
     def _setup(self):
         """初始化"""
+        if self.browser == 'chrome':
+            self.driver = self._setup_chrome()
+        else:
+            self.driver = self._setup_firefox()
+        self.use_cdp = supports_cdp(self.driver)
+
+        self._setup_services()
+
+    def _setup_firefox(self):
+        """創建無頭 Firefox"""
         # 設置瀏覽器
         options = Options()
 
@@ -162,8 +269,10 @@ class PreciseContentCrawler:
                 options.binary_location = bin_path
                 break
 
-        self.driver = webdriver.Firefox(options=options)
+        return webdriver.Firefox(options=options)
 
+    def _setup_services(self):
+        """初始化 OCR 與 OpenAI"""
         # 設置 OCR
         if self.use_ocr:
             try:
@@ -185,76 +294,90 @@ class PreciseContentCrawler:
                 self.use_openai = False
 
     def get_content_selector(self, url):
-        """獲取內容選擇器"""
+        """獲取內容選擇器（頁面需已加載）"""
         domain = urlparse(url).netloc
 
-        # 檢查是否有預定義規則
+        # 檢查是否有預定義或之前檢測到的規則
         if domain in self.rules:
             return self.rules[domain].get('content_selector')
 
-        # 動態檢測內容區域
-        return self._detect_content_area(url)
+        # 在當前頁面上動態檢測內容區域，成功後按域名記錄，同站後續頁面不再檢測
+        selector = self._detect_content_area(url)
+        if selector != "body":
+            self.rules[domain] = {
+                'content_selector': selector,
+                'detected': True,
+                'created_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._save_detected_rules()
+        return selector
+
+    def _forget_detected_rule(self, url):
+        """刪除失效的自動檢測規則（手寫規則保留）"""
+        domain = urlparse(url).netloc
+        if self.rules.get(domain, {}).get('detected'):
+            del self.rules[domain]
+            self._save_detected_rules()
+            return True
+        return False
 
     def _detect_content_area(self, url):
-        """動態檢測內容區域"""
-        self.driver.get(url)
-        time.sleep(2)
-
-        # 候選選擇器及其優先級
-        selectors = [
-            # 精確ID選擇器
-            "#content", "#chaptercontent", "#chapter-content",
-            "#article-content", "#text-content", "#novel-content",
-
-            # 精確類選擇器
-            ".content", ".chapter-content", ".chaptercontent",
-            ".article-content", ".text-content", ".novel-content",
-            ".read-content", ".readcontent",
-
-            # 屬性選擇器
-            "[class*='content'][class*='chapter']",
-            "[class*='content'][class*='text']",
-            "[id*='content'][id*='chapter']",
-
-            # 語義標籤
-            "article", "main",
-
-            # 組合選擇器
-            "div.content > div", "div#content > div",
-            "div[class*='read'] div[class*='content']"
-        ]
+        """在已加載的當前頁面上動態檢測內容區域（一次頁面內評分腳本）"""
+        try:
+            WebDriverWait(self.driver, 10).until(
+                EC.presence_of_element_located((By.TAG_NAME, "body"))
+            )
+        except:
+            pass
 
-        for selector in selectors:
-            try:
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                for elem in elements:
-                    # 檢查元素是否合適
-                    text = elem.text
-                    if not text or len(text) < 100:
-                        continue
-
-                    # 檢查中文比例
-                    chinese_ratio = sum(1 for c in text if '\u4e00' <= c <= '\u9fff') / len(text)
-                    if chinese_ratio > 0.3:  # 至少30%中文
-                        rect = elem.rect
-                        if rect['width'] > 300 and rect['height'] > 200:
-                            print(f"  自動檢測到內容區域: {selector}")
-                            return selector
-            except:
-                continue
+        # 按文字密度評分（鏈接密度、中文比例、句讀）在頁面內找出正文區域
+        try:
+            candidates = score_in_browser(self.driver, limit=5)
+        except Exception as e:
+            print(f"  內容區域評分失敗: {e}")
+            candidates = []
+        for candidate in candidates:
+            if self._looks_like_content(candidate):
+                print(f"  自動檢測到內容區域: {candidate['selector']}")
+                return candidate['selector']
 
         # 如果都失敗，返回body
         print("  警告：未找到特定內容區域，將使用整個頁面")
         return "body"
 
-    def capture_content_only(self, url):
-        """只截圖內容區域"""
-        print(f"\n處理: {url}")
+    @staticmethod
+    def _looks_like_content(stats):
+        """評分候選或 element_stats_in_browser 的結果是否像正文區域"""
+        rect = stats['rect']
+        return (stats['chars'] >= 100 and stats['cjk'] / stats['chars'] > 0.3
+                and stats['linkDensity'] < 0.5 and rect['width'] > 300 and rect['height'] > 200)
+
+    def _detected_area_ok(self, url, content_elem):
+        """
+        檢查自動檢測規則在本頁命中的元素是否仍像正文：nth-of-type 結構選擇器在版面不同的頁面上
+        可能命中導航或側欄而不是找不到元素；手寫規則不檢查
+        """
+        if not self.rules.get(urlparse(url).netloc, {}).get('detected'):
+            return True
+        try:
+            return self._looks_like_content(element_stats_in_browser(self.driver, content_elem))
+        except Exception:
+            return True
+
+    def open_page(self, url):
+        """打開頁面，啟用預取時直接切換到已在背景加載的分頁"""
+        if self.prefetcher:
+            return self.prefetcher.navigate(url)
+        self.rate_limiter.wait(url)
+        self.driver.get(url)
+        return False
 
+    def _locate_content(self, url):
+        """打開頁面並定位內容元素，失敗時返回 None"""
         # 訪問頁面
-        self.driver.get(url)
+        self.open_page(url)
 
-        # 獲取內容選擇器
+        # 獲取內容選擇器（在已加載的頁面上檢測，不重新打開頁面）
         selector = self.get_content_selector(url)
 
         # 等待內容加載
@@ -264,7 +387,26 @@ class PreciseContentCrawler:
                 EC.presence_of_element_located((By.CSS_SELECTOR, selector))
             )
         except:
-            print("  錯誤：內容加載超時")
+            content_elem = None
+        if content_elem is None or not self._detected_area_ok(url, content_elem):
+            # 之前檢測到的選擇器在本頁不存在或命中的不是正文時，重新檢測一次
+            if not self._forget_detected_rule(url):
+                print("  錯誤：內容加載超時")
+                return None
+            print("  已記錄的內容選擇器失效，重新檢測")
+            selector = self.get_content_selector(url)
+            try:
+                content_elem = self.driver.find_element(By.CSS_SELECTOR, selector)
+            except:
+                print("  錯誤：內容加載超時")
+                return None
+        return content_elem
+
+    def capture_content_only(self, url):
+        """只截圖內容區域"""
+        print(f"\n處理: {url}")
+        content_elem = self._locate_content(url)
+        if content_elem is None:
             return None, None
 
         # 滾動到內容區域
@@ -274,7 +416,16 @@ class PreciseContentCrawler:
         # 獲取內容
         content_text = content_elem.text
 
-        # 截圖內容區域
+        # 截圖內容區域：Chromium 上用 CDP 直接截取，圖片由瀏覽器編碼
+        if self.use_cdp:
+            try:
+                content_image = capture_element_cdp(
+                    self.driver, content_elem, self.image_format, self.image_quality, self.grayscale)
+                print(f"  內容區域截圖 (CDP {self.image_format}): {len(content_image.data)} 字節")
+                return content_text, content_image
+            except Exception as e:
+                print(f"  CDP 截圖失敗，改用元素截圖（超長章節可加 --tiled）: {e}")
+
         try:
             # 方法1：直接截圖元素
             content_screenshot = content_elem.screenshot_as_png
@@ -298,6 +449,52 @@ class PreciseContentCrawler:
 
         return content_text, content_image
 
+    def capture_content_tiles(self, url, chunk_base, on_chunk=None):
+        """
+        分塊截取內容區域：每塊保存為 {chunk_base}_chunk_{n}.png 後立即交給 on_chunk（如 OCR 流水線），
+        任何時候只有一塊截圖在內存中。返回 (正文文本, 塊文件列表)
+        """
+        print(f"\n處理: {url}")
+        content_elem = self._locate_content(url)
+        if content_elem is None:
+            return None, []
+
+        content_text = content_elem.text
+        chunk_paths = []
+        # 分塊按 CSS 像素滾動截取，HiDPI 屏幕上需換算，否則塊的圖像高度是不分塊時的 devicePixelRatio 倍
+        ratio = device_pixel_ratio(self.driver)
+        tile_height = self.tile_height / ratio if self.tile_height else None
+        overlap = self.tile_overlap / ratio
+        if self.use_cdp:
+            tiles = iter_cdp_tiles(self.driver, content_elem, tile_height, overlap,
+                                   self.image_format, self.image_quality, self.grayscale)
+        else:
+            tiles = iter_element_tiles(self.driver, content_elem, tile_height, overlap)
+        for tile in tiles:
+            chunk_path = f"{chunk_base}_chunk_{tile.index}{image_extension(tile.image)}"
+            tile.image.save(chunk_path)
+            chunk_paths.append(chunk_path)
+            if on_chunk:
+                on_chunk(chunk_path)
+
+        print(f"  內容區域分塊截圖: {len(chunk_paths)} 塊")
+        return content_text, chunk_paths
+
+    def _process_capture(self, capture, process):
+        """對截圖運行 OCR / OpenAI；分塊截圖逐塊處理後按重疊合併"""
+        if isinstance(capture, EncodedImage):
+            with capture.open() as image:
+                return process(image)
+        if not isinstance(capture, list):
+            return process(capture)
+        texts = []
+        for chunk_path in capture:
+            with Image.open(chunk_path) as image:
+                text = process(image)
+            if text:
+                texts.append(text)
+        return merge_texts(texts, getattr(self, 'gptocr_min_overlap_chars', 20)) if texts else None
+
     def process_with_ocr(self, image):
         """使用 OCR 處理圖片"""
         if not self.use_ocr or not self.ocr_reader:
@@ -413,17 +610,23 @@ class PreciseContentCrawler:
             print(f"  OpenAI處理失敗: {e}")
             return None
 
-    def crawl_page(self, url):
-        """爬取單個頁面，返回 (正文文本, 內容區域截圖)"""
+    def crawl_page(self, url, chunk_base=None, on_chunk=None):
+        """
+        爬取單個頁面，返回 (正文文本, 內容區域截圖)
+        分塊模式下截圖為塊文件列表（{chunk_base}_chunk_{n}.png），每塊保存後調用 on_chunk
+        """
         try:
             # 獲取內容區域的文本和截圖
-            content_text, content_image = self.capture_content_only(url)
+            if self.tiled:
+                content_text, content_image = self.capture_content_tiles(url, chunk_base, on_chunk)
+            else:
+                content_text, content_image = self.capture_content_only(url)
 
             if not content_image:
                 return None, None
 
             # 統計原始文本
-            original_chinese = sum(1 for c in content_text if '\u4e00' <= c <= '\u9fff') if content_text else 0
+            original_chinese = count_cjk(content_text)
             print(f"  原始文本: {len(content_text) if content_text else 0} 字符, {original_chinese} 中文")
 
             # 決定處理方式
@@ -436,23 +639,24 @@ class PreciseContentCrawler:
                 # 優先使用 OpenAI
                 if self.use_openai:
                     print("  使用 OpenAI 提取...")
-                    ai_content = self.process_with_openai(content_image, content_text)
+                    ai_content = self._process_capture(
+                        content_image, lambda image: self.process_with_openai(image, content_text))
                     if ai_content:
                         final_content = ai_content
 
                 # 否則使用 OCR
                 elif self.use_ocr:
                     print("  使用 OCR 識別...")
-                    ocr_content = self.process_with_ocr(content_image)
+                    ocr_content = self._process_capture(content_image, self.process_with_ocr)
                     if ocr_content:
                         # 合併原始文本和OCR結果
                         final_content = self._merge_contents(content_text, ocr_content)
 
             # 清理內容
-            final_content = self._clean_content(final_content)
+            final_content = self._clean_content(final_content, url)
 
             # 統計最終結果
-            final_chinese = sum(1 for c in final_content if '\u4e00' <= c <= '\u9fff')
+            final_chinese = count_cjk(final_content)
             print(f"  最終內容: {len(final_content)} 字符, {final_chinese} 中文")
 
             return final_content, content_image
@@ -469,94 +673,25 @@ class PreciseContentCrawler:
             return text1
 
         # 簡單合併策略：如果text2包含text1中沒有的大量中文，則合併
-        chinese1 = set(c for c in text1 if '\u4e00' <= c <= '\u9fff')
-        chinese2 = set(c for c in text2 if '\u4e00' <= c <= '\u9fff')
+        chinese1 = cjk_charset(text1)
+        chinese2 = cjk_charset(text2)
 
         if len(chinese2 - chinese1) > 50:  # text2有超過50個text1沒有的中文字
             return text1 + "\n\n" + text2
         else:
             return text1
 
-    def _clean_content(self, text):
-        """清理內容"""
+    def _clean_content(self, text, url=None):
+        """按 URL 所屬域名的清理規則包清理內容（cleaning_rules/*.json）"""
         if not text:
             return ""
 
-        # 去除推薦作品、更多相關作品、章節報錯及其後續內容
-        import re
-        markers_pattern = r'\[推荐作品\]|\[更多相关作品\]|\[章节报错\]'
-        # 只保留標記前的內容
-        text = re.split(markers_pattern, text)[0]
-
+        # 截斷標記後內容、刪除廣告語、修正人名在一次掃描中完成
         # NOTE: 章節標題不一定出現在每頁頂部，移除標題前文本的邏輯應在整章拼接後處理
-
-        # 移除常見廣告語（僅針對單行，不跨多行）
-        ad_patterns = [
-            r'本章未完[^\n]*?點擊[^\n]*?下一頁',
-            r'請記住[^\n]*?域名',
-            r'手機[^\n]*?閱讀',
-            r'最新網址',
-            r'最新地址',
-            r'继续阅读',
-            # 根据样本：最新地址：发邮件至 Dz@ZASHUWU.COM
-            r'最新地址：发邮件至[^\n]*',
-            # 根据样本：记得发邮件至地址：Dz@ZASHUWU.COM
-            r'记得发邮件至地址：[^\n]*',
-            r'無彈窗',
-            r'更新最快',
-            r'本站[^\n]*?域名',
-
-            # 新增 – 針對 m.zashuwu.com 常見插入行
-            r'海量小说[^\n]*',
-            r'【[^\n]*?阅读度】',
-            # 邮件/邮箱寻址广告，如“记得邮件找地址：Dz@ZASHUWU.COM”或“记邮箱找地址：Dz@ZASHUWU.COM”
-            r'记(?:得)?(?:邮件|邮箱)[^\n]*?@[^\n]*',
-            # 根据样本：邮箱地址：Dz@ZASHUWU.COM
-            r'邮箱地址[:：][^\n]*',
-            r'最新网址发邮件[^\n]*',
-            # 根据样本：最新地址请发邮件：dz@zashuwu.com
-            r'最新地址请发邮件[:：][^\n]*',
-            r'发邮件取最新域名[^\n]*',
-            # 根据章节末尾广告样本，过滤“发邮件获取最新域名：...”
-            r'发邮件获取最新域名[:：][^\n]*',
-            # 根据样本：发邮箱获取最新域名：DZ@ZASHUWU.COM
-            r'发邮箱获取最新域名[:：][^\n]*',
-            # 根据样本：记得发邮件联系：dz@zashuwu.com
-            r'记得发邮件联系[:：][^\n]*',
-            r'记住[：:][^\n]*?ZASHUWU\.COM',
-            r'杂书屋[：:][^\n]*',
-            # 根据样本：记住【杂书屋】：ZASHUWU.COM
-            r'记住【杂书屋】：[^\n]*',
-            # 根据样本：记住【日虎读书网】：RIHUDS.COM
-            r'记住【日虎读书网】：[^\n]*',
-            r'注册会员可关闭广告[^\n]*',
-            r'您当前阅读进度[^\n]*',
-            # 剩余章节提示，如“剩余4212章待阅，点击下章继续阅读。”
-            r'剩余?\s*\d+\s*章待阅[^\n]*',
-            r'阅读历史[^\n]*?搜书',
-            # 新增 – 针对收藏阅读进度提示及下一章跳转提示
-            r'【收藏[^\n]*?防止丢失阅读进度】',
-            r'(?:正|本)文未完[^\n]*?点击[^\n]*?下一章',
-            r'【[^\n]*?阅读进度】',
-            # 根据样本：卡书屋：KASHUWU.COM
-            r'卡书屋[：:][^\n]*',
-        ]
-
-        # 新增：過濾 “记得在邮件里找地址：dz@zashuwu.com” 等變體
-        ad_patterns.append(r'记(?:得|住)?[^\\n]{0,20}?(?:邮件|邮箱)[^\\n]*?@[^\\n]*')
-
-        for pattern in ad_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-
-        text = text.replace('叶洄', '叶洵')
-        text = text.replace('叶淘', '叶洵')
-        text = text.replace('叶洽', '叶洵')
-        text = text.replace('叶渊', '叶洵')
-        text = text.replace('叶汐', '叶洵')
-        text = text.replace('叶洺', '叶洵')
+        text = RULE_PACKS.rules_for(url).apply(text)
 
         # 清理多餘空行
-        text = re.sub(r'\n\s*\n+', '\n\n', text)
+        text = BLANK_LINES_RE.sub('\n\n', text)
 
         return text.strip()
 
@@ -564,62 +699,103 @@ class PreciseContentCrawler:
         """批量爬取"""
         os.makedirs(output_dir, exist_ok=True)
 
+        # 自動檢測到的選擇器保存在輸出目錄，下次運行直接沿用（手寫規則優先）
+        self.use_detected_rules(output_dir)
+
+        # 任務日誌：跳過已完成的 URL，文件名仍按 URL 在列表中的位置編號
+        journal = CrawlJournal.for_output_dir(output_dir)
+        done_urls = journal.completed_urls() if self.resume else set()
+        pending = [(i, url) for i, url in enumerate(urls, 1) if url not in done_urls]
+        if len(pending) < len(urls):
+            print(f"任務日誌中已完成 {len(urls) - len(pending)} 個URL，將跳過")
+
+        if self.prefetch > 0:
+            self.prefetcher = TabPrefetcher(self.driver, [url for _, url in pending], self.prefetch, self.rate_limiter)
+            print(f"已啟用預取，深度: {self.prefetch}")
+
         results = []
-        for i, url in enumerate(urls, 1):
+        for i, url in pending:
             print(f"\n進度: {i}/{len(urls)}")
 
-            content, image = self.crawl_page(url)
-
-            if content and len(content) > 100:
-                # 保存內容
-                filename = f"{i:04d}_chapter.txt"
-                filepath = os.path.join(output_dir, filename)
-
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(content)
-
-                # 保存原始圖片
-                image_filename = f"{i:04d}_chapter.png"
-                image_path = os.path.join(output_dir, image_filename)
-                image.save(image_path)
-
-                # GPT-OCR pipeline: split image into chunks, OCR, merge and optional proofreading
-                gptocr_file = None
-                if getattr(self, 'gptocr', False):
-                    print(f"  [GPT-OCR] processing: {image_path}")
-                    chunks = split_image(image_path, self.gptocr_chunk_height, self.gptocr_overlap)
-                    ocr_texts = []
-                    for idx2, chunk in enumerate(chunks, 1):
-                        print(f"    chunk {idx2}/{len(chunks)}: {chunk}")
-                        ocr_texts.append(ocr_chunk(chunk, self.gptocr_ocr_model))
-                    merged = merge_texts(ocr_texts, self.gptocr_min_overlap_chars)
-                    if self.gptocr_proofread_model:
-                        print(f"  [GPT-OCR] proofreading merged text with {self.gptocr_proofread_model}...")
-                        merged = proofread_text(merged, self.gptocr_proofread_model)
-                    merged = self._clean_content(merged)
-                    gptocr_file = os.path.join(output_dir, f"{i:04d}_chapter_gptocr.txt")
-                    with open(gptocr_file, 'w', encoding='utf-8') as gf:
-                        gf.write(merged)
-                    print(f"  ✓ GPT-OCR proofread saved to {gptocr_file}")
-
-                results.append({
-                    'index': i,
-                    'url': url,
-                    'status': 'success',
-                    'file': filepath,
-                    'image_file': image_path,
-                    'gptocr_file': gptocr_file,
-                    'length': len(content)
-                })
-                print(f"  ✓ 已保存")
-            else:
-                results.append({
-                    'index': i,
-                    'url': url,
-                    'status': 'failed',
-                    'reason': 'content too short'
-                })
-                print(f"  ✗ 內容不足")
+            journal.start(url)
+            gptocr = getattr(self, 'gptocr', False)
+            chunk_base = os.path.join(output_dir, f"{i:04d}_chapter")
+            # 分塊模式下每塊截圖保存後立即提交 GPT-OCR，截圖與識別同時進行
+            ocr_pipeline = ChunkOcrPipeline(self.gptocr_ocr_model) if gptocr and self.tiled else None
+            # 出錯或內容不足時取消尚未完成的識別，正常完成時 results() 已等待全部塊
+            with ocr_pipeline or nullcontext():
+                content, image = self.crawl_page(url, chunk_base, ocr_pipeline.submit if ocr_pipeline else None)
+
+                if content and len(content) > 100:
+                    # 保存內容
+                    filename = f"{i:04d}_chapter.txt"
+                    filepath = os.path.join(output_dir, filename)
+
+                    with open(filepath, 'w', encoding='utf-8') as f:
+                        f.write(content)
+
+                    # 保存原始圖片（分塊模式下塊文件已在截圖時保存）
+                    if self.tiled:
+                        image_path = None
+                        chunks = image
+                    else:
+                        image_filename = f"{i:04d}_chapter{image_extension(image)}"
+                        image_path = os.path.join(output_dir, image_filename)
+                        image.save(image_path)
+                        chunks = None
+
+                    # GPT-OCR pipeline: split image into chunks, OCR, merge and optional proofreading
+                    gptocr_file = None
+                    if gptocr:
+                        if ocr_pipeline:
+                            print(f"  [GPT-OCR] waiting for {len(chunks)} streamed chunks")
+                            ocr_texts = ocr_pipeline.results()
+                        else:
+                            print(f"  [GPT-OCR] processing: {image_path}")
+                            chunks = split_image(image_path, self.gptocr_chunk_height, self.gptocr_overlap)
+                            ocr_texts = []
+                            for idx2, chunk in enumerate(chunks, 1):
+                                print(f"    chunk {idx2}/{len(chunks)}: {chunk}")
+                                ocr_texts.append(ocr_chunk(chunk, self.gptocr_ocr_model))
+                        merged = merge_texts(ocr_texts, self.gptocr_min_overlap_chars)
+                        if self.gptocr_proofread_model:
+                            print(f"  [GPT-OCR] proofreading merged text with {self.gptocr_proofread_model}...")
+                            merged = proofread_text(merged, self.gptocr_proofread_model)
+                        merged = self._clean_content(merged, url)
+                        gptocr_file = os.path.join(output_dir, f"{i:04d}_chapter_gptocr.txt")
+                        with open(gptocr_file, 'w', encoding='utf-8') as gf:
+                            gf.write(merged)
+                        print(f"  ✓ GPT-OCR proofread saved to {gptocr_file}")
+
+                    results.append({
+                        'index': i,
+                        'url': url,
+                        'status': 'success',
+                        'file': filepath,
+                        'image_file': image_path,
+                        'chunk_files': chunks,
+                        'gptocr_file': gptocr_file,
+                        'length': len(content)
+                    })
+                    journal.finish(url, 'success', output_path=filepath)
+                    print(f"  ✓ 已保存")
+                else:
+                    results.append({
+                        'index': i,
+                        'url': url,
+                        'status': 'failed',
+                        'reason': 'content too short'
+                    })
+                    journal.finish(url, 'failed', error='content too short')
+                    print(f"  ✗ 內容不足")
+
+            if self.prefetcher:
+                self.prefetcher.pump()
+
+        if self.prefetcher:
+            self.prefetcher.close()
+            self.prefetcher = None
+        journal.close()
 
         return results
 
@@ -639,8 +815,19 @@ def main():
     parser.add_argument('--openai-key', help='OpenAI API Key')
     parser.add_argument('--output', default='precise_output', help='輸出目錄')
     parser.add_argument('--test', action='store_true', help='測試模式')
+    parser.add_argument('--prefetch', type=int, default=0, help='預取深度：處理當前頁面時在備用分頁中提前加載後N頁')
+    parser.add_argument('--delay', type=float, default=0, help='同一域名兩次導航之間的最小間隔（秒）')
+    parser.add_argument('--no-resume', action='store_true', help='忽略任務日誌，重新處理已完成的URL')
     parser.add_argument('--gptocr', action='store_true', help='啟用 GPT 影像分塊 OCR 與校對流程')
-    parser.add_argument('--chunk_height', type=int, default=760, help='GPT OCR 圖像塊最大高度（px）')
+    parser.add_argument('--browser', choices=['firefox', 'chrome'], default='firefox',
+                        help='瀏覽器；chrome 時經 CDP 直接截取內容區域')
+    parser.add_argument('--image-format', choices=['png', 'jpeg', 'webp'], default='png',
+                        help='CDP 截圖格式（僅 chrome，由瀏覽器直接編碼）')
+    parser.add_argument('--image-quality', type=int, default=85, help='CDP 截圖 jpeg / webp 質量')
+    parser.add_argument('--grayscale', action='store_true', help='CDP 截圖前把頁面轉為灰度（僅 chrome）')
+    parser.add_argument('--tiled', action='store_true',
+                        help='按視窗逐段滾動分塊截圖（長章節不截斷、內存有界，GPT-OCR 邊截邊識別）')
+    parser.add_argument('--chunk_height', type=int, default=760, help='GPT OCR 圖像塊最大高度（圖像像素，--tiled 時同樣適用）')
     parser.add_argument('--overlap', type=int, default=20, help='GPT OCR 圖像塊垂直重疊（px）')
     parser.add_argument('--min_overlap_chars', type=int, default=20, help='GPT OCR 合併時最少重疊字符數量')
     parser.add_argument('--ocr_model', default='o4-mini', help='GPT OCR 模型名稱')
@@ -667,7 +854,17 @@ def main():
         rules_file=args.rules,
         use_ocr=args.ocr,
         use_openai=args.openai,
-        openai_key=args.openai_key
+        openai_key=args.openai_key,
+        prefetch=args.prefetch,
+        delay=args.delay,
+        resume=not args.no_resume,
+        tiled=args.tiled,
+        tile_height=args.chunk_height,
+        tile_overlap=args.overlap,
+        browser=args.browser,
+        image_format=args.image_format,
+        image_quality=args.image_quality,
+        grayscale=args.grayscale
     )
     # GPT-OCR pipeline settings
     crawler.gptocr = args.gptocr
@@ -22,6 +22,12 @@ Usage:
     the raw chapter image and the final text. It can run jobs in parallel using multiple
     worker threads.
 
+    Jobs from all CSVs are scheduled by crawl_scheduler.ChapterScheduler instead of CSV order:
+    new chapters of serials crawled before come first (newest first), then chapters never
+    crawled, then retries of failed chapters; books take turns within each priority, and a
+    domain still inside --delay (or at --domain-concurrency) is skipped in favour of other
+    domains so the workers never wait on one site.
+
 單圖補救模式:
     python precise_content_crawler_batch_ocr.py --image precise_output_batch_o4_mini_v4/m8/0016_chapter.png \
        --ocr-model o4-mini --proofread-model o4-mini --openai-key sk-...
@@ -40,12 +46,16 @@ from precise_content_crawler import (
     proofread_text,
     PreciseContentCrawler,
 )
+from crawl_journal import CrawlJournal
+from crawl_scheduler import (ChapterScheduler, ScheduledJob, run_scheduled,
+                             PRIORITY_NEW, PRIORITY_BACKLOG, PRIORITY_RETRY)
 import concurrent.futures
+import functools
 import sys
 
 
-def clean_content(text: str) -> str:
-    return PreciseContentCrawler._clean_content(None, text)
+def clean_content(text: str, url: str | None = None) -> str:
+    return PreciseContentCrawler._clean_content(None, text, url)
 
 
 def ocr_chunks_batch(image_paths: list[str], model: str) -> list[str]:
@@ -115,6 +125,7 @@ def batch_ocr_for_image(
     overlap: int,
     min_overlap_chars: int,
     bottom_skip: int,
+    url: str | None = None,
 ) -> str:
     chunks = split_image(image_path, chunk_height, overlap, bottom_skip)
     print(f"  Sending {len(chunks)} chunks in a single OCR request")
@@ -122,22 +133,48 @@ def batch_ocr_for_image(
     merged = merge_texts(texts, min_overlap_chars)
     if proofread_model:
         merged = proofread_text(merged, proofread_model)
-    return clean_content(merged)
+    return clean_content(merged, url)
 
 def process_job(job, rules_file, ocr_model, proofread_model,
                 chunk_height, overlap, min_overlap_chars,
                 bottom_skip, openai_key):
+    """Crawl and OCR one (sub_out, idx, url) job; returns True on success."""
     sub_out, idx, url = job
     openai.api_key = openai_key
+    journal = CrawlJournal.for_output_dir(sub_out)
+    journal.start(url)
+    try:
+        out_path = _crawl_and_ocr(
+            sub_out, idx, url, rules_file, ocr_model, proofread_model,
+            chunk_height, overlap, min_overlap_chars, bottom_skip
+        )
+    except Exception as e:
+        journal.finish(url, "failed", error=str(e))
+        raise
+    else:
+        if out_path:
+            journal.finish(url, "success", output_path=out_path)
+        else:
+            journal.finish(url, "failed", error="capture failed")
+        return bool(out_path)
+    finally:
+        journal.close()
+
+
+def _crawl_and_ocr(sub_out, idx, url, rules_file, ocr_model, proofread_model,
+                   chunk_height, overlap, min_overlap_chars, bottom_skip):
+    """Capture and OCR one chapter; returns the OCR text path or None on capture failure."""
     crawler = PreciseContentCrawler(
         rules_file=rules_file, use_ocr=False, use_openai=False, openai_key=None
     )
+    # 同一本書的各章共用輸出目錄中的檢測規則，只有第一章需要檢測內容區域
+    crawler.use_detected_rules(sub_out)
     name = os.path.basename(sub_out)
     print(f"[{name}|{idx}] {url}")
     _, content_image = crawler.capture_content_only(url)
     if not content_image:
         print(f"  failed to capture content image for {url}")
-        return
+        return None
 
     base = os.path.join(sub_out, f"{idx:04d}_chapter")
     image_path = base + ".png"
@@ -147,12 +184,58 @@ def process_job(job, rules_file, ocr_model, proofread_model,
     text = batch_ocr_for_image(
         image_path, ocr_model, proofread_model,
         chunk_height, overlap, min_overlap_chars,
-        bottom_skip
+        bottom_skip, url
     )
     out_path = base + "_gptocr_batch.txt"
     with open(out_path, "w", encoding="utf-8") as fw:
         fw.write(text)
     print(f"  saved OCR result: {out_path}")
+    return out_path
+
+
+def process_scheduled_job(job_args, job):
+    """run_scheduled entry point: the ScheduledJob payload is the (sub_out, idx, url) job."""
+    return process_job(job.payload, *job_args)
+
+
+def schedule_csv(scheduler, name, sub_out, urls, resume=True):
+    """
+    Add one CSV's pending chapters to the scheduler and return how many were added.
+    A CSV whose journal already has successful chapters is an ongoing serial: chapters after
+    the last completed one are new releases (newest first); chapters the journal recorded as
+    failed go to the retry queue; everything else is backlog in reading order.
+    """
+    done_urls, failed_urls = set(), set()
+    if resume:
+        journal = CrawlJournal.for_output_dir(sub_out)
+        done_urls = journal.completed_urls()
+        for url in urls:
+            record = journal.get(url)
+            if record and record["status"] not in ("success", "running"):
+                failed_urls.add(url)
+        journal.close()
+        if done_urls:
+            print(f"[{name}] skipping {sum(1 for u in urls if u in done_urls)} completed URLs")
+
+    last_done = max((idx for idx, url in enumerate(urls, 1) if url in done_urls), default=0)
+    new_chapters = []
+    added = 0
+    for idx, url in enumerate(urls, 1):
+        if url in done_urls:
+            continue
+        job = ScheduledJob(name, idx, url, (sub_out, idx, url))
+        if url in failed_urls:
+            scheduler.add(job, PRIORITY_RETRY)
+        elif last_done and idx > last_done:
+            new_chapters.append(job)
+        else:
+            scheduler.add(job, PRIORITY_BACKLOG)
+        added += 1
+    for job in reversed(new_chapters):
+        scheduler.add(job, PRIORITY_NEW)
+    if new_chapters:
+        print(f"[{name}] {len(new_chapters)} new chapters since #{last_done}")
+    return added
 
 
 def main():
@@ -207,10 +290,26 @@ def main():
         "--workers", type=int, default=1,
         help="number of parallel worker processes (default: 1)",
     )
+    parser.add_argument(
+        "--delay", type=float, default=0.0,
+        help="minimum seconds between two chapters of the same domain (default: 0)",
+    )
+    parser.add_argument(
+        "--domain-concurrency", type=int, default=0,
+        help="max chapters of one domain processed at the same time, 0 for no limit",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=2,
+        help="retries per failed chapter in this run, with exponential backoff (default: 2)",
+    )
     parser.add_argument(
         "--test", action="store_true",
         help="only process first 3 URLs per CSV",
     )
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="ignore the per-CSV crawl journal and re-process completed URLs",
+    )
     args = parser.parse_args()
 
     openai.api_key = args.openai_key
@@ -246,8 +345,12 @@ def main():
     # ------------------------------------------------------------
     # Mode 2: batch crawl & OCR via CSV
     # ------------------------------------------------------------
-    # Build jobs: for each CSV file, read URLs and prepare subdirectory
-    jobs = []
+    # Schedule jobs: for each CSV file, read URLs and prepare subdirectory
+    scheduler = ChapterScheduler(
+        domain_delay=args.delay,
+        domain_concurrency=args.domain_concurrency,
+        max_retries=args.retries,
+    )
     for csv_path in args.csv or []:
         name = os.path.splitext(os.path.basename(csv_path))[0]
         sub_out = os.path.join(args.output_dir, name)
@@ -263,40 +366,26 @@ def main():
         if args.test:
             urls = urls[:3]
 
-        for idx, url in enumerate(urls, 1):
-            jobs.append((sub_out, idx, url))
+        schedule_csv(scheduler, name, sub_out, urls, resume=not args.no_resume)
+
+    run_job = functools.partial(
+        process_scheduled_job,
+        (args.rules, args.ocr_model, args.proofread_model,
+         args.chunk_height, args.overlap, args.min_overlap_chars,
+         args.bottom_skip, args.openai_key),
+    )
 
-    # Process jobs, optionally in parallel
+    # Process jobs in priority order, optionally in parallel
+    print(f"Scheduled {len(scheduler)} jobs")
     if args.workers > 1:
         print(f"Starting processing with {args.workers} workers...")
         with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
-            futures = {
-                executor.submit(
-                    process_job, job, args.rules,
-                    args.ocr_model, args.proofread_model,
-                    args.chunk_height, args.overlap,
-                    args.min_overlap_chars, args.bottom_skip,
-                    args.openai_key
-                ): job
-                for job in jobs
-            }
-            for future in concurrent.futures.as_completed(futures):
-                job = futures[future]
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"Error processing {job}: {e}", file=sys.stderr)
+            succeeded, failed = run_scheduled(scheduler, run_job, args.workers, executor)
     else:
-        for job in jobs:
-            try:
-                process_job(
-                    job, args.rules, args.ocr_model,
-                    args.proofread_model, args.chunk_height,
-                    args.overlap, args.min_overlap_chars,
-                    args.bottom_skip, args.openai_key
-                )
-            except Exception as e:
-                print(f"Error processing {job}: {e}", file=sys.stderr)
+        succeeded, failed = run_scheduled(scheduler, run_job)
+    print(f"Done: {succeeded} succeeded, {len(failed)} failed")
+    for job in failed:
+        print(f"  failed: {job.book} #{job.idx} {job.url}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -13,6 +13,7 @@ import argparse
 import os
 import csv
 from precise_content_crawler import PreciseContentCrawler
+from crawl_journal import CrawlJournal
 
 
 def main():
@@ -34,6 +35,10 @@ def main():
         "--test", action="store_true",
         help="only process first 3 URLs",
     )
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="ignore the crawl journal and re-capture completed URLs",
+    )
     args = parser.parse_args()
 
     urls = []
@@ -53,20 +58,31 @@ def main():
         openai_key=None,
     )
     os.makedirs(args.output_dir, exist_ok=True)
+    crawler.use_detected_rules(args.output_dir)
+
+    journal = CrawlJournal.for_output_dir(args.output_dir)
+    done_urls = set() if args.no_resume else journal.completed_urls()
 
     for idx, url in enumerate(urls, 1):
+        if url in done_urls:
+            continue
         print(f"[{idx}/{len(urls)}] {url}")
+        journal.start(url)
         _, content_image = crawler.capture_content_only(url)
         if not content_image:
             print(f"  failed to capture content image for {url}")
+            journal.finish(url, "failed", error="capture failed")
             continue
 
         image_path = os.path.join(
             args.output_dir, f"{idx:04d}_chapter.png"
         )
         content_image.save(image_path)
+        journal.finish(url, "success", output_path=image_path)
         print(f"  saved image: {image_path}")
 
+    journal.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
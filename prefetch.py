@@ -0,0 +1,179 @@
+"""
+章節預取：在處理第 i 章的同時，提前開始加載第 i+1..i+N 章
+
+- HttpPrefetcher: 以背景線程發出 HTTP 請求（NovelScraper 等純 HTTP 爬蟲）
+- TabPrefetcher:  在瀏覽器的備用分頁中開始導航（Selenium 爬蟲）
+
+兩者都通過 DomainRateLimiter 預約每個請求的時刻，因此章節間的禮貌延遲
+與當前章節的提取、清理、保存重疊進行，而不是串行等待。
+"""
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_utils import DomainRateLimiter
+
+
+class HttpPrefetcher:
+    """以線程池提前下載接下來的章節"""
+
+    def __init__(self, fetch, urls, lookahead=1, rate_limiter=None, handles=None):
+        """
+        Args:
+            fetch: 下載函數，接收 url 返回結果（例如 response）；提供 handles 時以 fetch(url, handle) 調用
+            urls: 按爬取順序排列的全部章節 URL
+            lookahead: 預取深度（當前章節之後提前下載的章節數）
+            rate_limiter: DomainRateLimiter，None 表示不限速
+            handles: 下載線程使用的句柄（如各自的 requests.Session），每個句柄同時只借給一個線程，
+                     應提供 lookahead + 1 個
+        """
+        self.fetch = fetch
+        self.urls = list(urls)
+        self.positions = {url: i for i, url in reversed(list(enumerate(self.urls)))}
+        self.lookahead = max(0, lookahead)
+        self.rate_limiter = rate_limiter or DomainRateLimiter(0)
+        self.futures = {}
+        self.handles = None
+        if handles:
+            self.handles = queue.Queue()
+            for handle in handles:
+                self.handles.put(handle)
+        self.executor = ThreadPoolExecutor(max_workers=len(handles) if handles else self.lookahead + 1)
+
+    def _fetch_at(self, url, slot):
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if self.handles is None:
+            return self.fetch(url)
+        handle = self.handles.get()
+        try:
+            return self.fetch(url, handle)
+        finally:
+            self.handles.put(handle)
+
+    def _schedule(self, url):
+        if url not in self.futures:
+            # 在主線程按章節順序預約時刻，保證限速順序與爬取順序一致
+            slot = self.rate_limiter.reserve(url)
+            self.futures[url] = self.executor.submit(self._fetch_at, url, slot)
+
+    def get(self, url):
+        """返回 url 的下載結果，同時預約其後 lookahead 個章節"""
+        self._schedule(url)
+        index = self.positions.get(url)
+        if index is not None:
+            for next_url in self.urls[index + 1:index + 1 + self.lookahead]:
+                self._schedule(next_url)
+        return self.futures.pop(url).result()
+
+    def close(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        self.executor.shutdown(wait=False)
+
+
+class TabPrefetcher:
+    """在備用瀏覽器分頁中提前導航到接下來的章節"""
+
+    def __init__(self, driver, urls, lookahead=1, rate_limiter=None, load_timeout=30):
+        """
+        Args:
+            driver: Selenium WebDriver
+            urls: 按爬取順序排列的全部章節 URL
+            lookahead: 預取深度（同時在背景加載的分頁數）
+            rate_limiter: DomainRateLimiter，None 表示不限速
+            load_timeout: 切換到預取分頁後等待加載完成的最長秒數
+        """
+        self.driver = driver
+        self.urls = list(urls)
+        self.positions = {url: i for i, url in reversed(list(enumerate(self.urls)))}
+        self.lookahead = max(0, lookahead)
+        self.rate_limiter = rate_limiter or DomainRateLimiter(0)
+        self.load_timeout = load_timeout
+        self.pending = {}  # url -> 預約的導航時刻
+        self.tabs = {}     # url -> 已開始加載的分頁 handle
+
+    def _open_tab(self, url):
+        """在新分頁中開始導航，不等待加載完成"""
+        current = self.driver.current_window_handle
+        self.driver.switch_to.new_window('tab')
+        handle = self.driver.current_window_handle
+        # 用腳本導航時 WebDriver 不會阻塞等待頁面加載
+        self.driver.execute_script("window.location.href = arguments[0];", url)
+        self.driver.switch_to.window(current)
+        return handle
+
+    def _wait_ready(self):
+        deadline = time.monotonic() + self.load_timeout
+        while time.monotonic() < deadline:
+            try:
+                if self.driver.execute_script("return document.readyState") == "complete":
+                    return True
+            except Exception:
+                pass
+            time.sleep(0.2)
+        return False
+
+    def schedule(self, urls):
+        """為尚未預約的 URL 預約導航時刻，並打開已到時刻的分頁"""
+        for url in urls:
+            if url not in self.pending and url not in self.tabs:
+                self.pending[url] = self.rate_limiter.reserve(url)
+        self.pump()
+
+    def pump(self):
+        """打開所有已到預約時刻的背景分頁；在處理章節的空檔調用"""
+        now = time.monotonic()
+        for url, slot in list(self.pending.items()):
+            if slot <= now:
+                del self.pending[url]
+                try:
+                    self.tabs[url] = self._open_tab(url)
+                except Exception:
+                    pass  # 打開失敗時 navigate() 會退回直接加載
+
+    def navigate(self, url):
+        """
+        讓瀏覽器當前分頁顯示 url，並預約其後 lookahead 個章節
+        返回 True 表示使用了已在背景加載的分頁
+        """
+        prefetched = False
+        slot = self.pending.pop(url, None)
+        handle = self.tabs.pop(url, None)
+
+        if handle is not None:
+            current = self.driver.current_window_handle
+            if current not in self.tabs.values() and len(self.driver.window_handles) > 1:
+                self.driver.close()
+            self.driver.switch_to.window(handle)
+            self._wait_ready()
+            prefetched = True
+        else:
+            if slot is None:
+                slot = self.rate_limiter.reserve(url)
+            delay = slot - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.driver.get(url)
+
+        index = self.positions.get(url)
+        if index is not None:
+            self.schedule(self.urls[index + 1:index + 1 + self.lookahead])
+        return prefetched
+
+    def close(self):
+        """關閉所有尚未使用的預取分頁"""
+        self.pending = {}
+        if not self.tabs:
+            return
+        try:
+            current = self.driver.current_window_handle
+            for handle in self.tabs.values():
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(current)
+        except Exception:
+            pass
+        self.tabs = {}
@@ -24,21 +24,39 @@ import logging
 import random
 import sys
 from pathlib import Path
+from http_utils import DomainRateLimiter
+from prefetch import TabPrefetcher
+from crawl_journal import CrawlJournal
+from chapter_store import ChapterStore
+from content_scorer import score_in_browser
 
 
 class SeleniumNovelScraper:
-    def __init__(self, csv_file_path, output_dir="novel_chapters", headless=False, user_agent=None):
+    def __init__(self, csv_file_path, output_dir="novel_chapters", headless=False, user_agent=None, prefetch=0, resume=True,
+                 book=None, save_txt=True):
         """
         初始化Selenium爬蟲
+
+        Args:
+            prefetch: 預取深度，>0 時在備用分頁中提前加載後續章節
+            resume: 是否跳過任務日誌中已成功的章節
+            book: 章節庫中的書名，預設為CSV檔名
+            save_txt: 是否在寫入章節庫之外仍保存每章的txt檔案
         """
         self.csv_file_path = csv_file_path
         self.output_dir = output_dir
         self.headless = headless
         self.user_agent = user_agent or 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        self.prefetch = prefetch
+        self.resume = resume
+        self.book = book or Path(csv_file_path).stem
+        self.save_txt = save_txt
         self.driver = None
+        self.prefetcher = None
 
         # 創建輸出目錄
         Path(output_dir).mkdir(parents=True, exist_ok=True)
+        self.store = ChapterStore.for_output_dir(output_dir)
 
         # 設置日誌
         self.setup_logging()
@@ -139,6 +157,13 @@ class SeleniumNovelScraper:
         self.logger.debug(f"等待 {delay:.1f} 秒...")
         time.sleep(delay)
 
+    def open_page(self, url):
+        """打開章節頁面，啟用預取時直接切換到已在背景加載的分頁"""
+        if self.prefetcher:
+            return self.prefetcher.navigate(url)
+        self.driver.get(url)
+        return False
+
     def extract_content_selenium(self):
         """使用Selenium提取頁面內容"""
         try:
@@ -176,13 +201,13 @@ class SeleniumNovelScraper:
                 except:
                     continue
 
-            # 如果還是找不到，嘗試所有div元素
+            # 如果還是找不到，按文字密度評分找出正文區域
             if not content:
                 try:
-                    divs = self.driver.find_elements(By.TAG_NAME, "div")
-                    if divs:
-                        content = max(divs, key=lambda div: len(div.text)).text.strip()
-                        self.logger.debug("使用最長div元素獲取內容")
+                    candidates = score_in_browser(self.driver, limit=1, with_text=True)
+                    if candidates:
+                        content = candidates[0]['text'].strip()
+                        self.logger.debug(f"文字密度評分找到內容: {candidates[0]['selector']}")
                 except:
                     pass
 
@@ -204,13 +229,14 @@ class SeleniumNovelScraper:
             self.logger.info(f"正在爬取: {title}")
 
             # 訪問頁面
-            self.driver.get(url)
+            prefetched = self.open_page(url)
 
             # 模擬人類行為 - 隨機滾動
             self.driver.execute_script("window.scrollTo(0, Math.floor(Math.random() * 1000));")
 
-            # 等待一下讓頁面完全加載
-            self.human_like_delay(1, 3)
+            # 等待一下讓頁面完全加載（預取的分頁已在背景加載完成）
+            if not prefetched:
+                self.human_like_delay(1, 3)
 
             # 提取內容
             content = self.extract_content_selenium()
@@ -249,8 +275,15 @@ class SeleniumNovelScraper:
             }
 
     def save_chapter(self, chapter_data, chapter_num):
-        """保存章節內容"""
+        """保存章節內容（寫入章節庫，並按 save_txt 保存txt檔案）"""
         try:
+            self.store.put(self.book, chapter_num, chapter_data['url'], chapter_data['title'],
+                           chapter_data['content'], status=chapter_data['status'])
+            if not self.save_txt:
+                # 章節庫是唯一輸出時立即提交，確保任務日誌記為成功的章節已經落盤
+                self.store.flush()
+                return self.store.path
+
             safe_title = "".join(
                 c for c in chapter_data['title'] if c.isalnum() or c in (' ', '-', '_', '！', '？')).rstrip()
             filename = f"{chapter_num:03d}_{safe_title[:50]}.txt"  # 限制檔名長度
@@ -293,27 +326,57 @@ class SeleniumNovelScraper:
             selected_chapters = chapters[start_chapter - 1:end_chapter]
             self.logger.info(f"將爬取第 {start_chapter} 到第 {end_chapter} 章，共 {len(selected_chapters)} 章")
 
+            # 任務日誌：跳過已完成的章節
+            journal = CrawlJournal.for_output_dir(self.output_dir)
+            done_urls = journal.completed_urls() if self.resume else set()
+            pending_chapters = [(i, c) for i, c in enumerate(selected_chapters, start_chapter)
+                                if c['url'] not in done_urls]
+            if len(pending_chapters) < len(selected_chapters):
+                self.logger.info(f"任務日誌中已完成 {len(selected_chapters) - len(pending_chapters)} 章，將跳過")
+
             results = []
             success_count = 0
 
-            for i, chapter_info in enumerate(selected_chapters, start_chapter):
-                result = self.scrape_chapter(chapter_info)
+            if self.prefetch > 0:
+                self.prefetcher = TabPrefetcher(
+                    self.driver,
+                    [c['url'] for _, c in pending_chapters],
+                    lookahead=self.prefetch,
+                    rate_limiter=DomainRateLimiter(delay_range),
+                )
+                self.logger.info(f"已啟用預取，深度: {self.prefetch}")
 
-                if result['status'] == 'success':
-                    filepath = self.save_chapter(result, i)
+            try:
+                for n, (i, chapter_info) in enumerate(pending_chapters, 1):
+                    journal.start(chapter_info['url'])
+                    result = self.scrape_chapter(chapter_info)
+
+                    filepath = None
+                    if result['status'] == 'success':
+                        filepath = self.save_chapter(result, i)
+                        if filepath:
+                            result['saved_path'] = filepath
+                            success_count += 1
+
+                    results.append(result)
                     if filepath:
-                        result['saved_path'] = filepath
-                        success_count += 1
-
-                results.append(result)
-
-                # 進度報告
-                progress = f"[{i - start_chapter + 1}/{len(selected_chapters)}]"
-                self.logger.info(f"{progress} 進度更新 - 成功: {success_count}")
-
-                # 人類化延遲
-                if i < end_chapter:
-                    self.human_like_delay(delay_range[0], delay_range[1])
+                        journal.finish(chapter_info['url'], 'success', output_path=filepath)
+                    else:
+                        status = 'save_failed' if result['status'] == 'success' else result['status']
+                        journal.finish(chapter_info['url'], status, error=result.get('error'))
+
+                    # 進度報告
+                    progress = f"[{n}/{len(pending_chapters)}]"
+                    self.logger.info(f"{progress} 進度更新 - 成功: {success_count}")
+
+                    # 人類化延遲（預取模式下由限速器控制導航間隔，這裡只打開已到時刻的分頁）
+                    if self.prefetcher:
+                        self.prefetcher.pump()
+                    elif n < len(pending_chapters):
+                        self.human_like_delay(delay_range[0], delay_range[1])
+            finally:
+                journal.close()
+                self.store.flush()
 
             # 保存摘要
             self.save_summary(results, start_chapter, end_chapter)
@@ -325,6 +388,9 @@ class SeleniumNovelScraper:
             return results
 
         finally:
+            if self.prefetcher:
+                self.prefetcher.close()
+                self.prefetcher = None
             if self.driver:
                 self.driver.quit()
                 self.logger.info("瀏覽器已關閉")
@@ -384,6 +450,12 @@ def parse_arguments():
                         help='無頭模式運行（不顯示瀏覽器窗口）')
     parser.add_argument('--user-agent', '-ua',
                         help='自定義User-Agent')
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help='預取深度：處理當前章節時在備用分頁中提前加載後N章 (預設: 0 不預取)')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='忽略任務日誌，重新爬取已完成的章節')
+    parser.add_argument('--no-txt', action='store_true',
+                        help='只寫入章節庫 (chapters.sqlite)，不保存每章的txt檔案')
 
     # 其他選項
     parser.add_argument('--verbose', '-v', action='store_true',
@@ -435,7 +507,10 @@ def main():
         csv_file_path=args.csv_file,
         output_dir=args.output,
         headless=args.headless,
-        user_agent=args.user_agent
+        user_agent=args.user_agent,
+        prefetch=args.prefetch,
+        resume=not args.no_resume,
+        save_txt=not args.no_txt
     )
 
     # 如果是爬取所有章節，先載入章節列表確定總數
@@ -0,0 +1,337 @@
+"""
+單本書的多進程分片爬取：把章節列表切成 N 個連續分片，分給 N 個工作進程，
+每個進程有自己的瀏覽器與代理（獨立的 FetchRouter），協調進程負責：
+
+- 按域名集中限速：章節由協調進程逐章分派，分派時在同一個 DomainRateLimiter 上預約請求時刻，
+  N 個進程合起來仍遵守同一個請求間隔
+- 合併進度：工作進程把結果發回協調進程，由它統一寫入任務日誌、章節庫與章節 txt（單一寫入者）；
+  各後端的成敗也發回協調進程，由它更新並保存按域名的後端統計（fetch_backends.json）
+- 重新平衡：某個進程碰到驗證頁時進入冷卻，當前章節與它分片中剩下的章節由其他進程接手；
+  某章處理超過 stall_timeout 秒（卡在驗證、瀏覽器無響應）也視為停滯。
+  自己的分片做完的進程從最長的分片尾部分走一半
+
+    python shard_coordinator.py --csv book.csv --output book_out --workers 4 --proxies proxies.txt
+
+協調進程與工作進程之間只傳遞章節與結果（multiprocessing 隊列），不共享瀏覽器或數據庫連接。
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import deque
+
+from chapter_store import ChapterStore
+from crawl_journal import CrawlJournal
+from fetch_backends import (DEFAULT_BACKENDS, FETCH_BACKENDS_FILENAME, FetchRouter, default_backends,
+                            is_verification_page, read_chapter_csv)
+from http_utils import DomainRateLimiter, load_proxies
+
+# 單章處理超過多少秒視為停滯
+STALL_TIMEOUT = 180
+# 碰到驗證頁後該進程暫停接單的秒數
+VERIFY_COOLDOWN = 300
+# 同一章碰到驗證頁或停滯的次數達到此值後記為失敗，留待下次運行
+MAX_ATTEMPTS = 3
+# 暫時沒有可分派的章節（其他進程的章節還在處理中）時，工作進程重新詢問的間隔
+IDLE_POLL = 2.0
+
+
+def _worker_main(wid, config, requests_queue, reply_queue):
+    """工作進程：向協調進程逐章領取任務，用自己的 FetchRouter 抓取並回報結果"""
+    proxy = config['proxy']
+    # 提取器的選擇器與 inittxt 的解碼方法保存在輸出目錄（原子替換，多進程寫入不會損壞文件）
+    router = FetchRouter(default_backends(config['backends'], browser=config['browser'],
+                                          headless=config['headless'], proxies=[proxy] if proxy else None,
+                                          output_dir=config['output_dir']),
+                         probe_interval=config['probe_interval'])
+    # 後端統計只讀取，不在工作進程中保存：結果發回協調進程，由它統一寫入
+    router.load(config['router_stats'])
+    try:
+        while True:
+            requests_queue.put(('next', wid, None))
+            kind, payload = reply_queue.get()
+            if kind == 'stop':
+                break
+            if kind == 'wait':
+                time.sleep(payload)
+                continue
+
+            idx, title, url, delay = payload
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                result = router.fetch(url)
+            except Exception as e:
+                requests_queue.put(('done', wid, (idx, 'error', '', '', str(e))))
+                continue
+            requests_queue.put(('stats', wid, (url, result.attempts, result.backend if result.ok else None,
+                                               result.probing)))
+            if result.ok:
+                requests_queue.put(('done', wid, (idx, 'success', result.text, result.backend, '')))
+            elif is_verification_page(result.html):
+                requests_queue.put(('verify', wid, idx))
+            else:
+                requests_queue.put(('done', wid, (idx, 'no_content', result.text, result.backend,
+                                                  result.error or 'low quality')))
+    finally:
+        router.close()
+
+
+class ShardCoordinator:
+    """把一本書的章節分片給多個工作進程，集中限速、記錄進度並在進程停滯時重新分配"""
+
+    def __init__(self, csv_file, output_dir, workers=4, book=None, backends=DEFAULT_BACKENDS,
+                 browser='chrome', headless=True, proxies=None, delay=2.0, stall_timeout=STALL_TIMEOUT,
+                 verify_cooldown=VERIFY_COOLDOWN, probe_interval=20, save_txt=True):
+        """
+        Args:
+            workers: 工作進程數
+            proxies: 代理列表，按進程輪流分配，每個進程固定使用一個
+            delay: 同一域名兩次請求之間的最小間隔（秒，所有進程合計），可為 (最小, 最大) 隨機範圍
+            stall_timeout: 單章處理超過此秒數時把它轉交其他進程
+            verify_cooldown: 碰到驗證頁後該進程暫停接單的秒數
+        """
+        self.csv_file = csv_file
+        self.output_dir = output_dir
+        self.workers = workers
+        self.book = book or os.path.splitext(os.path.basename(csv_file))[0]
+        self.backends = list(backends)
+        self.browser = browser
+        self.headless = headless
+        self.proxies = proxies or []
+        self.rate_limiter = DomainRateLimiter(delay)
+        self.stall_timeout = stall_timeout
+        self.verify_cooldown = verify_cooldown
+        self.probe_interval = probe_interval
+        self.save_txt = save_txt
+        os.makedirs(output_dir, exist_ok=True)
+
+    def split(self, chapters):
+        """把 [(idx, title, url)] 切成 workers 個連續分片（同一進程處理相鄰章節）"""
+        size, extra = divmod(len(chapters), self.workers)
+        shards, start = [], 0
+        for i in range(self.workers):
+            end = start + size + (1 if i < extra else 0)
+            shards.append(deque(chapters[start:end]))
+            start = end
+        return shards
+
+    def _save(self, store, idx, title, url, text, status):
+        store.put(self.book, idx, url, title, text, status=status)
+        if not self.save_txt:
+            return store.path
+        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        path = os.path.join(self.output_dir, f"{idx:03d}_{safe_title}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"標題: {title}\n")
+            f.write(f"網址: {url}\n")
+            f.write(f"狀態: {status}\n")
+            f.write("-" * 50 + "\n\n")
+            f.write(text)
+        return path
+
+    def _next_chapter(self, wid, shards, orphans, state):
+        """
+        為 wid 選下一章：先接被轉交的章節，再做自己的分片，
+        然後接手冷卻 / 停滯進程的分片，最後從最長的分片尾部分走一半
+        """
+        if orphans:
+            return orphans.popleft()
+        if shards[wid]:
+            return shards[wid].popleft()
+        now = time.monotonic()
+        unhealthy = [w for w in range(self.workers)
+                     if shards[w] and (state[w]['cooldown_until'] > now or state[w]['stalled'])]
+        if unhealthy:
+            return shards[unhealthy[0]].popleft()
+        donor = max(range(self.workers), key=lambda w: len(shards[w]))
+        if len(shards[donor]) > 1:
+            for _ in range(len(shards[donor]) // 2):
+                shards[wid].appendleft(shards[donor].pop())
+            print(f"[協調] 進程 {wid} 從進程 {donor} 接手 {len(shards[wid])} 章")
+            return shards[wid].popleft()
+        return None
+
+    def run(self, resume=True):
+        chapters = [(idx, title, url) for idx, (title, url) in enumerate(read_chapter_csv(self.csv_file), 1)]
+        journal = CrawlJournal.for_output_dir(self.output_dir)
+        store = ChapterStore.for_output_dir(self.output_dir)
+        done_urls = journal.completed_urls() if resume else set()
+        pending = [c for c in chapters if c[2] not in done_urls]
+        if len(pending) < len(chapters):
+            print(f"任務日誌中已完成 {len(chapters) - len(pending)} 章，將跳過")
+        if not pending:
+            journal.close()
+            return {}
+
+        self.workers = max(1, min(self.workers, len(pending)))
+        shards = self.split(pending)
+        by_idx = {c[0]: c for c in pending}
+        orphans = deque()
+        state = [{'current': None, 'since': 0.0, 'cooldown_until': 0.0, 'stalled': False}
+                 for _ in range(self.workers)]
+        counts = {}
+        self.attempts = {}
+        router_stats = os.path.join(self.output_dir, FETCH_BACKENDS_FILENAME)
+        # 只用來匯總各工作進程的後端成敗並保存，不在協調進程中抓取
+        stats_router = FetchRouter(default_backends(self.backends), cache_file=router_stats,
+                                   probe_interval=self.probe_interval)
+
+        ctx = mp.get_context('spawn')
+        requests_queue = ctx.Queue()
+        reply_queues = [ctx.Queue() for _ in range(self.workers)]
+        processes = []
+        for wid in range(self.workers):
+            config = {
+                'proxy': self.proxies[wid % len(self.proxies)] if self.proxies else None,
+                'backends': self.backends,
+                'browser': self.browser,
+                'headless': self.headless,
+                'probe_interval': self.probe_interval,
+                'router_stats': router_stats,
+                'output_dir': self.output_dir,
+            }
+            process = ctx.Process(target=_worker_main, args=(wid, config, requests_queue, reply_queues[wid]),
+                                  daemon=True)
+            process.start()
+            processes.append(process)
+        print(f"已啟動 {self.workers} 個工作進程，共 {len(pending)} 章，"
+              f"每個分片約 {len(pending) // self.workers} 章")
+
+        remaining = set(by_idx)
+        stopped = set()
+        try:
+            while remaining and len(stopped) < self.workers:
+                self._check_stalls(state, processes, shards, orphans, by_idx, remaining, stopped, journal)
+                try:
+                    kind, wid, payload = requests_queue.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+
+                if kind == 'next':
+                    self._dispatch(wid, shards, orphans, state, remaining, reply_queues, stopped)
+                elif kind == 'stats':
+                    stats_router.record(*payload)
+                elif kind == 'done':
+                    idx, status, text, backend, error = payload
+                    state[wid]['current'] = None
+                    state[wid]['stalled'] = False
+                    if idx not in remaining:
+                        continue  # 已由其他進程完成（停滯後被轉交的章節）
+                    _, title, url = by_idx[idx]
+                    if status == 'success':
+                        path = self._save(store, idx, title, url, text, status)
+                        journal.finish(url, 'success', output_path=path)
+                        counts[backend] = counts.get(backend, 0) + 1
+                        print(f"[進程 {wid}|{backend}] {idx} {title} ({len(text)} 字)")
+                    else:
+                        journal.finish(url, status, error=error)
+                        print(f"[進程 {wid}] {idx} {title} 失敗: {error}")
+                    remaining.discard(idx)
+                elif kind == 'verify':
+                    state[wid]['current'] = None
+                    state[wid]['cooldown_until'] = time.monotonic() + self.verify_cooldown
+                    print(f"[協調] 進程 {wid} 碰到驗證頁，冷卻 {self.verify_cooldown} 秒，"
+                          f"第 {payload} 章與其分片餘下 {len(shards[wid])} 章交由其他進程")
+                    if payload in remaining:
+                        self._requeue(by_idx[payload], orphans, remaining, journal, 'verification_required')
+        finally:
+            for wid, reply_queue in enumerate(reply_queues):
+                if wid not in stopped:
+                    reply_queue.put(('stop', None))
+            for process in processes:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+            journal.close()
+            store.flush()
+            stats_router.close()
+
+        print(f"完成：各後端成功章節數 {counts}，未完成 {len(remaining)} 章")
+        return counts
+
+    def _dispatch(self, wid, shards, orphans, state, remaining, reply_queues, stopped):
+        now = time.monotonic()
+        if state[wid]['cooldown_until'] > now:
+            reply_queues[wid].put(('wait', min(state[wid]['cooldown_until'] - now, 30)))
+            return
+        while True:
+            chapter = self._next_chapter(wid, shards, orphans, state)
+            if chapter is None or chapter[0] in remaining:
+                break
+        if chapter is None:
+            if any(s['current'] for s in state):
+                reply_queues[wid].put(('wait', IDLE_POLL))  # 其他進程的章節可能被轉交回來
+            else:
+                reply_queues[wid].put(('stop', None))
+                stopped.add(wid)
+            return
+        idx, title, url = chapter
+        # 集中限速：按域名預約請求時刻，工作進程等到該時刻再發出請求
+        delay = self.rate_limiter.reserve(url) - time.monotonic()
+        state[wid].update(current=idx, since=now, stalled=False)
+        reply_queues[wid].put(('chapter', (idx, title, url, max(0.0, delay))))
+
+    def _requeue(self, chapter, orphans, remaining, journal, status):
+        """把章節交給下一個接單的進程；多次失敗的章節記入任務日誌後放棄"""
+        idx, title, url = chapter
+        self.attempts[idx] = self.attempts.get(idx, 0) + 1
+        if self.attempts[idx] < MAX_ATTEMPTS:
+            orphans.append(chapter)
+            return
+        journal.finish(url, status, error=f"{self.attempts[idx]} 次嘗試均未完成")
+        remaining.discard(idx)
+        print(f"[協調] 第 {idx} 章 {title} 嘗試 {self.attempts[idx]} 次未完成，跳過")
+
+    def _check_stalls(self, state, processes, shards, orphans, by_idx, remaining, stopped, journal):
+        """處理超時或已退出的工作進程：把它正在處理的章節與已退出進程的分片轉交其他進程"""
+        now = time.monotonic()
+        for wid, s in enumerate(state):
+            dead = wid not in stopped and not processes[wid].is_alive()
+            if dead:
+                stopped.add(wid)
+                # 進程可能在領取第一章之前就已退出（如啟動失敗），分片不會再有人按順序處理
+                if shards[wid]:
+                    print(f"[協調] 進程 {wid} 已退出，其分片餘下 {len(shards[wid])} 章交由其他進程")
+                    orphans.extend(shards[wid])
+                    shards[wid].clear()
+            if s['current'] is None or s['stalled']:
+                continue
+            if dead or now - s['since'] > self.stall_timeout:
+                s['stalled'] = True
+                print(f"[協調] 進程 {wid} {'已退出' if dead else '停滯'}，第 {s['current']} 章交由其他進程")
+                if s['current'] in remaining:
+                    self._requeue(by_idx[s['current']], orphans, remaining, journal, 'stalled')
+                if dead:
+                    s['current'] = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多進程分片爬取單本書')
+    parser.add_argument('--csv', required=True, help='章節列表 CSV')
+    parser.add_argument('--output', default='sharded_output', help='輸出目錄')
+    parser.add_argument('--workers', type=int, default=4, help='工作進程數')
+    parser.add_argument('--book', default=None, help='章節庫中的書名，預設為 CSV 檔名')
+    parser.add_argument('--backends', default=','.join(DEFAULT_BACKENDS), help='逗號分隔的抓取後端')
+    parser.add_argument('--browser', choices=['chrome', 'firefox'], default='chrome', help='selenium 後端的瀏覽器')
+    parser.add_argument('--visible', action='store_true', help='顯示瀏覽器窗口（便於手動完成驗證）')
+    parser.add_argument('--proxies', default=None, help='代理列表文件，按進程輪流分配')
+    parser.add_argument('--delay', type=float, default=2.0, help='同一域名兩次請求的最小間隔（所有進程合計）')
+    parser.add_argument('--stall-timeout', type=float, default=STALL_TIMEOUT, help='單章超過多少秒視為停滯')
+    parser.add_argument('--verify-cooldown', type=float, default=VERIFY_COOLDOWN, help='碰到驗證頁後暫停接單的秒數')
+    parser.add_argument('--no-txt', action='store_true', help='只寫章節庫，不保存每章 txt')
+    parser.add_argument('--no-resume', action='store_true', help='不跳過任務日誌中已完成的章節')
+    args = parser.parse_args()
+
+    coordinator = ShardCoordinator(
+        args.csv, args.output, workers=args.workers, book=args.book,
+        backends=args.backends.split(','), browser=args.browser, headless=not args.visible,
+        proxies=load_proxies(args.proxies) if args.proxies else None, delay=args.delay,
+        stall_timeout=args.stall_timeout, verify_cooldown=args.verify_cooldown, save_txt=not args.no_txt,
+    )
+    coordinator.run(resume=not args.no_resume)
+
+
+if __name__ == '__main__':
+    main()
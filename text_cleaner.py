@@ -0,0 +1,290 @@
+"""
+章節文本清理引擎：把一組廣告正則、固定字串替換與整行過濾規則預先編譯成單個正則，
+對整章文本只掃描一次，而不是逐條規則 re.sub / str.replace。
+
+- patterns:      命中即刪除的正則（預設忽略大小寫）
+- replacements:  固定字串替換表，如 {'叶洄': '叶洵'}；編譯成共享前綴的字典樹正則，
+                 與 Aho-Corasick 一樣每個位置只沿字典樹走一次，最長匹配優先，
+                 並與刪除規則放在同一個交替正則中
+- line_patterns: 命中即整行丟棄的正則（逐行一次 search）
+- cut_markers:   出現後截斷其後全部內容的標記正則
+
+    rules = RuleSet(patterns=[r'最新网址'], replacements={'叶洄': '叶洵'})
+    text = rules.apply(text)
+
+規則也可以寫成按域名劃分的規則包（cleaning_rules/*.json），由 RulePackRegistry 按章節 URL
+選用，文件修改後自動重新編譯，長時間運行的批量任務不必重啟：
+
+    {
+        "domains": ["zashuwu.com"],
+        "extends": "default",
+        "cut_markers": ["\\[章节报错\\]"],
+        "patterns": ["杂书屋[：:][^\\n]*"],
+        "replacements": {"叶洄": "叶洵"},
+        "line_patterns": [".*zashuwu\\.com.*"]
+    }
+
+沒有匹配域名的 URL 使用 default.json。
+"""
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+DEFAULT_RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cleaning_rules')
+DEFAULT_PACK = 'default'
+
+_META_CHARS = set('\\.^$*+?{}[]|()')
+
+# 開頭的純字面量交替，如 (?:正|本)文未完
+_LEADING_ALTERNATION = re.compile(r'\(\?:((?:[^\\.^$*+?{}\[\]|()]+\|)+[^\\.^$*+?{}\[\]|()]+)\)')
+
+
+def literal_trie_regex(words):
+    """
+    把一組固定字串編譯成字典樹形式的正則，例如 ['叶洄', '叶淘'] -> '叶(?:洄|淘)'
+    同一前綴只比較一次；字串互為前綴時較長者優先。首字不同的分支以頂層 | 連接
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = None
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        if '' in node:
+            return '(?:' + '|'.join(branches) + ')?'
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return '|'.join(re.escape(ch) + build(child) for ch, child in sorted(trie.items()))
+
+
+def _strip_dotstar(pattern):
+    """逐行 search 時 '.*X.*' 與 'X' 等價，去掉首尾的 .* 避免回溯"""
+    if pattern.startswith('.*'):
+        pattern = pattern[2:]
+    if pattern.endswith('.*') and not pattern.endswith('\\.*'):
+        pattern = pattern[:-2]
+    return pattern
+
+
+def _has_top_level_alternation(pattern):
+    depth = 0
+    in_class = False
+    escaped = False
+    for ch in pattern:
+        if escaped:
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif in_class:
+            in_class = ch != ']'
+        elif ch == '[':
+            in_class = True
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == '|' and depth == 0:
+            return True
+    return False
+
+
+def _expand_leading_alternation(pattern):
+    """(?:正|本)文未完 -> ['正文未完', '本文未完']，讓每個分支都以字面量開頭"""
+    match = _LEADING_ALTERNATION.match(pattern)
+    rest = pattern[match.end():] if match else ''
+    if not match or rest[:1] in ('?', '*', '+', '{'):
+        return [pattern]
+    return [alt + rest for alt in match.group(1).split('|')]
+
+
+def _is_literal_led(pattern, ignore_case):
+    """
+    正則是否以一個必需的、不分大小寫的字面量字符開頭
+    全部分支都如此時，re 會先用首字符集合快速跳過不可能匹配的位置，交替正則才比逐條掃描快
+    """
+    ch = pattern[:1]
+    if not ch or ch in _META_CHARS or _has_top_level_alternation(pattern):
+        return False
+    if ignore_case and ch.lower() != ch.upper():
+        return False
+    return pattern[1:2] not in ('?', '*', '{')
+
+
+def _combine(patterns, ignore_case):
+    """把多個正則合併成一個交替正則，規則按列出順序優先"""
+    if not patterns:
+        return None
+    parts = [p if not _has_top_level_alternation(p) else f'(?:{p})' for p in patterns]
+    return re.compile('|'.join(parts), re.IGNORECASE if ignore_case else 0)
+
+
+class RuleSet:
+    """預編譯的清理規則集"""
+
+    def __init__(self, patterns=(), replacements=None, line_patterns=(), cut_markers=(), ignore_case=True):
+        self.patterns = list(patterns)
+        self.replacements = dict(replacements or {})
+        self.line_patterns = list(line_patterns)
+        self.cut_markers = list(cut_markers)
+        self.ignore_case = ignore_case
+
+        # 以字面量開頭的刪除規則與固定字串替換合併成一個交替正則，一次掃描完成；
+        # 其餘無法快速定位首字符的規則合併成第二個正則
+        fast, slow = [], []
+        for pattern in self.patterns:
+            for expanded in _expand_leading_alternation(pattern):
+                (fast if _is_literal_led(expanded, ignore_case) else slow).append(expanded)
+        if self.replacements:
+            literals = literal_trie_regex(self.replacements)
+            if ignore_case and any(ch.lower() != ch.upper() for word in self.replacements for ch in word):
+                # 固定字串替換保持區分大小寫
+                slow.append(f'(?-i:{literals})')
+            else:
+                fast.append(literals)
+        self._sub_res = [rx for rx in (_combine(fast, ignore_case), _combine(slow, ignore_case)) if rx]
+
+        self._line_re = _combine([_strip_dotstar(p) for p in self.line_patterns], ignore_case)
+        self._cut_re = _combine(self.cut_markers, ignore_case)
+
+    def _replace(self, match):
+        # 固定字串替換優先於同文本的刪除規則
+        return self.replacements.get(match.group(0), '')
+
+    def apply(self, text):
+        """截斷標記之後的內容，並刪除廣告、替換固定字串（通常只需一次掃描）"""
+        if not text:
+            return text
+        if self._cut_re is not None:
+            match = self._cut_re.search(text)
+            if match:
+                text = text[:match.start()]
+        repl = self._replace if self.replacements else ''
+        for rx in self._sub_res:
+            text = rx.sub(repl, text)
+        return text
+
+    def is_ad_line(self, line):
+        """整行過濾規則是否命中"""
+        return self._line_re is not None and self._line_re.search(line) is not None
+
+    def filter_lines(self, text):
+        """去掉空行和命中整行過濾規則的行（每行首尾空白會被去除）"""
+        search = self._line_re.search if self._line_re is not None else None
+        kept = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if line and not (search and search(line)):
+                kept.append(line)
+        return '\n'.join(kept)
+
+
+class RulePackRegistry:
+    """按域名選擇清理規則包，規則包按文件修改時間快取編譯結果"""
+
+    def __init__(self, rules_dir=DEFAULT_RULES_DIR, check_interval=2.0):
+        """
+        Args:
+            rules_dir: 規則包目錄，每個 *.json 是一個規則包
+            check_interval: 兩次檢查文件修改時間的最短間隔（秒）
+        """
+        self.rules_dir = rules_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._packs = {}      # 規則包名 -> (mtime, dict)
+        self._compiled = {}   # 規則包名 -> RuleSet
+        self._domains = []    # (域名, 規則包名)，長域名優先
+        self._checked_at = None
+
+    def _refresh(self):
+        """重新掃描目錄，只重新讀取修改過的規則包"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        mtimes = {}
+        if os.path.isdir(self.rules_dir):
+            for filename in os.listdir(self.rules_dir):
+                if filename.endswith('.json'):
+                    path = os.path.join(self.rules_dir, filename)
+                    try:
+                        mtimes[filename[:-len('.json')]] = os.path.getmtime(path)
+                    except OSError:
+                        pass
+
+        changed = set(self._packs) != set(mtimes)
+        packs = {}
+        for name, mtime in mtimes.items():
+            cached = self._packs.get(name)
+            if cached and cached[0] == mtime:
+                packs[name] = cached
+                continue
+            try:
+                with open(os.path.join(self.rules_dir, f'{name}.json'), 'r', encoding='utf-8') as f:
+                    packs[name] = (mtime, json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"清理規則包 {name}.json 讀取失敗，沿用舊版本: {e}")
+                # 記下新的修改時間，文件再次修改前不重複讀取
+                packs[name] = (mtime, cached[1] if cached else {})
+                continue
+            changed = True
+
+        if changed:
+            self._packs = packs
+            # 規則包之間有 extends 依賴，任一文件變化時全部重新編譯
+            self._compiled = {}
+            self._domains = sorted(
+                ((domain.lower(), name) for name, (_, data) in packs.items() for domain in data.get('domains', [])),
+                key=lambda item: len(item[0]), reverse=True,
+            )
+
+    def _merged(self, name, seen=()):
+        """合併 extends 鏈上的規則，子規則包的規則排在前面優先匹配"""
+        if name not in self._packs or name in seen:
+            return {}
+        data = self._packs[name][1]
+        parent = self._merged(data['extends'], seen + (name,)) if data.get('extends') else {}
+        merged = {}
+        for key in ('cut_markers', 'patterns', 'line_patterns'):
+            merged[key] = list(data.get(key, [])) + parent.get(key, [])
+        merged['replacements'] = {**parent.get('replacements', {}), **data.get('replacements', {})}
+        merged['ignore_case'] = data.get('ignore_case', parent.get('ignore_case', True))
+        return merged
+
+    def pack_name_for(self, url=None):
+        """返回 URL 對應的規則包名"""
+        with self._lock:
+            self._refresh()
+            return self._pack_name_for(url)
+
+    def _pack_name_for(self, url):
+        host = (urlparse(url).hostname or '') if url else ''
+        for domain, name in self._domains:
+            if host == domain or host.endswith('.' + domain):
+                return name
+        return DEFAULT_PACK
+
+    def rules_for(self, url=None):
+        """返回 URL 所屬域名的已編譯規則集，沒有任何規則包時返回空規則集"""
+        with self._lock:
+            self._refresh()
+            name = self._pack_name_for(url)
+            if name not in self._compiled:
+                self._compiled[name] = RuleSet(**self._merged(name))
+            return self._compiled[name]
+
+
+# 各爬蟲共用的規則包註冊表
+RULE_PACKS = RulePackRegistry()
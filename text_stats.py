@@ -0,0 +1,179 @@
+"""
+文本統計：中文字數、中文密度、標點比例與字符集判斷，供各爬蟲與解碼器共用。
+
+字符分類來自同一張排好序的碼點區間表：
+- 單個碼點用 bisect 在區間表中查找（is_cjk_codepoint）
+- 整段文本用由區間表生成的字符類正則統計，掃描都在 C 層完成，不在 Python 中逐字循環
+- 安裝了 NumPy 且文本較長時，把文本編碼為 UTF-32 後用 searchsorted 一次完成全部分類計數
+
+    stats = text_stats(text)
+    if stats.cjk > 500 and stats.density > 0.3:
+        ...
+"""
+import re
+from bisect import bisect_right
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+OTHER = 0
+CJK = 1
+PUNCTUATION = 2
+WHITESPACE = 3
+ALNUM = 4  # ASCII 字母與數字
+
+# (起始碼點, 結束碼點, 類別)，區間互不重疊
+_RANGES = [
+    (0x0009, 0x000D, WHITESPACE),
+    (0x0020, 0x0020, WHITESPACE),
+    (0x0021, 0x002F, PUNCTUATION),
+    (0x0030, 0x0039, ALNUM),
+    (0x003A, 0x0040, PUNCTUATION),
+    (0x0041, 0x005A, ALNUM),
+    (0x005B, 0x0060, PUNCTUATION),
+    (0x0061, 0x007A, ALNUM),
+    (0x007B, 0x007E, PUNCTUATION),
+    (0x00A0, 0x00A0, WHITESPACE),
+    (0x2000, 0x200B, WHITESPACE),
+    (0x2010, 0x2027, PUNCTUATION),  # —、…、“”‘’
+    (0x2028, 0x2029, WHITESPACE),
+    (0x2030, 0x205E, PUNCTUATION),
+    (0x3000, 0x3000, WHITESPACE),   # 全形空格
+    (0x3001, 0x303F, PUNCTUATION),  # 。、「」『』《》【】
+    (0x3400, 0x4DBF, CJK),          # CJK Extension A
+    (0x4E00, 0x9FFF, CJK),          # CJK Unified Ideographs
+    (0xFE10, 0xFE1F, PUNCTUATION),  # 直排標點
+    (0xFE30, 0xFE6F, PUNCTUATION),  # CJK 兼容形式、小型變體
+    (0xFF01, 0xFF0F, PUNCTUATION),  # 全形標點 ！（），
+    (0xFF1A, 0xFF20, PUNCTUATION),  # ：；？
+    (0xFF3B, 0xFF40, PUNCTUATION),
+    (0xFF5B, 0xFF65, PUNCTUATION),
+    (0x20000, 0x2A6DF, CJK),        # CJK Extension B
+    (0x2A700, 0x2EBEF, CJK),        # CJK Extension C-F
+    (0x30000, 0x3134F, CJK),        # CJK Extension G
+]
+
+_CLASS_COUNT = 5
+
+# 常用中文句讀，用來判斷一段文字是否像正文
+SENTENCE_PUNCTUATION = ('。', '！', '？', '，')
+
+# NumPy 路徑的固定開銷約數微秒，短文本用正則更快
+_NUMPY_MIN_LENGTH = 2048
+
+
+def _char_class(kind):
+    parts = []
+    for start, end, cls in _RANGES:
+        if cls == kind:
+            parts.append(re.escape(chr(start)) if start == end
+                         else f'{re.escape(chr(start))}-{re.escape(chr(end))}')
+    return '[' + ''.join(parts) + ']'
+
+
+CJK_CLASS = _char_class(CJK)
+CJK_RUN_RE = re.compile(CJK_CLASS + '+')
+_RUN_RES = {kind: re.compile(_char_class(kind) + '+') for kind in (CJK, PUNCTUATION, WHITESPACE, ALNUM)}
+
+_CJK_STARTS = [start for start, _, cls in _RANGES if cls == CJK]
+_CJK_ENDS = [end for _, end, cls in _RANGES if cls == CJK]
+
+if np is not None:
+    # 區間邊界：_BOUNDS[i] 起（含）到 _BOUNDS[i + 1] 止（不含）的碼點屬於 _CLASSES[i]
+    _bounds, _classes = [0], [OTHER]
+    for _start, _end, _cls in _RANGES:
+        if _bounds[-1] != _start:
+            _bounds.append(_start)
+            _classes.append(OTHER)
+        _classes[-1] = _cls
+        _bounds.append(_end + 1)
+        _classes.append(OTHER)
+    _BOUNDS = np.array(_bounds, dtype=np.uint32)
+    _CLASSES = np.array(_classes, dtype=np.intp)
+
+
+class TextStats(NamedTuple):
+    length: int
+    cjk: int
+    punctuation: int
+    whitespace: int
+    alnum: int
+
+    @property
+    def density(self):
+        """中文字符佔全部字符的比例"""
+        return self.cjk / self.length if self.length else 0.0
+
+    @property
+    def punctuation_ratio(self):
+        """標點佔全部字符的比例"""
+        return self.punctuation / self.length if self.length else 0.0
+
+    @property
+    def visible(self):
+        """非空白字符數"""
+        return self.length - self.whitespace
+
+
+def is_cjk_codepoint(code):
+    """碼點是否為 CJK 表意文字（bisect 查區間表）"""
+    i = bisect_right(_CJK_STARTS, code) - 1
+    return i >= 0 and code <= _CJK_ENDS[i]
+
+
+def is_cjk(char):
+    return is_cjk_codepoint(ord(char))
+
+
+def _count(kind, text):
+    return sum(map(len, _RUN_RES[kind].findall(text)))
+
+
+def _class_counts_numpy(text):
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    classes = _CLASSES[np.searchsorted(_BOUNDS, codes, side='right') - 1]
+    return np.bincount(classes, minlength=_CLASS_COUNT).tolist()
+
+
+def text_stats(text):
+    """一次統計字符總數、中文、標點、空白與 ASCII 字母數字的數量"""
+    if not text:
+        return TextStats(0, 0, 0, 0, 0)
+    if np is not None and len(text) >= _NUMPY_MIN_LENGTH:
+        counts = _class_counts_numpy(text)
+        return TextStats(len(text), counts[CJK], counts[PUNCTUATION], counts[WHITESPACE], counts[ALNUM])
+    # 正文以中文為主：先一次刪去中文，其餘各類只需掃描剩下的少量字符
+    rest = CJK_RUN_RE.sub('', text)
+    return TextStats(len(text), len(text) - len(rest), _count(PUNCTUATION, rest),
+                     _count(WHITESPACE, rest), _count(ALNUM, rest))
+
+
+def count_cjk(text):
+    """中文字符數"""
+    return _count(CJK, text) if text else 0
+
+
+def cjk_density(text):
+    """中文字符佔全部字符的比例"""
+    return count_cjk(text) / len(text) if text else 0.0
+
+
+def extract_cjk(text):
+    """按原順序提取所有中文字符"""
+    return ''.join(CJK_RUN_RE.findall(text)) if text else ''
+
+
+def cjk_charset(text):
+    """文本中出現過的中文字符集合"""
+    return set(extract_cjk(text))
+
+
+def contains_cjk(text):
+    return bool(text) and CJK_RUN_RE.search(text) is not None
+
+
+def has_sentence_punctuation(text):
+    return any(p in text for p in SENTENCE_PUNCTUATION)